@@ -0,0 +1,106 @@
+"""
+Test pricing of hedge orders by the order book of the hedge symbol.
+Thin books put the quantity over the visible depth at the slippage limit, levels beyond
+the slippage are not taken, and small levels are merged into the next child order.
+Venues share a hedge by executable price, a venue without a book takes nothing.
+
+Usage: python tests/hedge_pricing_test.py
+"""
+import os
+import sys
+import unittest
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.hedger.hedge_pricing import plan_hedge_orders, allocate_hedge, MAX_CHILD_ORDERS
+from tunapy.utils.tick_util import TickScale
+
+# ticks of 0.01, lots of 0.01
+SCALE = TickScale(2, 2)
+
+BOOK = {
+    'asks': [[100.0, 1.0], [100.5, 2.0], [102.0, 10.0]],
+    'bids': [[99.9, 1.0], [99.5, 2.0], [98.0, 10.0]],
+}
+
+class PlanHedgeOrdersTest(unittest.TestCase):
+    def test_without_book(self):
+        # one order at the slippage limit from the reference price
+        self.assertEqual(plan_hedge_orders(None, 'BUY', 2.5, 600.0, 0.01, SCALE), [(60600, 250)])
+        self.assertEqual(plan_hedge_orders(None, 'SELL', 2.5, 600.0, 0.01, SCALE), [(59400, 250)])
+        self.assertEqual(plan_hedge_orders(BOOK, 'BUY', 0.001, 600.0, 0.01, SCALE), [])
+
+    def test_levels(self):
+        # one child order per level
+        self.assertEqual(plan_hedge_orders(BOOK, 'BUY', 2.5, 600.0, 0.01, SCALE), [(10000, 100), (10050, 150)])
+        self.assertEqual(plan_hedge_orders(BOOK, 'SELL', 0.5, 600.0, 0.01, SCALE), [(9990, 50)])
+
+    def test_thin_book(self):
+        # the quantity over the visible depth goes to the slippage limit
+        book = {'asks': [[100.0, 1.0], [100.1, 1.0]], 'bids': [[99.9, 0.5]]}
+        self.assertEqual(plan_hedge_orders(book, 'BUY', 5, 600.0, 0.01, SCALE),
+                         [(10000, 100), (10010, 100), (10100, 300)])
+        self.assertEqual(plan_hedge_orders(book, 'SELL', 2, 600.0, 0.01, SCALE), [(9990, 50), (9890, 150)])
+
+    def test_slippage_cap(self):
+        # the level at 102 is beyond 1% of slippage from the top of book
+        self.assertEqual(plan_hedge_orders(BOOK, 'BUY', 10, 600.0, 0.01, SCALE),
+                         [(10000, 100), (10050, 200), (10100, 700)])
+        self.assertEqual(plan_hedge_orders(BOOK, 'SELL', 10, 600.0, 0.01, SCALE),
+                         [(9990, 100), (9950, 200), (9890, 700)])
+        # a given limit price replaces the slippage
+        self.assertEqual(plan_hedge_orders(BOOK, 'BUY', 10, 600.0, 0.01, SCALE, limit_price=100.2),
+                         [(10000, 100), (10020, 900)])
+        self.assertEqual(plan_hedge_orders(BOOK, 'BUY', 10, 600.0, 0.01, SCALE, limit_price=99.0),
+                         [(9900, 1000)])
+
+    def test_small_levels(self):
+        book = {'asks': [[100.0, 0.1], [100.1, 0.1], [100.2, 5.0]], 'bids': [[99.9, 0.1]]}
+        # levels under Min Qty are merged into the next one
+        self.assertEqual(plan_hedge_orders(book, 'BUY', 1, 600.0, 0.01, SCALE, min_qty=0.5), [(10020, 100)])
+        # under Min Amt as well, the rest left by small levels is at the last level
+        self.assertEqual(plan_hedge_orders(book, 'BUY', 0.15, 600.0, 0.01, SCALE, min_amt=20), [(10010, 15)])
+
+    def test_max_child_orders(self):
+        book = {'asks': [[100.0 + idx * 0.01, 1.0] for idx in range(10)], 'bids': [[99.9, 1.0]]}
+        orders = plan_hedge_orders(book, 'BUY', 10, 600.0, 0.01, SCALE)
+        self.assertEqual(len(orders), MAX_CHILD_ORDERS)
+        self.assertEqual(orders[-1], (10009, 600))
+        self.assertEqual(sum(lots for _, lots in orders), 1000)
+
+class AllocateHedgeTest(unittest.TestCase):
+    def test_best_price_first(self):
+        books = [{'asks': [[100.0, 1.0], [100.2, 5.0]], 'bids': [[99.9, 1.0]]},
+                 {'asks': [[100.1, 2.0], [100.5, 5.0]], 'bids': [[99.8, 1.0]]}]
+        limit, allocation, rest = allocate_hedge(books, 'BUY', 4.0, 0.003)
+        self.assertAlmostEqual(limit, 100.3)
+        self.assertEqual(allocation, [2.0, 2.0])
+        self.assertEqual(rest, 0.0)
+        # a venue listed first wins a tie
+        books = [{'asks': [[100.0, 1.0]], 'bids': [[99.9, 1.0]]},
+                 {'asks': [[100.0, 1.0]], 'bids': [[99.9, 1.0]]}]
+        self.assertEqual(allocate_hedge(books, 'SELL', 1.5, 0.01)[1:], ([1.0, 0.5], 0.0))
+
+    def test_slippage_cap(self):
+        books = [{'asks': [[100.0, 1.0]], 'bids': [[99.9, 1.0], [98.0, 10.0]]},
+                 {'asks': [[100.1, 1.0]], 'bids': [[99.5, 1.0], [99.0, 10.0]]}]
+        # 98 is beyond 1% from the best bid 99.9, the rest over the depth is left
+        limit, allocation, rest = allocate_hedge(books, 'SELL', 15.0, 0.01)
+        self.assertAlmostEqual(limit, 98.901)
+        self.assertEqual(allocation, [1.0, 11.0])
+        self.assertEqual(rest, 3.0)
+
+    def test_empty_book(self):
+        book = {'asks': [[100.0, 1.0], [100.1, 1.0]], 'bids': [[99.9, 1.0]]}
+        for empty in (None, {}, {'asks': [], 'bids': [[99.9, 1.0]]}):
+            # the venue without a book takes nothing
+            self.assertEqual(allocate_hedge([empty, book], 'BUY', 3.0, 0.01)[1:], ([0.0, 2.0], 1.0))
+            self.assertEqual(allocate_hedge([book, empty], 'BUY', 1.5, 0.01)[1:], ([1.5, 0.0], 0.0))
+            self.assertIsNone(allocate_hedge([empty], 'BUY', 1.0, 0.01))
+        self.assertIsNone(allocate_hedge([None, None], 'SELL', 1.0, 0.01))
+
+if __name__ == '__main__':
+    unittest.main()
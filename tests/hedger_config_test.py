@@ -0,0 +1,109 @@
+"""
+Test config updates of a multi-symbol hedger.
+The hedgers do not poll redis themselves, the process checks the versions of all symbols
+in one round trip and passes new configs to their hedgers.
+
+Usage: python tests/hedger_config_test.py
+"""
+import os
+import sys
+import json
+import logging
+import unittest
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.management.hedging import TokenParameter
+from tunapy.hedger.bifu_private_ws import BiFuPrivateWSClient
+from tunapy.hedger import hedger_main
+from tunapy.utils import config_util
+
+def _config(maker_symbol: str, hedge_symbol: str, netting_window: float = 0) -> dict:
+    return {
+        'API KEY': '', 'Secret': '', 'Passphrase': '',
+        'Maker Symbol': maker_symbol, 'Hedge Symbol': hedge_symbol, 'Hedger Exchange': 'binance_spot',
+        'Hedger Price Decimals': '2', 'Hedger Qty Decimals': '3',
+        'Min Qty': '0.01', 'Min Amt': '0.1', 'Slippage': 0.01, 'Netting Window': netting_window,
+    }
+
+class ReplayWSClient(BiFuPrivateWSClient):
+    """ private stream of the maker account without connection
+    """
+    def _ws_connect(self, on_open, on_close, on_error):
+        return None
+
+class FakeRedis:
+    """ strings of redis in memory, counts round trips
+    """
+    def __init__(self):
+        self.values = {}
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        return self.values.get(key)
+
+    def mget(self, keys):
+        self.calls += 1
+        return [self.values.get(key) for key in keys]
+
+    def set_config(self, key: str, config: dict):
+        self.values[f'{key}_data'] = json.dumps(config)
+        self.values[f'{key}_version'] = str(int(self.values.get(f'{key}_version', 0)) + 1)
+
+class MultiHedgerConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('hedger_config_test')
+        self.logger.setLevel(logging.CRITICAL)
+        self.redis = FakeRedis()
+        self.saved = (config_util.RDB, hedger_main.get_pooled_client, hedger_main.load_config)
+        config_util.RDB = lambda: self.redis
+        hedger_main.get_pooled_client = lambda *args, **kwargs: None
+        self.hedger = hedger_main.MultiHedger(
+            [TokenParameter(_config('A', 'aaa')), TokenParameter(_config('B', 'bbb'))],
+            self.logger, self.logger, ReplayWSClient({}, self.logger))
+
+    def tearDown(self):
+        config_util.RDB, hedger_main.get_pooled_client, hedger_main.load_config = self.saved
+        self.hedger.close()
+
+    def test_hedgers_do_not_poll(self):
+        def _load_config(*args):
+            raise AssertionError('a hedger polls redis')
+        hedger_main.load_config = _load_config
+        for agent in self.hedger._agents.values():
+            agent.run_once()
+        self.assertEqual(self.redis.calls, 0)
+
+    def test_check_configs(self):
+        agents = self.hedger._agents
+        # versions of all symbols in one round trip
+        self.hedger.check_configs()
+        self.assertEqual(self.redis.calls, 1)
+        self.assertEqual([getattr(agent.config, 'version', 0) for agent in agents.values()], [0, 0])
+        # a new version of B only
+        self.redis.set_config('B_bbb@binance_spot', _config('B', 'bbb', 0.5))
+        self.redis.calls = 0
+        self.hedger.check_configs()
+        self.assertEqual(self.redis.calls, 2)
+        self.assertEqual(getattr(agents['A'].config, 'version', 0), 0)
+        self.assertEqual(agents['B'].config.version, 1)
+        self.assertEqual(agents['B']._netting.window, 0.5)
+        # the same version is not applied again
+        self.redis.calls = 0
+        self.hedger.check_configs()
+        self.assertEqual(self.redis.calls, 1)
+        self.assertEqual(agents['B'].config.version, 1)
+
+    def test_redis_unavailable(self):
+        def _rdb():
+            raise config_util.ConnectionError('Redis server unavailable')
+        config_util.RDB = _rdb
+        self.hedger.check_configs()
+        self.assertEqual(getattr(self.hedger._agents['A'].config, 'version', 0), 0)
+
+if __name__ == '__main__':
+    unittest.main()
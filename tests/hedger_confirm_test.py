@@ -0,0 +1,132 @@
+"""
+Test confirmation of hedge orders by REST while the hedge stream is disconnected.
+An order still open is queried again until final, and canceled after HEDGE_OPEN_TIMEOUT
+if chasing is off, its rest is parked in risk positions.
+
+Usage: python tests/hedger_confirm_test.py
+"""
+import os
+import sys
+import time
+import types
+import logging
+import itertools
+import unittest
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.management.hedging import TokenParameter, FilledOrder
+from tunapy.hedger.bifu_private_ws import BiFuPrivateWSClient
+from tunapy.hedger import hedger_main
+
+CONFIG = {
+    'API KEY': '', 'Secret': '', 'Passphrase': '',
+    'Maker Symbol': 'bnbusdt', 'Hedge Symbol': 'bnbusdt', 'Hedger Exchange': 'binance_spot',
+    'Hedger Price Decimals': '2', 'Hedger Qty Decimals': '3',
+    'Min Qty': '0.01', 'Min Amt': '0.1', 'Slippage': 0.01,
+}
+
+class ReplayWSClient(BiFuPrivateWSClient):
+    """ private stream of the maker account without connection
+    """
+    def _ws_connect(self, on_open, on_close, on_error):
+        return None
+
+class DisconnectedStream:
+    """ hedge stream reporting nothing
+    """
+    connected = False
+
+    def start(self, symbol, on_open, on_close, handle_trade_filled, on_error, handle_order_update=None):
+        pass
+
+    def close(self):
+        pass
+
+class HedgeClient:
+    """ hedge account, orders stay NEW until canceled or filled
+    """
+    def __init__(self):
+        self.ids = itertools.count(100)
+        self.orders = {}    # order id -> status
+        self.queries = 0
+        self.fail_queries = 0   # the next queries raise
+
+    def batch_make_orders(self, orders, symbol):
+        res = []
+        for _ in orders:
+            order_id = str(next(self.ids))
+            self.orders[order_id] = 'NEW'
+            res.append(types.SimpleNamespace(order_id=order_id))
+        return res
+
+    def batch_cancel(self, order_ids, symbol):
+        for order_id in order_ids:
+            self.orders[order_id] = 'CANCELED'
+        return order_ids
+
+    def order_status(self, order_id, symbol):
+        self.queries += 1
+        if self.fail_queries > 0:
+            self.fail_queries -= 1
+            raise ConnectionError('order_status timeout')
+        return [types.SimpleNamespace(status=self.orders[order_id], executedQty='0')]
+
+class HedgeConfirmTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('hedger_confirm_test')
+        self.logger.setLevel(logging.CRITICAL)
+        self.client = HedgeClient()
+        self.saved = {key: getattr(hedger_main, key) for key in
+                      ('get_pooled_client', 'get_hedge_book', 'HEDGE_CONFIRM_TIMEOUT', 'HEDGE_OPEN_TIMEOUT')}
+        hedger_main.get_pooled_client = lambda *args, **kwargs: self.client
+        hedger_main.get_hedge_book = lambda exchange, symbol: None
+        hedger_main.HEDGE_CONFIRM_TIMEOUT = 0.05
+        hedger_main.HEDGE_OPEN_TIMEOUT = 0.5
+        self.agent = hedger_main.HedgerAgent(
+            '', '', self.logger, self.logger, TokenParameter(CONFIG),
+            ReplayWSClient({}, self.logger), hedge_stream=DisconnectedStream())
+
+    def tearDown(self):
+        for key, value in self.saved.items():
+            setattr(hedger_main, key, value)
+
+    def _run(self, seconds: float):
+        end = time.time() + seconds
+        while time.time() < end:
+            self.agent.run_once()
+            time.sleep(0.01)
+
+    def _fill(self, trade_id: str):
+        self.agent.handle_trade_filled(FilledOrder(trade_id, '1', '600', 'bnbusdt', 'BUY', 'o1', '0'))
+
+    def test_requery_until_final(self):
+        self.client.fail_queries = 2
+        self._fill('t1')
+        self._run(0.3)
+        self.assertGreaterEqual(self.client.queries, 4)
+        self.assertEqual(len(self.agent._hedge_tasks), 1)
+        # filled, confirmed by the next query
+        for order_id in self.client.orders:
+            self.client.orders[order_id] = 'FILLED'
+        self._run(0.2)
+        self.assertEqual(self.agent._hedge_tasks, {})
+
+    def test_cancel_open_order_without_chasing(self):
+        self._fill('t2')
+        self._run(0.3)
+        self.assertEqual(list(self.client.orders.values()), ['NEW'])
+        self._run(0.6)
+        self.assertEqual(list(self.client.orders.values()), ['CANCELED'])
+        self.assertEqual(self.agent._hedge_tasks, {})
+        rests = [position for order_id, position in self.agent._risk_positions.items()
+                 if order_id.startswith('rest-')]
+        self.assertEqual(len(rests), 1)
+        self.assertTrue(rests[0]['parked'])
+        self.assertEqual(self.agent.wait_for_hedge_multithread(wait=True), 0)
+
+if __name__ == '__main__':
+    unittest.main()
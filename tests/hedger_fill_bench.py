@@ -0,0 +1,113 @@
+"""
+Benchmark the fill handoff of the hedger.
+Replay fills through BiFuPrivateWSClient.on_message at a target rate in the stream thread,
+while the hedge loop drains the fill queue and nets risk positions in the main thread.
+Check that no fill is lost or counted twice, and report the handoff latency.
+
+Usage: python tests/hedger_fill_bench.py [fills per second, default 10000] [seconds, default 5]
+"""
+import os
+import sys
+import time
+import logging
+import threading
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.management.hedging import TokenParameter
+from tunapy.hedger.bifu_private_ws import BiFuPrivateWSClient
+from tunapy.hedger.hedger_main import HedgerAgent, IDLE_INTERVAL
+
+ORDER_NUM = 100     # fills are spread over maker orders
+DUPLICATE_EVERY = 50    # replay every N-th fill twice, duplicates must be dropped
+BATCH = 100     # fills sent between pacing sleeps
+
+class ReplayWSClient(BiFuPrivateWSClient):
+    """ private stream without connection, messages are replayed by on_message
+    """
+    def _ws_connect(self, on_open, on_close, on_error):
+        return None
+
+def _message(idx: int) -> dict:
+    return {
+        'type': 'spot-trade-event',
+        'msg': {'data': {'orderFillTransaction': [{
+            'matchFillId': f'fill-{idx}',
+            'fillSize': '0.001',
+            'fillValue': '0.6',
+            'symbolId': '90000005',
+            'orderSide': 'BUY' if idx % 2 else 'SELL',
+            'orderId': f'order-{idx % ORDER_NUM}',
+            'matchTime': str(int(time.time() * 1000)),
+            'direction': 'MAKER',
+            'accountId': '1',
+            'matchAccountId': '2',
+        }]}},
+    }
+
+def main(rate: int, seconds: float):
+    logger = logging.getLogger('fill_bench')
+    logger.setLevel(logging.CRITICAL)
+    param = TokenParameter({
+        'API KEY': '', 'Secret': '', 'Passphrase': '',
+        'Maker Symbol': '90000005', 'Hedge Symbol': 'bnbusdt', 'Hedger Exchange': 'replay',
+        'Hedger Price Decimals': '2', 'Hedger Qty Decimals': '3',
+        # never hedge, so that netted positions can be checked
+        'Min Qty': '1e18', 'Min Amt': '1e18', 'Slippage': 0.01,
+    })
+    ws_client = ReplayWSClient({'Stream URL': ''}, logger)
+    agent = HedgerAgent(api_key='', api_secret='', logger=logger, monitor=logger,
+                        config=param, ws_client=ws_client)
+
+    # handoff latency of each fill: from the stream thread to the hedge loop
+    latencies = []
+    record_fill = agent._record_fill
+    def _record_fill(data, report_time):
+        latencies.append(time.time() - report_time)
+        record_fill(data, report_time)
+    agent._record_fill = _record_fill
+
+    total = int(rate * seconds)
+    def _replay():
+        start_ts = time.time()
+        for idx in range(total):
+            ws_client.on_message(_message(idx))
+            if idx % DUPLICATE_EVERY == 0:
+                ws_client.on_message(_message(idx))
+            if idx % BATCH == BATCH - 1:
+                # pace to the target rate
+                delay = start_ts + (idx + 1) / rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        replay_cost.append(time.time() - start_ts)
+
+    replay_cost = []
+    producer = threading.Thread(target=_replay)
+    start_ts = time.time()
+    producer.start()
+    # the hedge loop of run_forever, without hedging
+    while producer.is_alive() or agent._fills:
+        agent._drain_fills()
+        agent._handle_risk_positions()
+        if agent._fill_event.wait(IDLE_INTERVAL):
+            agent._fill_event.clear()
+    cost = time.time() - start_ts
+    producer.join()
+
+    fills = sum(round(position['qty'] * 1000) for position in agent._risk_positions.values())
+    latencies.sort()
+    print(f'replayed {total} fills (+{len(range(0, total, DUPLICATE_EVERY))} duplicates) '
+          f'in {replay_cost[0]:.3f}s, drained in {cost:.3f}s, {total / cost:.0f} fills/s')
+    print(f'recorded fills: {fills}, lost or double counted: {fills - total}')
+    print('handoff latency: p50 %.1fus, p99 %.1fus, max %.1fus' % (
+        latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6,
+        latencies[-1] * 1e6))
+    return fills == total
+
+if __name__ == '__main__':
+    _rate = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    _seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    sys.exit(0 if main(_rate, _seconds) else 1)
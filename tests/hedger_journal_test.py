@@ -0,0 +1,77 @@
+"""
+Test replay of the hedger journal.
+A hedge and the COVER records of the maker orders it covers are written as one group,
+a crash at any byte of the group never leaves covered orders without their hedge.
+
+Usage: python tests/hedger_journal_test.py
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.hedger import journal
+from tunapy.hedger.journal import HedgeJournal, FILL, HEDGE, COVER
+
+CL_ORDER_ID = 1792409209592
+
+class HedgeJournalReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.journal_dir = journal.JOURNAL_DIR
+        journal.JOURNAL_DIR = self.dir
+        self.logger = logging.getLogger('journal_test')
+        # a torn record is cut off with a warning at every byte
+        self.logger.setLevel(logging.ERROR)
+
+    def tearDown(self):
+        journal.JOURNAL_DIR = self.journal_dir
+        shutil.rmtree(self.dir)
+
+    def _write(self, commit_interval: float = 0.):
+        """ two fills, then a hedge covering both of them
+        """
+        hj = HedgeJournal('test', self.logger, commit_interval)
+        hj.start()
+        hj.append(FILL, 't1', 'o1', 'm', 'BUY', 1.0, 600.0, 0)
+        hj.append(FILL, 't2', 'o2', 'm', 'BUY', 0.5, 300.0, 0)
+        hj.close()
+        size = os.path.getsize(hj.path)
+        hj = HedgeJournal('test', self.logger, commit_interval)
+        hj.start()
+        hj.append_group([(HEDGE, (CL_ORDER_ID, 'm', 'SELL', 1.5, 600.0)),
+                         (COVER, (CL_ORDER_ID, 'o1', 1.0, 600.0)),
+                         (COVER, (CL_ORDER_ID, 'o2', 0.5, 300.0))])
+        # the hedge and its covers are one item of the queue, drained by the journal thread at once
+        self.assertLessEqual(len(hj._queue), 1)
+        hj.close()
+        return hj.path, size
+
+    def test_replay_group(self):
+        self._write()
+        records = HedgeJournal('test', self.logger).replay()
+        self.assertEqual([rtype for rtype, _, _ in records], [FILL, FILL, HEDGE, COVER, COVER])
+
+    def test_crash_in_group(self):
+        path, size = self._write()
+        with open(path, 'rb') as f:
+            data = f.read()
+        for end in range(size, len(data) + 1):
+            # crashed after writing end bytes
+            with open(path, 'wb') as f:
+                f.write(data[:end])
+            records = HedgeJournal('test', self.logger).replay()
+            types = [rtype for rtype, _, _ in records]
+            if COVER in types:
+                self.assertIn(HEDGE, types[:types.index(COVER)], f'cover without hedge at {end}')
+            self.assertEqual(types[:2], [FILL, FILL])
+
+if __name__ == '__main__':
+    unittest.main()
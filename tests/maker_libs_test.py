@@ -0,0 +1,196 @@
+"""
+Test the quoting tools of the market maker.
+Previous orders are matched to the closest new orders without crossing, keeping the most pairs.
+A near-end round is requoted by the price move of the follow book, quantities are not compared.
+Far-end levels stay on the grid of the ladder when the book moves a little, with sticky quantities.
+
+Usage: python tests/maker_libs_test.py
+"""
+import os
+import sys
+import math
+import types
+import random
+import unittest
+from collections import namedtuple
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.maker.maker_libs import MakerOrder, diff_prev_new_orders, book_fingerprint, book_move_bps, \
+    _spread_far
+from tunapy.utils.tick_util import TickScale
+
+# diff rate per round of 0.1%, prices in ticks of 0.01
+DIFF_RATE = 0.001
+
+# open order of the previous round
+PrevOrder = namedtuple('PrevOrder', ['id', 'price'])
+
+def _new_orders(side: str, prices: list) -> list:
+    return [MakerOrder('bnbusdt', f'n{price}', side, price, 100, None, None, None) for price in prices]
+
+class MatchOrdersTest(unittest.TestCase):
+    def _diff(self, side: str, prev_prices: list, new_prices: list, replace: bool = False):
+        prev_orders = [PrevOrder(f'p{price}', price) for price in prev_prices]
+        new_orders = _new_orders(side, new_prices)
+        cancel_ids, reserve_orders = [], []
+        replace_pairs = [] if replace else None
+        put_orders = diff_prev_new_orders(DIFF_RATE, side, prev_orders, new_orders,
+                                          cancel_ids, reserve_orders, replace_pairs)
+        return (sorted(order.price for order in reserve_orders), sorted(cancel_ids),
+                sorted(order.price for order in put_orders), replace_pairs)
+
+    def test_exact_match(self):
+        # 10000 is within the rate of 10005, but the previous order at 10005 is closer
+        for side in ('SELL', 'BUY'):
+            reserved, canceled, put, _ = self._diff(side, [10000, 10005], [10005])
+            self.assertEqual(reserved, [10005])
+            self.assertEqual(canceled, ['p10000'])
+            self.assertEqual(put, [])
+            reserved, canceled, put, _ = self._diff(side, [10005], [10000, 10005])
+            self.assertEqual(reserved, [10005])
+            self.assertEqual(canceled, [])
+            self.assertEqual(put, [10000])
+
+    def test_shifted_ladder(self):
+        # every level moved by one tick, all previous orders are kept
+        for side in ('SELL', 'BUY'):
+            reserved, canceled, put, _ = self._diff(side, [10000, 10005, 10010], [10001, 10006, 10011])
+            self.assertEqual(reserved, [10000, 10005, 10010])
+            self.assertEqual((canceled, put), ([], []))
+        # shifted by a half level, pairs are kept rather than the single exact price
+        reserved, canceled, put, _ = self._diff('SELL', [10004, 10005], [10005, 10006])
+        self.assertEqual(reserved, [10004, 10005])
+        self.assertEqual((canceled, put), ([], []))
+        # shifted beyond the rate, every level is replaced
+        reserved, canceled, put, _ = self._diff('BUY', [10000, 9980], [10020, 10000])
+        self.assertEqual(reserved, [10000])
+        self.assertEqual(canceled, ['p9980'])
+        self.assertEqual(put, [10020])
+
+    def test_unequal_lengths(self):
+        for side in ('SELL', 'BUY'):
+            # a level removed in the middle
+            reserved, canceled, put, _ = self._diff(side, [10000, 10005, 10010], [10000, 10010])
+            self.assertEqual(reserved, [10000, 10010])
+            self.assertEqual((canceled, put), (['p10005'], []))
+            # a level inserted in the middle
+            reserved, canceled, put, _ = self._diff(side, [10000, 10010], [10000, 10005, 10010])
+            self.assertEqual(reserved, [10000, 10010])
+            self.assertEqual((canceled, put), ([], [10005]))
+            # no previous or no new orders
+            self.assertEqual(self._diff(side, [], [10000])[:3], ([], [], [10000]))
+            self.assertEqual(self._diff(side, [10000], [])[:3], ([], ['p10000'], []))
+
+    def test_replace_pairs(self):
+        reserved, canceled, put, replace_pairs = self._diff('SELL', [10000, 10100, 10200], [10000, 10300],
+                                                            replace=True)
+        self.assertEqual(reserved, [10000])
+        self.assertEqual([(prev.price, order.price) for prev, order in replace_pairs], [(10100, 10300)])
+        self.assertEqual((canceled, put), (['p10200'], []))
+
+class BookMoveTest(unittest.TestCase):
+    def setUp(self):
+        self.param = types.SimpleNamespace(ticks=TickScale(2, 3), near_ask_size=2, near_bid_size=2)
+        self.book = {'asks': [[100.0, 1.0], [100.1, 2.0], [100.2, 3.0]],
+                     'bids': [[99.9, 1.0], [99.8, 2.0], [99.7, 3.0]]}
+
+    def _fingerprint(self, asks: list = None, bids: list = None) -> tuple:
+        return book_fingerprint({'asks': asks or self.book['asks'], 'bids': bids or self.book['bids']},
+                                self.param)
+
+    def test_fingerprint(self):
+        # prices of the near-end levels in ticks
+        self.assertEqual(self._fingerprint(), ((10000, 10010), (9990, 9980)))
+        self.assertEqual(book_move_bps(None, self._fingerprint()), math.inf)
+
+    def test_price_move(self):
+        prev = self._fingerprint()
+        self.assertEqual(book_move_bps(prev, self._fingerprint()), 0.)
+        # the second ask level moved by 1 tick, 1 BPS
+        moved = self._fingerprint(asks=[[100.0, 1.0], [100.11, 2.0]])
+        self.assertAlmostEqual(book_move_bps(prev, moved), 10000. / 10010)
+        # the max move of both sides
+        moved = self._fingerprint(asks=[[100.01, 1.0], [100.1, 2.0]], bids=[[99.8, 1.0], [99.8, 2.0]])
+        self.assertAlmostEqual(book_move_bps(prev, moved), 100000. / 9990)
+
+    def test_quantities_ignored(self):
+        prev = self._fingerprint()
+        changed = self._fingerprint(asks=[[100.0, 5.0], [100.1, 0.001]], bids=[[99.9, 9.0], [99.8, 2.5]])
+        self.assertEqual(book_move_bps(prev, changed), 0.)
+
+    def test_levels_changed(self):
+        prev = self._fingerprint()
+        self.assertEqual(book_move_bps(prev, self._fingerprint(asks=[[100.0, 1.0]])), math.inf)
+        # a level beyond the near-end size does not count
+        self.assertEqual(book_move_bps(prev, self._fingerprint(asks=[[100.0, 1.0], [100.1, 2.0], [101, 1.0]])), 0.)
+
+class SpreadFarTest(unittest.TestCase):
+    def setUp(self):
+        # levels 10 BPS apart
+        self.param = types.SimpleNamespace(
+            ticks=TickScale(4, 3), far_sell_price_margin=10, far_buy_price_margin=10, far_ask_size=5,
+            far_bid_size=5, far_qty_multiplier=1., far_max_amt_per_order=10000.)
+        self.state = random.getstate()
+
+    def tearDown(self):
+        random.setstate(self.state)
+
+    def _book(self, price: float) -> list:
+        return [[price, 1. + idx] for idx in range(10)]
+
+    def _grid(self, ladder: dict, side: str) -> dict:
+        """ price in ticks -> grid level of the ladder
+        """
+        coef = 1.001 if side == 'SELL' else 0.999
+        return {self.param.ticks.to_ticks(ladder['anchor'] * coef ** level): level for level in range(-100, 100)}
+
+    def test_same_grid(self):
+        for side, step in (('SELL', 1.001), ('BUY', 0.999)):
+            ladder = {}
+            orders = _spread_far(self._book(100.), self.param, side, ladder)
+            self.assertEqual(len(orders), 5)
+            grid = self._grid(ladder, side)
+            # the first level is one step beyond the top of book
+            self.assertEqual([grid[price] for price, _ in orders], [1, 2, 3, 4, 5])
+            # the base moves toward the book within a step, the ladder is the same
+            for frac in (-0.9, -0.5, -0.1, 0):
+                self.assertEqual(_spread_far(self._book(100. * step ** frac), self.param, side, ladder), orders)
+            # the base moves away into the next step, the ladder shifts by one level on the same grid
+            shifted = _spread_far(self._book(100. * step ** 0.01), self.param, side, ladder)
+            self.assertEqual([grid[price] for price, _ in shifted], [2, 3, 4, 5, 6])
+            self.assertEqual(shifted[:4], orders[1:])
+            for frac in (0.5, 0.99, 1):
+                self.assertEqual(_spread_far(self._book(100. * step ** frac), self.param, side, ladder), shifted)
+            # the base on a grid level two steps away
+            moved = _spread_far(self._book(100. * step ** 2), self.param, side, ladder)
+            self.assertEqual([grid[price] for price, _ in moved], [3, 4, 5, 6, 7])
+            self.assertEqual(moved[:4], shifted[1:])
+            self.assertEqual(ladder['anchor'], 100.)
+
+    def test_sticky_qtys(self):
+        ladder = {}
+        random.seed(1)
+        orders = _spread_far(self._book(100.), self.param, 'SELL', ladder)
+        # other random quantities are not used for kept levels
+        random.seed(2)
+        self.assertEqual(_spread_far(self._book(99.95), self.param, 'SELL', ladder), orders)
+        moved = _spread_far(self._book(100.05), self.param, 'SELL', ladder)
+        self.assertEqual(moved[:4], orders[1:])
+        # the level off the ladder is dropped, the new level gets a new quantity
+        self.assertEqual(sorted(ladder['qtys']), [2, 3, 4, 5, 6])
+        self.assertEqual(ladder['qtys'][6], moved[4][1])
+        self.assertTrue(all(qty > 0 for _, qty in moved))
+
+    def test_without_ladder(self):
+        # levels follow the base price
+        orders = _spread_far(self._book(100.), self.param, 'SELL')
+        self.assertEqual([price for price, _ in orders], [1001000, 1002001, 1003003, 1004006, 1005010])
+        orders = _spread_far(self._book(100.03), self.param, 'SELL')
+        self.assertEqual(orders[0][0], 1001300)
+
+if __name__ == '__main__':
+    unittest.main()
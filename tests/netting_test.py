@@ -0,0 +1,84 @@
+"""
+Test the netting policies of the hedger.
+IMMEDIATE hedges every fill gross, TIME nets the fills of a window, SIZE hedges once the net exposure
+reaches the size threshold, ADAPTIVE nets only while fills arrive fast enough.
+
+Usage: python tests/netting_test.py
+"""
+import os
+import sys
+import unittest
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.hedger.netting import NettingPolicy, IMMEDIATE, TIME, SIZE, ADAPTIVE
+
+def _simulate(netting: NettingPolicy, fills: dict, end_ms: int) -> list:
+    """ run the hedge loop every millisecond, fills: ms -> signed quantity.
+        return hedges [(ms, net quantity)], fills netted to zero are not hedged
+    """
+    hedges = []
+    net, pending = 0., False
+    for ms in range(end_ms + 1):
+        ts = ms / 1000.
+        filled = ms in fills
+        if filled:
+            netting.on_fill(ts)
+            net += fills[ms]
+            pending = True
+        if pending and netting.wait(ts, filled, lambda: net) <= 0:
+            if abs(net) > 1e-9:
+                hedges.append((ms, round(net, 9)))
+            netting.on_netted(ts, 1 if abs(net) > 1e-9 else 0)
+            net, pending = 0., False
+    return hedges
+
+class NettingPolicyTest(unittest.TestCase):
+    def test_immediate(self):
+        netting = NettingPolicy(IMMEDIATE, window=0.5)
+        # gross: one hedge per fill, even if they net to zero later
+        self.assertEqual(_simulate(netting, {0: 1., 100: -1., 200: 2.}, 1000), [(0, 1.), (100, -1.), (200, 2.)])
+        self.assertEqual(netting.report(), 'immediate: fills 3, hedges 3, saved 0, exposure 0.0ms/fill')
+
+    def test_time(self):
+        netting = NettingPolicy(TIME, window=0.5)
+        # net: fills of the window started by the first fill in one hedge
+        self.assertEqual(_simulate(netting, {0: 1., 100: 1., 200: -0.5, 700: 1.}, 2000), [(500, 1.5), (1200, 1.)])
+        # exposure (500 + 400 + 300 + 500) / 4
+        self.assertEqual(netting.report(), 'time: fills 4, hedges 2, saved 2, exposure 425.0ms/fill')
+        # fills netted to zero are not hedged
+        self.assertEqual(_simulate(netting, {0: 1., 100: -1.}, 1000), [])
+        self.assertEqual(netting.report(), 'time: fills 2, hedges 0, saved 2, exposure 450.0ms/fill')
+
+    def test_size(self):
+        netting = NettingPolicy(SIZE, window=1., size=2.)
+        # threshold: hedge once the net exposure reaches the size
+        self.assertEqual(_simulate(netting, {0: 1., 100: 1.5}, 500), [(100, 2.5)])
+        # under the size until the end of the window
+        self.assertEqual(_simulate(netting, {0: 1., 100: -0.5, 200: 1.}, 2000), [(1000, 1.5)])
+        # gross fills of both sides do not reach the size of the net exposure
+        self.assertEqual(_simulate(netting, {0: 1.5, 100: -1.5, 200: 1.5}, 2000), [(1000, 1.5)])
+        self.assertEqual(_simulate(netting, {0: -2.}, 500), [(0, -2.)])
+
+    def test_adaptive(self):
+        netting = NettingPolicy(ADAPTIVE, window=0.5)
+        # the first fill has no gap, hedged at once
+        self.assertEqual(_simulate(netting, {0: 1.}, 100), [(0, 1.)])
+        # fills 50ms apart: a window of 3 gaps is netted
+        hedges = _simulate(netting, {50: 1., 100: 1., 150: 1., 200: 1.}, 1000)
+        self.assertEqual(hedges, [(50, 1.), (250, 3.)])
+        # fills slower than the window are hedged at once
+        netting = NettingPolicy(ADAPTIVE, window=0.5)
+        self.assertEqual(_simulate(netting, {0: 1., 2000: 1., 4000: -1.}, 5000), [(0, 1.), (2000, 1.), (4000, -1.)])
+
+    def test_without_window(self):
+        for policy in (TIME, SIZE, ADAPTIVE, 'unknown'):
+            netting = NettingPolicy(policy, window=0, size=10.)
+            self.assertEqual(_simulate(netting, {0: 1., 100: 1.}, 500), [(0, 1.), (100, 1.)])
+        self.assertEqual(NettingPolicy('unknown', window=1.).policy, IMMEDIATE)
+
+if __name__ == '__main__':
+    unittest.main()
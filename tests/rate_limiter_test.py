@@ -0,0 +1,102 @@
+"""
+Test the request budget of API keys.
+A key without Rate Limit is not throttled and does not touch redis.
+A stalled redis does not block the event loop, and a request is charged once.
+
+Usage: python tests/rate_limiter_test.py
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import unittest
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.utils import rate_limiter
+from tunapy.utils.rate_limiter import RateLimiter, get_rate_limiter, PRIORITY_MAKER
+
+class NoRedis:
+    """ redis must not be called
+    """
+    def __call__(self):
+        raise AssertionError('redis is used')
+
+class StalledRedis:
+    """ redis answering the token bucket script after a delay
+    """
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+        self.done = threading.Event()
+
+    def __call__(self):
+        return self
+
+    def register_script(self, script):
+        return self._run
+
+    def _run(self, keys, args):
+        self.calls += 1
+        time.sleep(self.delay)
+        self.done.set()
+        return '0'
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.rdb = rate_limiter.RDB
+        rate_limiter.RDB = NoRedis()
+
+    def tearDown(self):
+        rate_limiter.RDB = self.rdb
+        rate_limiter._LIMITERS.clear()
+
+    def test_not_configured(self):
+        limiter = RateLimiter('bifu_spot', 'key')
+        self.assertFalse(limiter.enabled)
+        for _ in range(10000):
+            self.assertEqual(limiter.try_acquire('batch_make_orders', PRIORITY_MAKER, 10), 0)
+
+    def test_first_conf_enables(self):
+        limiter = get_rate_limiter('bifu_spot', 'key', {})
+        self.assertFalse(limiter.enabled)
+        self.assertIs(get_rate_limiter('bifu_spot', 'key', {'Limit': 100}), limiter)
+        self.assertTrue(limiter.enabled)
+        self.assertEqual(limiter.capacity, 100)
+        # a later parameter without Rate Limit keeps the budget
+        self.assertIs(get_rate_limiter('bifu_spot', 'key', {}), limiter)
+        self.assertTrue(limiter.enabled)
+
+    def test_redis_timeout(self):
+        redis = StalledRedis(rate_limiter.REDIS_TIMEOUT * 3)
+        rate_limiter.RDB = redis
+        limiter = RateLimiter('bifu_spot', 'key', {'Limit': 100, 'Window': 100})
+
+        async def _acquire():
+            start = time.time()
+            # the event loop keeps running while redis stalls
+            ticks = 0
+            task = asyncio.create_task(limiter.acquire_async('batch_make_orders', PRIORITY_MAKER, 10))
+            while not task.done():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            return await task, time.time() - start, ticks
+
+        admitted, cost, ticks = asyncio.run(_acquire())
+        self.assertTrue(admitted)
+        self.assertLess(cost, rate_limiter.REDIS_TIMEOUT * 2)
+        self.assertGreater(ticks, 5)
+        # charged by the late redis call only, not by the local bucket too
+        self.assertEqual(limiter._tokens, 100)
+        self.assertTrue(redis.done.wait(1))
+        # redis is skipped until the retry interval, the local bucket is charged
+        self.assertTrue(asyncio.run(limiter.acquire_async('batch_make_orders', PRIORITY_MAKER, 10)))
+        self.assertEqual(redis.calls, 1)
+        self.assertAlmostEqual(limiter._tokens, 90, places=3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Test fixed-point prices and quantities of TickScale.
+Floats round to the nearest tick or lot, and strings are exact decimals of ticks and lots.
+
+Usage: python tests/tick_util_test.py
+"""
+import os
+import sys
+import unittest
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.utils.tick_util import TickScale
+
+class TickScaleTest(unittest.TestCase):
+    def test_round_trip(self):
+        # tick sizes 0.1, 0.01 and 1e-8
+        for decimals, values, strs in (
+            (1, [0.1, 0.3, 12.7, 100.0, 99999.9], ['0.1', '0.3', '12.7', '100.0', '99999.9']),
+            (2, [0.01, 0.29, 1.15, 600.57, 0.07], ['0.01', '0.29', '1.15', '600.57', '0.07']),
+            (8, [1e-8, 0.00012345, 0.1, 3.00000001, 21.5], ['0.00000001', '0.00012345', '0.10000000',
+                                                            '3.00000001', '21.50000000']),
+        ):
+            ticks = TickScale(decimals, decimals)
+            for value, value_str in zip(values, strs):
+                units = ticks.to_ticks(value)
+                self.assertEqual(ticks.to_lots(value), units)
+                self.assertEqual(ticks.price_str(units), value_str)
+                self.assertEqual(ticks.qty_str(units), value_str)
+                self.assertEqual(ticks.to_price(units), value)
+                self.assertEqual(ticks.to_qty(units), value)
+                # strings of the API parse back to the same ticks
+                self.assertEqual(ticks.to_ticks(value_str), units)
+                self.assertEqual(ticks.to_lots(value_str), units)
+
+    def test_float_edges(self):
+        ticks = TickScale(2, 8)
+        # 0.29 / 0.01 == 28.999999999999996, truncation would lose a tick
+        self.assertEqual(ticks.to_ticks(0.29), 29)
+        self.assertEqual(ticks.to_ticks(0.57), 57)
+        self.assertEqual(ticks.to_ticks(1.005), 100)   # 1.00499999... in binary
+        self.assertEqual(ticks.to_ticks(0.1 + 0.2), 30)
+        self.assertEqual(ticks.to_lots(0.1 + 0.2), 30000000)
+        self.assertEqual(ticks.to_lots(3 * 1.1), 330000000)
+        # a price between ticks goes to the nearest one
+        self.assertEqual(ticks.to_ticks(600.574), 60057)
+        self.assertEqual(ticks.to_ticks(600.576), 60058)
+        self.assertEqual(ticks.to_ticks(0.004), 0)
+
+    def test_str(self):
+        ticks = TickScale(2, 0)
+        self.assertEqual(ticks.price_str(-1234), '-12.34')
+        self.assertEqual(ticks.price_str(-5), '-0.05')
+        self.assertEqual(ticks.price_str(0), '0.00')
+        self.assertEqual(ticks.qty_str(7), '7')
+        # negative decimals: a tick of 10
+        ticks = TickScale(-1, 3)
+        self.assertEqual(ticks.to_ticks(1234), 123)
+        self.assertEqual(ticks.price_str(123), '1230')
+        self.assertEqual(ticks.to_price(123), 1230.)
+        self.assertEqual(repr(ticks), 'TickScale(-1, 3)')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Test deduplication of trade ids in per-minute buckets.
+A trade id is a duplicate within the window across bucket rollovers, and is forgotten
+when its bucket expires or the filter is full.
+
+Usage: python tests/trade_id_filter_test.py
+"""
+import os
+import sys
+import time
+import unittest
+
+CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CURR_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from tunapy.hedger import trade_id_filter
+from tunapy.hedger.trade_id_filter import TradeIdFilter, BUCKET_SECONDS
+
+# start of a minute
+T0 = 1700000040.0
+
+class FakeRedis:
+    """ sets of redis in memory, pipelines run at once
+    """
+    def __init__(self):
+        self.sets = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.results = []
+
+    def sadd(self, key, value):
+        self.redis.sets.setdefault(key, set()).add(value)
+
+    def expire(self, key, seconds):
+        pass
+
+    def smembers(self, key):
+        self.results.append(set(self.redis.sets.get(key, ())))
+
+    def execute(self):
+        return self.results
+
+class TradeIdFilterTest(unittest.TestCase):
+    def test_duplicate_in_bucket(self):
+        trade_ids = TradeIdFilter('test', window=600)
+        self.assertTrue(trade_ids.add('t1', T0))
+        self.assertTrue(trade_ids.add('t2', T0 + 1))
+        self.assertFalse(trade_ids.add('t1', T0 + 59))
+        self.assertEqual(len(trade_ids), 2)
+        self.assertIn('t2', trade_ids)
+
+    def test_duplicate_across_rollover(self):
+        trade_ids = TradeIdFilter('test', window=600)
+        self.assertTrue(trade_ids.add('t1', T0 + 59.9))
+        self.assertTrue(trade_ids.add('t2', T0 + BUCKET_SECONDS))
+        self.assertFalse(trade_ids.add('t1', T0 + BUCKET_SECONDS))
+        # the last minute of the window
+        self.assertFalse(trade_ids.add('t1', T0 + 599))
+        self.assertFalse(trade_ids.add('t2', T0 + 599))
+        # a duplicate does not open a bucket
+        self.assertEqual([minute - int(T0 // BUCKET_SECONDS) for minute, _ in trade_ids._ring], [0, 1])
+
+    def test_expiry(self):
+        trade_ids = TradeIdFilter('test', window=600)
+        trade_ids.add('t1', T0)
+        trade_ids.add('t2', T0 + 300)
+        # the bucket of t1 is out of the window
+        self.assertTrue(trade_ids.add('t3', T0 + 600))
+        self.assertNotIn('t1', trade_ids)
+        self.assertTrue(trade_ids.add('t1', T0 + 601))
+        self.assertFalse(trade_ids.add('t2', T0 + 601))
+        # all buckets before are out of the window
+        self.assertTrue(trade_ids.add('t4', T0 + 3600))
+        self.assertEqual(len(trade_ids), 1)
+
+    def test_late_trade_id(self):
+        trade_ids = TradeIdFilter('test', window=120)
+        trade_ids.add('t1', T0 + 60)
+        # reported with an older timestamp, kept in the newest bucket
+        self.assertTrue(trade_ids.add('t0', T0))
+        self.assertFalse(trade_ids.add('t0', T0 + 179))
+        self.assertTrue(trade_ids.add('t2', T0 + 180))
+        self.assertNotIn('t0', trade_ids)
+
+    def test_full(self):
+        trade_ids = TradeIdFilter('test', window=600, max_size=3)
+        trade_ids.add('t1', T0)
+        trade_ids.add('t2', T0 + 60)
+        trade_ids.add('t3', T0 + 120)
+        # the oldest bucket is dropped early
+        self.assertTrue(trade_ids.add('t4', T0 + 180))
+        self.assertEqual(len(trade_ids), 3)
+        self.assertNotIn('t1', trade_ids)
+        # the bucket of the current minute is not dropped
+        trade_ids.add('t5', T0 + 180)
+        self.assertFalse(trade_ids.add('t4', T0 + 180))
+        self.assertIn('t4', trade_ids)
+
+    def test_persist(self):
+        saved = trade_id_filter.RDB
+        redis = FakeRedis()
+        trade_id_filter.RDB = lambda: redis
+        try:
+            trade_ids = TradeIdFilter('test', window=600, persist=True)
+            now = time.time()
+            trade_ids.add('t1', now - 120)
+            trade_ids.add('t2', now)
+            self.assertEqual(trade_ids.flush(), 2)
+            self.assertEqual(trade_ids.flush(), 0)
+            # a restarted hedger loads trade ids of the window
+            restarted = TradeIdFilter('test', window=600, persist=True)
+            self.assertEqual(restarted.load(), 2)
+            self.assertFalse(restarted.add('t1', now))
+            self.assertFalse(restarted.add('t2', now))
+        finally:
+            trade_id_filter.RDB = saved
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,30 +1,66 @@
+import threading
+import traceback
+import importlib
+from importlib import metadata
 from logging import Logger
+from concurrent.futures import ThreadPoolExecutor
 
 from octopuspy.exchange.base_restapi import ClientParams
-from octopuspy.exchange.binance.spot_restapi import BnSpotClient
-from octopuspy.exchange.binance.future_restapi import BnFutureClient    # Portfolio margin
-from octopuspy.exchange.binance.umfuture_restapi import BnUMFutureClient    # UMFuture
-from octopuspy.exchange.okx.spot_restapi import OkxSpotClient
-from octopuspy.exchange.okx.future_restapi import OkxFutureClient
-from octopuspy.exchange.bifu.spot_restapi import BifuSpotClient
-from octopuspy.exchange.bifu.future_restapi import BifuFutureClient
-
-# CONST EXCHANGE CLIENT TYPE
+
+# CONST EXCHANGE CLIENT TYPE, "module:Class" imported on first use
 EXCHANGE_CHANNEL = {
-    "binance_spot" : BnSpotClient,
-    "binance_UMFuture" : BnUMFutureClient,
-    "binance_portfolio_margin" : BnFutureClient,
-    "okx_spot" : OkxSpotClient,
-    "okx_future" : OkxFutureClient,
-    "bifu_spot" : BifuSpotClient,
-    "bifu_future" : BifuFutureClient
+    "binance_spot" : "octopuspy.exchange.binance.spot_restapi:BnSpotClient",
+    "binance_UMFuture" : "octopuspy.exchange.binance.umfuture_restapi:BnUMFutureClient",   # UMFuture
+    "binance_portfolio_margin" : "octopuspy.exchange.binance.future_restapi:BnFutureClient",  # Portfolio margin
+    "okx_spot" : "octopuspy.exchange.okx.spot_restapi:OkxSpotClient",
+    "okx_future" : "octopuspy.exchange.okx.future_restapi:OkxFutureClient",
+    "bifu_spot" : "octopuspy.exchange.bifu.spot_restapi:BifuSpotClient",
+    "bifu_future" : "octopuspy.exchange.bifu.future_restapi:BifuFutureClient"
 }
+# entry point group of exchange clients provided by other packages, name -> "module:Class"
+ENTRY_POINT_GROUP = 'tunapy.exchange_clients'
+_entry_points_loaded = False
+
+# keep-alive connections of each pooled client
+POOL_MAXSIZE = 20
+# connections opened by warm-up of each pooled client
+WARM_CONNECTIONS = 4
+
+# pooled private clients, {(exchange, api_key): (api_secret, passphrase, client)}
+_CLIENT_POOL = {}
+_CLIENT_POOL_LOCK = threading.Lock()
 
-def _list_channels():
-    return EXCHANGE_CHANNEL.keys()
+def register_channel(exchange_name: str, client_type):
+    """ register an exchange client class, or "module:Class" to import on first use
+    """
+    EXCHANGE_CHANNEL[exchange_name] = client_type
+
+def _load_entry_points():
+    """ add exchange clients registered by entry points, built-in channels are not replaced
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+        EXCHANGE_CHANNEL.setdefault(entry_point.name, entry_point.value)
+
+def _list_channels() -> list:
+    """ names of all exchange clients, built-in and registered by entry points
+    """
+    _load_entry_points()
+    return sorted(EXCHANGE_CHANNEL)
 
 def _get_channel(exchange_name:str):
-    return EXCHANGE_CHANNEL.get(exchange_name, None)
+    if exchange_name not in EXCHANGE_CHANNEL:
+        _load_entry_points()
+    client_type = EXCHANGE_CHANNEL.get(exchange_name, None)
+    if isinstance(client_type, str):
+        # import the client module on first use, and cache the class
+        module_name, _, class_name = client_type.partition(':')
+        client_type = getattr(importlib.import_module(module_name), class_name)
+        EXCHANGE_CHANNEL[exchange_name] = client_type
+    return client_type
 
 def get_market_client(exchange: str, logger: Logger = None):
     """ create public market client
@@ -38,7 +74,7 @@ def get_private_client(
     passphrase: str = '',
     logger: Logger = None
 ):
-    """ create private user client
+    """ create private user client, None if the exchange is unknown
     """
     client_type = _get_channel(exchange_name=exchange)
     if client_type:
@@ -47,4 +83,56 @@ def get_private_client(
                                      secret=api_secret,
                                      passphrase=passphrase)
         return client_type(params=client_params, logger=logger)
+    if logger:
+        logger.error('Unknown exchange %s, known exchanges: %s', exchange, ', '.join(_list_channels()))
     return None
+
+def _mount_keep_alive(client, pool_maxsize: int):
+    """ enlarge the keep-alive connection pool of the requests session of client, if any
+    """
+    session = getattr(client, 'session', None) or getattr(client, '_session', None)
+    if session is None or not hasattr(session, 'mount'):
+        return
+    from requests.adapters import HTTPAdapter
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+def get_pooled_client(
+    exchange: str,
+    api_key: str,
+    api_secret: str,
+    passphrase: str = '',
+    logger: Logger = None
+):
+    """ get the private client shared by all symbols of (exchange, api_key),
+        the client is created on first use, and created again if the secret or passphrase
+        is rotated. Holders of the replaced client keep it until they get the client again
+    """
+    key = (exchange, api_key)
+    with _CLIENT_POOL_LOCK:
+        if _CLIENT_POOL.get(key, ())[:2] != (api_secret, passphrase):
+            client = get_private_client(exchange, api_key, api_secret, passphrase, logger)
+            if client is None:
+                return None
+            _mount_keep_alive(client, POOL_MAXSIZE)
+            _CLIENT_POOL[key] = (api_secret, passphrase, client)
+        return _CLIENT_POOL[key][2]
+
+def warm_up_client(client, symbols: list, logger: Logger = None):
+    """ open keep-alive connections of client before the first orders by top_askbid of symbols,
+        at most WARM_CONNECTIONS requests are sent concurrently, failures are ignored
+    """
+    symbols = list(symbols)[:WARM_CONNECTIONS]
+    if not client or not symbols:
+        return
+
+    def _touch(symbol: str):
+        try:
+            client.top_askbid(symbol)
+        except Exception:
+            if logger:
+                logger.warning('Warm up %s failed: %s', symbol, traceback.format_exc())
+
+    with ThreadPoolExecutor(len(symbols)) as pool:
+        list(pool.map(_touch, symbols))
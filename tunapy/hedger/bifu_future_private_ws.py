@@ -14,6 +14,7 @@ class BiFuFuturePrivateWSClient(PrivateWSClient):
         self.path = '/api/v1/private/contract/ws'
         self._ws_client = None  # create web client in start function
         self._handle_trade_filled = None  # function to process filled trades，setup in start function
+        self._handle_order_update = None  # function to process order status, setup in start function
 
     def on_message(self, message):
         """ handle the message from the execution report stream
@@ -21,7 +22,11 @@ class BiFuFuturePrivateWSClient(PrivateWSClient):
         self.logger.debug("message received: %s", message)  #for debug
         if message.get('type') == 'contract-trade-event':
             try:
-                for filled_order in message['msg']['data']['orderFillTransaction']:
+                data = message['msg']['data']
+                if self._handle_order_update:
+                    self._on_order_update(data)
+                filled_orders = data['orderFillTransaction'] if self._handle_trade_filled else []
+                for filled_order in filled_orders:
                     self.logger.info("filled order message: %s", filled_order)
                     if ((not MOCK_TRADE and filled_order['direction'] == 'MAKER' and filled_order['accountId'] != filled_order['matchAccountId'])
                         or
@@ -78,8 +83,21 @@ class BiFuFuturePrivateWSClient(PrivateWSClient):
         """
         self.logger.info('subscribed to execution report for symbol: %s, please check the log for filled orders', symbol)
 
-    def start(self, symbol, on_open, on_close, handle_trade_filled, on_error):
+    def _on_order_update(self, data: dict):
+        """ handle the order status of the execution report stream, such as
+            {"id": "722137100480151760", "clientOrderId": "...", "status": "OPEN", ...}
+        """
+        for order in data.get('order', []):
+            self._handle_order_update(
+                order.get('contractId') or order.get('symbolId', ''),
+                order.get('id', ''),
+                order.get('status', ''),
+                order.get('clientOrderId', ''),
+            )
+
+    def start(self, symbol, on_open, on_close, handle_trade_filled, on_error, handle_order_update=None):
         self._handle_trade_filled = handle_trade_filled
+        self._handle_order_update = handle_order_update
         self._ws_client = self._ws_connect(on_open, on_close, on_error)
 
     def _sign(self) -> dict:
@@ -14,13 +14,18 @@ class BiFuPrivateWSClient(PrivateWSClient):
         self.path = '/api/v1/private/spot/ws'
         self._ws_client = None  # create web client in start function
         self._handle_trade_filled = None  # function to process filled trades，setup in start function
+        self._handle_order_update = None  # function to process order status, setup in start function
 
     def on_message(self, message):
         """ handle the message from the execution report stream
         """
         if message.get('type') == 'spot-trade-event':
             try:
-                for filled_order in message['msg']['data']['orderFillTransaction']:
+                data = message['msg']['data']
+                if self._handle_order_update:
+                    self._on_order_update(data)
+                filled_orders = data['orderFillTransaction'] if self._handle_trade_filled else []
+                for filled_order in filled_orders:
                     if ((not MOCK_TRADE and filled_order['direction'] == 'MAKER' and filled_order['accountId'] != filled_order['matchAccountId'])
                         or
                         (MOCK_TRADE and filled_order['direction'] == 'MAKER')):  # filled with user order or mock trade
@@ -87,8 +92,21 @@ class BiFuPrivateWSClient(PrivateWSClient):
         """
         self.logger.info('subscribed to execution report for symbol: %s, please check the log for filled orders', symbol)
 
-    def start(self, symbol, on_open, on_close, handle_trade_filled, on_error):
+    def _on_order_update(self, data: dict):
+        """ handle the order status of the execution report stream, such as
+            {"id": "722137100480151760", "clientOrderId": "...", "status": "OPEN", ...}
+        """
+        for order in data.get('order', []):
+            self._handle_order_update(
+                order.get('symbolId', ''),
+                order.get('id', ''),
+                order.get('status', ''),
+                order.get('clientOrderId', ''),
+            )
+
+    def start(self, symbol, on_open, on_close, handle_trade_filled, on_error, handle_order_update=None):
         self._handle_trade_filled = handle_trade_filled
+        self._handle_order_update = handle_order_update
         self._ws_client = self._ws_connect(on_open, on_close, on_error)
 
     def _sign(self) -> dict:
@@ -0,0 +1,141 @@
+""" Binance user data stream of the hedge account, reports the execution of hedge orders
+"""
+import time
+import threading
+import traceback
+from logging import Logger
+
+import requests
+
+from tunapy.management.hedging import PrivateWSClient
+from tunapy.hedger.websocket_client import UserWebsocketStreamClient
+
+# hedge exchange -> (REST URL, listen key path, stream URL)
+USER_STREAM_ENDPOINTS = {
+    'binance_spot': ('https://api.binance.com', '/api/v3/userDataStream',
+                     'wss://stream.binance.com:9443/ws/'),
+    'binance_UMFuture': ('https://fapi.binance.com', '/fapi/v1/listenKey',
+                         'wss://fstream.binance.com/ws/'),
+    'binance_portfolio_margin': ('https://papi.binance.com', '/papi/v1/listenKey',
+                                 'wss://fstream.binance.com/pm/ws/'),
+}
+# a listen key expires in 60 minutes without keep-alive
+KEEP_ALIVE_INTERVAL = 1800
+# seconds between checks of the connection
+RECONNECT_INTERVAL = 5
+REST_TIMEOUT = 5
+
+class BnUserStreamClient(PrivateWSClient):
+    """ order events of the Binance spot or futures user data stream,
+        handle_order_update(symbol, order_id, status, client_id, executed_qty, executed_amt)
+        is called in the stream thread with cumulative executed quantity and amount
+    """
+    def __init__(self, exchange: str, config: dict, logger: Logger) -> None:
+        super().__init__(config, logger)
+        rest_url, self.path, stream_url = USER_STREAM_ENDPOINTS[exchange]
+        self.rest_url = config.get('REST URL', rest_url)
+        self.stream_url = self.stream_url or stream_url
+        self.connected = False  # True if order events are being received
+        self._ws_client = None
+        self._listen_key = ''
+        self._keep_alive_ts = 0.0
+        self._stop = False
+
+    def _listen_key_request(self, method: str) -> dict:
+        # spot renews the given listen key, futures renew the listen key of the API key
+        params = {'listenKey': self._listen_key} if method == 'PUT' and 'api/v3' in self.path else {}
+        res = requests.request(method, f'{self.rest_url}{self.path}', params=params,
+                               headers={'X-MBX-APIKEY': self.api_key}, timeout=REST_TIMEOUT)
+        res.raise_for_status()
+        return res.json()
+
+    def _connect(self):
+        self._listen_key = self._listen_key_request('POST')['listenKey']
+        self._keep_alive_ts = time.time()
+        self._ws_client = UserWebsocketStreamClient(
+            stream_url=f'{self.stream_url}{self._listen_key}',
+            on_open=self._on_open,
+            on_close=self._on_close,
+            on_error=self.on_error,
+            on_message=self.on_message,
+            client_id=self.api_key,
+            logger=self.logger)
+
+    def _on_open(self):
+        self.connected = True
+        if self.on_open:
+            self.on_open()
+
+    def _on_close(self):
+        self.connected = False
+        if self.on_close:
+            self.on_close()
+
+    def _maintain(self):
+        """ keep the listen key alive, and reconnect if the stream is closed
+        """
+        while not self._stop:
+            time.sleep(RECONNECT_INTERVAL)
+            try:
+                if not self.connected:
+                    self.logger.warning('Hedge user stream disconnected, reconnecting...')
+                    if self._ws_client:
+                        self._ws_client.close()
+                    self._connect()
+                elif time.time() > self._keep_alive_ts + KEEP_ALIVE_INTERVAL:
+                    self._listen_key_request('PUT')
+                    self._keep_alive_ts = time.time()
+            except Exception:
+                self.connected = False
+                self.logger.error(traceback.format_exc())
+
+    def on_message(self, message):
+        """ handle the message of the user data stream
+        """
+        event = message.get('e')
+        if event == 'executionReport':
+            # spot: cumulative quantity z, cumulative quote quantity Z
+            order = message
+            executed_amt = float(order['Z'])
+        elif event == 'ORDER_TRADE_UPDATE':
+            # futures: cumulative quantity z, average price ap
+            order = message['o']
+            executed_amt = float(order['z']) * float(order['ap'])
+        elif event == 'listenKeyExpired':
+            self.logger.warning('Hedge user stream listen key expired')
+            self.connected = False
+            return
+        else:
+            return
+        try:
+            if self.handle_order_update:
+                self.handle_order_update(order['s'], str(order['i']), order['X'], order['c'],
+                                         float(order['z']), executed_amt)
+        except Exception:
+            self.logger.error(traceback.format_exc())
+
+    def subscribe_execution_report(self, symbol: str):
+        """ the user data stream reports all orders of the account, no need to subscribe
+        """
+        self.logger.info('subscribed to hedge user stream, hedge symbol: %s', symbol)
+
+    def start(self, symbol, on_open, on_close, handle_trade_filled, on_error, handle_order_update=None):
+        super().start(symbol, on_open, on_close, handle_trade_filled, on_error, handle_order_update)
+        try:
+            self._connect()
+        except Exception:
+            # retried by the maintain thread, hedge orders are confirmed by REST meanwhile
+            self.logger.error(traceback.format_exc())
+        threading.Thread(target=self._maintain, daemon=True).start()
+
+    def close(self):
+        self._stop = True
+        if self._ws_client:
+            self._ws_client.close()
+
+def get_hedge_stream(exchange: str, api_key: str, config: dict, logger: Logger):
+    """ the private stream reporting hedge orders, None if not supported by the hedge exchange
+    """
+    if exchange not in USER_STREAM_ENDPOINTS:
+        return None
+    return BnUserStreamClient(exchange, dict(config, **{'API KEY': api_key}), logger)
@@ -0,0 +1,112 @@
+""" Price hedge orders by the order book of the hedge symbol in the quote store:
+    cross the book within the slippage budget, one child order per level of depth
+"""
+import math
+
+from tunapy.quote.redis_client import DATA_REDIS_CLIENT
+from tunapy.utils.tick_util import TickScale
+
+EXCHANGE_DEPTH_PREFIX = 'depth'
+# binance have 2 types of future: UMFuture and portfolio_margin, both quoted as binance_future
+DEPTH_EXCHANGE = {
+    "binance_UMFuture": "binance_future",
+    "binance_portfolio_margin": "binance_future",
+}
+# seconds, an older book is not used for pricing
+MAX_BOOK_AGE = 1.0
+# child orders of one hedge, client ids of children are cl_order_id * 10 + index
+MAX_CHILD_ORDERS = 5
+
+def get_hedge_book(exchange: str, symbol: str) -> dict:
+    """ the recent order book of the hedge symbol, None if not quoted, stale or unavailable
+    """
+    _exchange_prefix = DEPTH_EXCHANGE.get(exchange, exchange)
+    symbol_key = f'{_exchange_prefix}_{EXCHANGE_DEPTH_PREFIX}{symbol.lower()}'
+    try:
+        book = DATA_REDIS_CLIENT.get_recent_order_book(symbol_key, MAX_BOOK_AGE)
+    except Exception:
+        # quote store unavailable, hedge without the book
+        return None
+    if not book or not book.get('asks') or not book.get('bids'):
+        return None
+    return book
+
+def _limit_ticks(price: float, side: str, slippage: float, scale: TickScale) -> int:
+    """ the worst price allowed by slippage from price, rounded to the aggressive tick
+    """
+    if side == 'SELL':
+        return math.floor(price * (1 - slippage) * scale.price_scale + 1e-9)
+    return math.ceil(price * (1 + slippage) * scale.price_scale - 1e-9)
+
+def plan_hedge_orders(book: dict, side: str, qty: float, ref_price: float, slippage: float,
+                      scale: TickScale, min_qty: float = 0, min_amt: float = 0,
+                      limit_price: float = None) -> list:
+    """ split the hedge of qty into [(price ticks, lots)] of marketable orders.
+        The levels of the opposite side within slippage from the top of book, or up to limit_price
+        if given, are taken one by one, the quantity over the visible depth goes to the limit.
+        Without a book, one order is priced at the slippage limit from ref_price, the average price
+        of maker fills. A child under min_qty or min_amt is merged into the next, more aggressive one.
+    """
+    lots = scale.to_lots(qty)
+    if lots <= 0:
+        return []
+    if not book:
+        return [(_limit_ticks(ref_price, side, slippage, scale), lots)]
+    levels = book['bids'] if side == 'SELL' else book['asks']
+    if limit_price is None:
+        limit = _limit_ticks(levels[0][0], side, slippage, scale)
+    else:
+        limit = _limit_ticks(limit_price, side, 0, scale)
+    orders = []
+    carry = 0   # lots of small levels, merged into the next order
+    ticks = limit
+    for price, size in levels:
+        ticks = scale.to_ticks(price)
+        if (side == 'SELL' and ticks < limit) or (side == 'BUY' and ticks > limit):
+            break
+        fill = min(lots, scale.to_lots(size))
+        if fill <= 0:
+            continue
+        lots -= fill
+        carry += fill
+        if (scale.to_qty(carry) >= min_qty and scale.to_qty(carry) * scale.to_price(ticks) >= min_amt
+                and len(orders) < MAX_CHILD_ORDERS - 1):
+            orders.append((ticks, carry))
+            carry = 0
+        if lots <= 0:
+            break
+    # over the visible depth: at the slippage limit, left by small levels: at the last level
+    ticks = limit if lots > 0 else ticks
+    carry += lots
+    if carry > 0:
+        if orders and orders[-1][0] == ticks:
+            orders[-1] = (ticks, orders[-1][1] + carry)
+        else:
+            orders.append((ticks, carry))
+    return orders
+
+def allocate_hedge(books: list, side: str, qty: float, slippage: float) -> tuple:
+    """ split the hedge of qty over venues by executable price: the levels of all books within
+        slippage from the best top of book are taken best first, a venue listed first wins a tie.
+        Return (limit price, [quantity of each venue], quantity over the visible depth),
+        None if no venue has a book with levels of the side
+    """
+    key = 'bids' if side == 'SELL' else 'asks'
+    sign = 1 if side == 'SELL' else -1     # higher is better for SELL, lower for BUY
+    books = [book if book and book.get(key) else None for book in books]
+    tops = [book[key][0][0] for book in books if book]
+    if not tops:
+        return None
+    best_price = max(tops) if side == 'SELL' else min(tops)
+    limit = best_price * (1 - sign * slippage)
+    levels = sorted((-sign * price, idx, size) for idx, book in enumerate(books) if book
+                    for price, size in book[key] if sign * price >= sign * limit)
+    allocation = [0.0] * len(books)
+    rest = qty
+    for _, idx, size in levels:
+        fill = min(rest, size)
+        allocation[idx] += fill
+        rest -= fill
+        if rest <= 0:
+            break
+    return limit, allocation, max(rest, 0.0)
@@ -4,8 +4,11 @@ import os
 import sys
 import json
 import time
+import threading
 import traceback
 from logging import Logger
+from functools import partial
+from collections import deque, namedtuple
 from concurrent.futures import ThreadPoolExecutor
 
 CURR_PATH = os.path.dirname(os.path.abspath(__file__))
@@ -13,18 +16,116 @@ BASE_PATH = os.path.dirname(os.path.dirname(CURR_PATH))
 if BASE_PATH not in sys.path:
     sys.path.insert(0, BASE_PATH)
 
-from tunapy.utils.config_util import load_config
+from tunapy.utils.config_util import load_config, load_configs
 # from env import HEDGE_API_KEY, HEDGE_API_SECRET
 from octopuspy.utils.log_util import create_logger
 from octopuspy.exchange.base_restapi import NewOrder, OrderStatus
 from tunapy.management.hedging import PrivateWSClient, TokenParameter, FilledOrder
 from tunapy.hedger.bifu_private_ws import BiFuPrivateWSClient
 from tunapy.hedger.bifu_future_private_ws import BiFuFuturePrivateWSClient
-from tunapy.cexapi.helper import get_private_client
+from tunapy.hedger.bn_user_stream import get_hedge_stream
+from tunapy.hedger.trade_id_filter import TradeIdFilter
+from tunapy.hedger.netting import NettingPolicy
+from tunapy.hedger.hedge_pricing import get_hedge_book, plan_hedge_orders, allocate_hedge
+from tunapy.utils.tick_util import TickScale
+from tunapy.hedger.journal import (HedgeJournal, COMPACT_SIZE,
+                                   FILL, HEDGE, COVER, PLACED, CONFIRM, POSITION)
+from tunapy.cexapi.helper import get_pooled_client
+from tunapy.utils.rate_limiter import get_rate_limiter, PRIORITY_HEDGE
 
 # Exchange constants
 EXCHANGE_BN = "binance"
 EXCHANGE_OKX = "okx"
+# seconds between checks of hedge tasks if no fill arrives
+IDLE_INTERVAL = 0.1
+# seconds between checks of config updates in redis
+CONFIG_CHECK_INTERVAL = 1.0
+# threads of the hedge pool of one symbol
+HEDGE_POOL_SIZE = 10
+# seconds to wait for the hedge stream to report a final status before querying by REST
+HEDGE_CONFIRM_TIMEOUT = 2.0
+# seconds to keep order events of the hedge stream, including orders not put by the hedger
+HEDGE_UPDATE_TTL = 600
+FINAL_STATUS = ('FILLED', 'CANCELED', 'CANCELLED', 'REJECTED', 'EXPIRED', 'EXPIRED_IN_MATCH')
+# seconds between checks of the hedge book for open hedge orders
+CHASE_CHECK_INTERVAL = 0.2
+# cancels of open hedge orders without a final status, then the hedge is left to be checked manually
+MAX_CANCELS = 3
+# seconds a hedge order may stay open without chasing, then it is canceled and the rest parked
+HEDGE_OPEN_TIMEOUT = 30.0
+
+HedgeOrder = namedtuple("HedgeOrder", ["order_id", "price"])
+# key: '' for the primary venue, name: hedge symbol@hedge exchange
+HedgeVenue = namedtuple("HedgeVenue", ["key", "name", "exchange", "symbol", "api_key", "client",
+                                       "rate_limiter", "scale"])
+
+_last_cl_order_id = 0
+
+def _new_cl_order_id() -> int:
+    """ client order id of a hedge, the timestamp in ms, unique among hedgers of the process
+    """
+    global _last_cl_order_id
+    _last_cl_order_id = max(int(1000 * time.time()), _last_cl_order_id + 1)
+    return _last_cl_order_id
+
+def hedge_order_key(order_id: str, venue_key: str = '') -> str:
+    """ key of a hedge order in hedge tasks and the journal: the order id on the primary venue,
+        order id/venue on other venues, order ids of different venues may be the same
+    """
+    return f'{order_id}/{venue_key}' if venue_key else order_id
+
+def _send_hedge_orders(
+    hedge_client,
+    hedge_strategy: dict,
+    cl_order_id: int,
+    hedge_side: str,
+    plan: list,
+    logger,
+    rate_limiter=None,
+    venue_key: str = ''
+) -> list:
+    """ place child orders [(price ticks, lots)] of a hedge by one batch_make_orders call,
+        return HedgeOrder of child orders placed
+    """
+    hedge_symbol = hedge_strategy['symbol']
+    scale = hedge_strategy['scale']
+    # Set position side for future hedge
+    position_side = ''
+    if hedge_strategy['biz_type'].upper() == 'FUTURE':
+        position_side = 'SHORT' if hedge_side == 'SELL' else 'LONG'
+    new_orders = [NewOrder(
+        symbol=hedge_symbol,
+        client_id=cl_order_id * 10 + idx,
+        side = hedge_side,
+        type='LIMIT',
+        quantity=scale.qty_str(lots),
+        price=scale.price_str(ticks),
+        biz_type=hedge_strategy['biz_type'],
+        tif=hedge_strategy['tif'],
+        position_side=position_side
+    ) for idx, (ticks, lots) in enumerate(plan)]
+    logger.info('Creating hedge orders: %s', new_orders)
+
+    # Execute hedge using batch_make_orders method
+    try:
+        if rate_limiter:
+            rate_limiter.acquire('batch_make_orders', PRIORITY_HEDGE, len(new_orders))
+        order_ids = hedge_client.batch_make_orders(
+            orders=new_orders,
+            symbol=hedge_symbol
+        )
+
+        logger.info('Hedge order placed: %s', order_ids)
+
+        # 从响应中获取订单ID
+        hedge_orders = [HedgeOrder(hedge_order_key(str(item.order_id), venue_key), scale.to_price(ticks))
+                        for item, (ticks, _) in zip(order_ids or [], plan) if item.order_id]
+        if not hedge_orders:
+            logger.error('Empty response from batch_make_orders')
+        return hedge_orders
+    except Exception as e:
+        logger.error('Hedge execution failed: %s', traceback.format_exc())
+        return []
 
 # Hedge execution function
 def instant_hedge(
@@ -34,8 +135,9 @@ def instant_hedge(
     hedge_side: str,
     hedge_qty: float,
     hedge_price: float,
-    logger
-) -> str:
+    logger,
+    rate_limiter=None
+) -> list:
     """ Execute hedge operation
     Args:
         hedge_client: Hedge client instance
@@ -43,67 +145,124 @@ def instant_hedge(
         cl_order_id: Client order ID
         hedge_side: Hedge direction (BUY/SELL)
         hedge_qty: Hedge quantity
-        hedge_price: Hedge price
+        hedge_price: Average price of maker fills, used if the hedge symbol has no recent book
         logger: Logger
+        rate_limiter: Request budget of the hedge API key, hedge orders go first
     
     Returns:
-        str: Hedge order ID
+        list: HedgeOrder of child orders
     """
     hedge_symbol = hedge_strategy['symbol']
     
-    logger.info('Hedge %s, %s %s %s @ %s',
-                cl_order_id, hedge_side, hedge_qty, hedge_symbol, hedge_price)
+    # if hedge_qty is 0, return
+    # so far, skip hedge if hedge_qty is 0
 
     if not hedge_symbol:
         logger.error('Hedge symbol is empty')
-        return ''
+        return []
 
     try:
         if not hedge_client:
             logger.error('Hedge client is None')
-            return ''
+            return []
         
         logger.info('Executing hedge for %s', hedge_symbol)
-        
-        # Create NewOrder object
-        new_order = NewOrder(
-            symbol=hedge_symbol,
-            client_id=cl_order_id,
-            side = hedge_side,
-            type='LIMIT',
-            quantity=hedge_qty,
-            price=hedge_price,
-            biz_type=hedge_strategy['biz_type'],
-            tif='GTC',
-            position_side=''
-        )
-        
-        # Set position side for future hedge
-        if hedge_strategy['biz_type'].upper() == 'FUTURE':
-            new_order.position_side = 'SHORT' if hedge_side == 'SELL' else 'LONG'
-        logger.info('Creating hedge order: %s', new_order)
-        
-        # Execute hedge using batch_make_orders method
-        try:
-            order_ids = hedge_client.batch_make_orders(
-                orders=[new_order],
-                symbol=hedge_symbol
-            )
-            
-            logger.info('Hedge order placed: %s', order_ids)
-            
-            # 从响应中获取订单ID
-            if order_ids and len(order_ids) > 0:
-                return order_ids[0].order_id
-            else:
-                logger.error('Empty response from batch_make_orders')
-                return ''
-        except Exception as e:
-            logger.error('Hedge execution failed: %s', traceback.format_exc())
-            return ''
+
+        # cross the book of the hedge symbol within slippage, split by depth
+        book = get_hedge_book(hedge_strategy['exchange'], hedge_symbol)
+        if not book:
+            logger.warning('No recent order book of %s, hedge at %s from the maker price',
+                           hedge_symbol, hedge_strategy['slippage'])
+        plan = plan_hedge_orders(book, hedge_side, hedge_qty, hedge_price, hedge_strategy['slippage'],
+                                 hedge_strategy['scale'], hedge_strategy['min_qty'], hedge_strategy['min_amt'])
+        if not plan:
+            logger.error('Hedge quantity %s is less than one lot', hedge_qty)
+            return []
+        return _send_hedge_orders(hedge_client, hedge_strategy, cl_order_id, hedge_side, plan,
+                                  logger, rate_limiter)
     except Exception as e:
         logger.error('Hedge execution failed: %s', traceback.format_exc())
-        return ''
+        return []
+
+def route_hedge(
+    venues: list,
+    hedge_strategy: dict,
+    cl_order_id: int,
+    hedge_side: str,
+    hedge_qty: float,
+    hedge_price: float,
+    logger,
+    venue_pool: ThreadPoolExecutor
+) -> list:
+    """ Split a hedge over hedge venues by executable price, depth and request budget,
+        and place the child orders of all venues in parallel
+    Args:
+        venues: HedgeVenue of the hedger, the primary venue first
+        venue_pool: Threads sending child orders of each venue
+        others: see instant_hedge
+
+    Returns:
+        list: HedgeOrder of child orders of all venues
+    """
+    try:
+        books = [get_hedge_book(venue.exchange, venue.symbol) for venue in venues]
+        allocation = allocate_hedge(books, hedge_side, hedge_qty, hedge_strategy['slippage'])
+        if not allocation:
+            # without books, hedge on the primary venue from the maker price
+            return instant_hedge(venues[0].client, hedge_strategy, cl_order_id, hedge_side, hedge_qty,
+                                 hedge_price, logger, venues[0].rate_limiter)
+        limit_price, quantities, rest = allocation
+        strategies = [dict(hedge_strategy, symbol=venue.symbol, exchange=venue.exchange, scale=venue.scale)
+                      for venue in venues]
+        plans = {}
+        for idx, venue in enumerate(venues[1:], 1):
+            if quantities[idx] <= 0:
+                continue
+            # whole lots of the venue
+            qty = venue.scale.to_qty(int(quantities[idx] * venue.scale.qty_scale + 1e-9))
+            plan = plan_hedge_orders(books[idx], hedge_side, qty, limit_price, 0, venue.scale,
+                                     hedge_strategy['min_qty'], hedge_strategy['min_amt'], limit_price)
+            if venue.client and plan and qty >= hedge_strategy['min_qty'] and \
+                    qty * limit_price >= hedge_strategy['min_amt'] and \
+                    venue.rate_limiter.try_acquire('batch_make_orders', PRIORITY_HEDGE, len(plan)) <= 0:
+                plans[idx] = plan
+                rest += quantities[idx] - qty
+            else:
+                # too small, or no client or request budget on the venue
+                rest += quantities[idx]
+        # the primary venue takes the rest, over the visible depth at the limit price
+        plans[0] = plan_hedge_orders(books[0], hedge_side, quantities[0] + rest, limit_price, 0,
+                                     venues[0].scale, hedge_strategy['min_qty'], hedge_strategy['min_amt'],
+                                     limit_price)
+        logger.info('Route hedge %s %s: %s', hedge_side, hedge_qty,
+                    {venues[idx].name: plan for idx, plan in plans.items()})
+        futures = [venue_pool.submit(
+            _send_hedge_orders, venues[idx].client, strategies[idx], cl_order_id, hedge_side, plan, logger,
+            # request budget of other venues is taken by routing
+            venues[idx].rate_limiter if idx == 0 else None, venues[idx].key)
+            for idx, plan in plans.items() if plan and venues[idx].client]
+        return [item for future in futures for item in future.result()]
+    except Exception as e:
+        logger.error('Hedge routing failed: %s', traceback.format_exc())
+        return []
+
+def _new_hedge_task(symbol: str, side: str, qty: float, price: float, future=None,
+                    attempt: int = 0) -> dict:
+    """ state of a hedge in the hedge loop
+    """
+    return {
+        "symbol": symbol,
+        "side": side,
+        "qty": qty,
+        "price": price,     # average price of maker fills
+        "future": future,
+        "order_ids": [],    # hedge order ids of child orders, set when the task is done
+        "prices": {},       # prices of child orders, {order_id: price}
+        "done_ts": 0.0,     # placed, or the latest cancel
+        "query_ts": 0.0,    # the latest REST query of open child orders, 0 if not queried
+        "attempt": attempt,     # requotes before this hedge
+        "cancels": 0,       # cancels of open child orders
+    }
 
 class HedgerAgent():
     """The agent for BiFu hedging of risk positions
@@ -116,8 +275,16 @@ class HedgerAgent():
         logger: Logger,
         monitor: Logger,
         config: TokenParameter,
-        ws_client: PrivateWSClient,
+        ws_client: PrivateWSClient = None,
+        hedge_stream: PrivateWSClient = None,
+        hedge_pool: ThreadPoolExecutor = None,
+        wake_event: threading.Event = None,
+        poll_config: bool = True,
     ):
+        """ ws_client and hedge_stream are started by the agent, if given.
+            Hedgers of multiple symbols share hedge_pool and wake_event, see MultiHedger.
+            poll_config: check config updates in redis, MultiHedger checks them for all its hedgers
+        """
         # api key and serect for hedge
         self.hedge_api_key = api_key
         self.hedge_api_secret = api_secret
@@ -129,6 +296,7 @@ class HedgerAgent():
 
         # hedge strategy config
         self.config = config
+        self._poll_config = poll_config
         
         # Initialize hedge client
         self._init_hedge_client()
@@ -136,11 +304,32 @@ class HedgerAgent():
         # hedge strategy related data structure
         self._risk_positions = {}
         # multi-threads for hedging
-        self._hedge_pool = ThreadPoolExecutor(10)
+        self._hedge_pool = hedge_pool or ThreadPoolExecutor(HEDGE_POOL_SIZE)
         self._hedge_tasks = {}
+        # cl_order_ids of finished hedge tasks, appended by done callbacks in the hedge pool
+        self._hedge_done = deque()
+        # order events of the hedge stream and REST queries, drained by the hedge loop
+        self._hedge_updates = deque()
+        # the latest event of hedge orders, {order_id: {status, executed_qty, executed_amt, source, ts}}
+        self._hedge_orders = {}
 
         # stop flag
         self._stop = False
+        # fills handed over by the stream thread (the only producer) to the hedge loop (the only
+        # consumer), deque append and popleft are atomic, so the queue needs no lock.
+        # Only the hedge loop touches _risk_positions and _trade_ids.
+        self._fills = deque()
+        # set by the stream thread on fills and by hedge events, wakes up the hedge loop
+        self._fill_event = wake_event or threading.Event()
+        # when fills are netted into hedges
+        self._netting = NettingPolicy.from_config(self.config, self.logger)
+        self._last_operating_ts = {
+            'config': 0.0,
+            'log': 0.0,
+            'check_tradeid': 0.0,
+            'flush_tradeid': 0.0,
+            'chase': 0.0,
+        }
 
         # performance tracking
         # self._hedge_prformance = {}
@@ -152,15 +341,46 @@ class HedgerAgent():
         self.reporter = logger
 
         self._ws_clients = ws_client # WS client for listening trade events
-        self._ws_clients.start(    # start ws client
-            self.config.maker_symbol,
-            self.on_open,
-            self.on_close,
-            self.handle_trade_filled,
-            self.on_error)
+        if self._ws_clients:
+            self._ws_clients.start(    # start ws client
+                self.config.maker_symbol,
+                self.on_open,
+                self.on_close,
+                self.handle_trade_filled,
+                self.on_error)
+        # private streams of hedge accounts, confirm hedge orders without REST queries, {venue key: stream}
+        self._hedge_streams = {}
+        self._own_hedge_stream = hedge_stream is not None    # started and closed by the agent
+        if hedge_stream:
+            self._hedge_streams[''] = hedge_stream
+            hedge_stream.start(
+                self.config.hedge_symbol,
+                self.on_open,
+                self.on_close,
+                None,
+                self.on_error,
+                self.handle_hedge_order_update)
 
+        name = self.config_key()
         # deduplicate of trade id
-        self._trade_ids = {}
+        self._trade_ids = TradeIdFilter(
+            name,
+            window=self.config.dedupe_window,
+            max_size=self.config.dedupe_max_size,
+            persist=self.config.persist_trade_ids,
+            logger=self.logger)
+        if self.config.persist_trade_ids:
+            self.logger.info('Loaded %d trade ids', self._trade_ids.load())
+        self._flush_task = None
+
+        # write-ahead journal of fills and hedges, replayed to recover from a crash.
+        # Fills arrived meanwhile are only queued, the hedge loop records them after recovery.
+        self._journal = None
+        if self.config.journal:
+            self._journal = HedgeJournal(name, self.logger)
+            self._recover()
+            self._journal.start()
+            self._compact_journal()
 
     def __enter__(self):
         return self
@@ -183,6 +403,29 @@ class HedgerAgent():
         self._stop = True
         # wait for all hedge tasks to finish
         self.wait_for_hedge_multithread(wait=True)
+        if self._trade_ids.persist:
+            self._trade_ids.flush()
+        if self._journal:
+            self._journal.close()
+        if self._own_hedge_stream:
+            self._hedge_streams[''].close()
+        if self._venue_pool:
+            self._venue_pool.shutdown(wait=False)
+
+    def hedge_accounts(self) -> set:
+        """ (hedge exchange, API key) of hedge venues
+        """
+        return {(venue.exchange, venue.api_key) for venue in self._venues}
+
+    def use_hedge_stream(self, hedge_stream: PrivateWSClient, exchange: str = None, api_key: str = None):
+        """ confirm hedge orders of venues of the hedge account by a hedge stream shared with
+            other hedgers, its order events are handed over by handle_hedge_order_update
+        """
+        for venue in self._venues:
+            if (venue.exchange, venue.api_key) == (exchange or self.config.hedge_exchange,
+                                                   api_key or self.hedge_api_key):
+                self._hedge_streams[venue.key] = hedge_stream
+        self._own_hedge_stream = False
 
     def on_open(self):
         """ do something when the execution report stream opened
@@ -197,13 +440,17 @@ class HedgerAgent():
     def _init_hedge_client(self):
         """ Initialize hedge client
         """
+        # request budget shared with the other processes using the hedge API key
+        self._rate_limiter = get_rate_limiter(self.config.hedge_exchange, self.hedge_api_key,
+                                              self.config.rate_limit)
+        self._hedge_client = None
         try:
             # Get hedge exchange type from configuration
             hedge_exchange = self.config.hedge_exchange
             self.logger.info('Initializing hedge client for exchange: %s', hedge_exchange)
             
-            # Create hedge client using get_private_client
-            self._hedge_client = get_private_client(
+            # hedge client shared by hedgers of the same hedge account
+            self._hedge_client = get_pooled_client(
                 exchange=hedge_exchange,
                 api_key=self.hedge_api_key,
                 api_secret=self.hedge_api_secret,
@@ -217,21 +464,112 @@ class HedgerAgent():
                 self.logger.error('Failed to initialize hedge client')
         except Exception as e:
             self.logger.error('Error initializing hedge client: %s', traceback.format_exc())
+        self._venues = [HedgeVenue(
+            '', f'{self.config.hedge_symbol}@{self.config.hedge_exchange}', self.config.hedge_exchange,
+            self.config.hedge_symbol, self.hedge_api_key, self._hedge_client, self._rate_limiter,
+            TickScale(self.config.price_decimals, self.config.qty_decimals))]
+        for param in self.config.hedge_venues:
+            client = None
+            try:
+                client = get_pooled_client(
+                    exchange=param.hedge_exchange,
+                    api_key=param.api_key,
+                    api_secret=param.api_secret,
+                    passphrase=param.passphrase,
+                    logger=self.logger
+                )
+            except Exception:
+                self.logger.error('Error initializing hedge client of %s: %s', param.hedge_exchange,
+                                  traceback.format_exc())
+            name = f'{param.hedge_symbol}@{param.hedge_exchange}'
+            self._venues.append(HedgeVenue(
+                name, name, param.hedge_exchange, param.hedge_symbol, param.api_key, client,
+                get_rate_limiter(param.hedge_exchange, param.api_key, param.rate_limit),
+                TickScale(param.price_decimals, param.qty_decimals)))
+        # {venue key: venue}, {(exchange, symbol): venue key} of venues besides the primary one
+        self._venue_by_key = {venue.key: venue for venue in self._venues}
+        self._venue_keys = {(venue.exchange, venue.symbol.lower()): venue.key for venue in self._venues[1:]}
+        # child orders of all venues are sent in parallel
+        self._venue_pool = ThreadPoolExecutor(HEDGE_POOL_SIZE) if len(self._venues) > 1 else None
 
     def handle_trade_filled(self, data: FilledOrder):
-        """ handle trade filled event
+        """ handle trade filled event in the stream thread: hand it over to the hedge loop
+        """
+        self._fills.append((data, time.time()))
+        self._fill_event.set()
+
+    def _drain_fills(self) -> int:
+        """ record fills handed over by the stream thread, return the number of fills
+        """
+        count = 0
+        while self._fills:
+            data, report_time = self._fills.popleft()
+            try:
+                self._record_fill(data, report_time)
+            except Exception:
+                self.logger.error("Failed to record fill %s: %s", data, traceback.format_exc())
+            count += 1
+        return count
+
+    def handle_hedge_order_update(self, symbol: str, order_id: str, status: str, client_id: str = '',
+                                  executed_qty: float = 0., executed_amt: float = 0., exchange: str = ''):
+        """ handle order event of the hedge stream in the stream thread: hand it over to the hedge loop,
+            exchange is the exchange of the stream, the primary venue if empty
+        """
+        venue_key = self._venue_keys.get((exchange or self.config.hedge_exchange, symbol.lower()))
+        if venue_key is None:
+            if exchange and exchange != self.config.hedge_exchange:
+                # another symbol of the hedge account of a venue
+                return
+            venue_key = ''
+        self._hedge_updates.append((hedge_order_key(str(order_id), venue_key), status, executed_qty,
+                                    executed_amt, 'stream'))
+        self._fill_event.set()
+
+    def _on_hedge_done(self, cl_order_id: int, _future):
+        """ done callback of hedge tasks, called in the hedge pool
+        """
+        self._hedge_done.append(cl_order_id)
+        self._fill_event.set()
+
+    def _venue_order(self, order_key: str) -> tuple:
+        """ (venue, order id on the venue) of a hedge order key
+        """
+        order_id, _, venue_key = order_key.partition('/')
+        return self._venue_by_key.get(venue_key, self._venues[0]), order_id
+
+    def _query_hedge_order(self, order_key: str):
+        """ query hedge order by REST in the hedge pool, if the hedge stream has not reported it
+        """
+        status, executed_qty = '', 0.
+        try:
+            venue, order_id = self._venue_order(order_key)
+            self.logger.info('Querying order status for order_id: %s, symbol: %s',
+                             order_id, venue.name)
+            venue.rate_limiter.acquire('order_status', PRIORITY_HEDGE)
+            res:OrderStatus = venue.client.order_status(
+                order_id=order_id,
+                symbol=venue.symbol
+            )[0]
+            self.logger.info('Order status response: %s', res)
+            status, executed_qty = res.status, float(res.executedQty)
+        except Exception:
+            self.logger.error('Error querying order status: %s', traceback.format_exc())
+        self._hedge_updates.append((order_key, status, executed_qty, 0., 'rest'))
+        self._fill_event.set()
+
+    def _record_fill(self, data: FilledOrder, report_time: float):
+        """ add a fill to risk positions
         """
         self.logger.debug("handle_trade_filled: %s", data.trade_id)
-        report_time = time.time()
         trade_id = data.trade_id
 
         if not trade_id:
             self.logger.error("Cannot get trade id from message: %s", data)
             return
 
-        if trade_id in self._trade_ids:
+        if not self._trade_ids.add(trade_id, report_time):
             return
-        self._trade_ids[trade_id] = report_time
 
         qty = float(data.qty)
         amount = float(data.amount)
@@ -250,17 +588,30 @@ class HedgerAgent():
         self.monitor.info(
             "User-WS %s: order_id:%s, trade_id:%s, side: %s, price: %s, qty: %s, total_amt: %s",
             symbol, order_id, trade_id, side, avg_price, qty, amount)
+        if self._journal:
+            self._journal.append(FILL, trade_id, order_id, symbol, side, qty, amount, trade_time,
+                                 ts=report_time)
+        self._add_fill(order_id, symbol, side, qty, amount, report_time)
+        self._netting.on_fill(report_time)
+        self.reporter.info("Maker,%s,%s,%s,,%s,%s,%s,",
+                           order_id, symbol, side, avg_price, qty, amount)
+
+    def _add_fill(self, order_id: str, symbol: str, side: str, qty: float, amount: float,
+                  report_time: float):
+        """ add a fill to the risk position of its maker order
+        """
         if order_id not in self._risk_positions:
             self._risk_positions[order_id] = {
                 'symbol': symbol,
                 'qty': qty,
-                'price': avg_price,
+                'price': round(amount / qty, 8),
                 'total_amt': amount,
                 'hedged_qty': 0,
                 'hedged_amt': 0,
                 'created_ts': report_time,
                 'order': {},    # stores multiple trades if partially filled
                 'side': side,
+                'parked': False,    # rest of a hedge out of requotes, hedged again with new fills
             }
         else:
             position = self._risk_positions[order_id]
@@ -268,8 +619,78 @@ class HedgerAgent():
             position['total_amt'] += amount
             # update average price
             position['price'] = position['total_amt'] / position['qty']
-        self.reporter.info("Maker,%s,%s,%s,,%s,%s,%s,",
-                           order_id, symbol, side, avg_price, qty, amount)
+
+    def _recover(self):
+        """ recover risk positions and unconfirmed hedges from the journal
+        """
+        start_ts = time.time()
+        records = self._journal.replay()
+        hedges = {}     # unconfirmed hedges, {cl_order_id: hedge}
+        for rtype, ts, fields in records:
+            if rtype == FILL:
+                trade_id, order_id, symbol, side, qty, amount, _ = fields
+                self._trade_ids.add(trade_id, ts)
+                self._add_fill(order_id, symbol, side, qty, amount, ts)
+            elif rtype == POSITION:
+                order_id, symbol, side, qty, total_amt, hedged_qty, hedged_amt, created_ts = fields
+                self._add_fill(order_id, symbol, side, qty, total_amt, created_ts)
+                self._risk_positions[order_id]['hedged_qty'] = hedged_qty
+                self._risk_positions[order_id]['hedged_amt'] = hedged_amt
+            elif rtype == COVER:
+                _, order_id, hedged_qty, hedged_amt = fields
+                if order_id in self._risk_positions:
+                    self._risk_positions[order_id]['hedged_qty'] = hedged_qty
+                    self._risk_positions[order_id]['hedged_amt'] = hedged_amt
+            elif rtype == HEDGE:
+                cl_order_id, symbol, side, qty, price = fields
+                hedges[cl_order_id] = {'symbol': symbol, 'side': side, 'qty': qty, 'price': price,
+                                       'order_ids': []}
+            elif rtype == PLACED:
+                cl_order_id, order_id = fields
+                if cl_order_id in hedges:
+                    hedges[cl_order_id]['order_ids'].append(order_id)
+            elif rtype == CONFIRM:
+                hedges.pop(fields[0], None)
+        for order_id, position in list(self._risk_positions.items()):
+            if position['hedged_qty'] >= position['qty']:
+                del self._risk_positions[order_id]
+        # placed hedges are confirmed by the hedge stream or REST as new hedges
+        for cl_order_id, hedge in hedges.items():
+            if not hedge['order_ids']:
+                # submitted but the order id was not returned before the crash, never hedge it again
+                self.monitor.error('Unknown hedge before restart, check the hedge account: '
+                                   'client_orderid=%s, %s %s %s @ %s', cl_order_id, hedge['side'],
+                                   hedge['qty'], hedge['symbol'], hedge['price'])
+                continue
+            task = _new_hedge_task(hedge['symbol'], hedge['side'], hedge['qty'], hedge['price'])
+            task.update(order_ids=hedge['order_ids'], done_ts=start_ts)
+            self._hedge_tasks[cl_order_id] = task
+        self.logger.info('Recovered %d risk positions and %d hedges from %d journal records in %.3fs',
+                         len(self._risk_positions), len(self._hedge_tasks), len(records),
+                         time.time() - start_ts)
+
+    def _compact_journal(self):
+        """ replace the journal with the current risk positions and unconfirmed hedges
+        """
+        records = []
+        for order_id, position in self._risk_positions.items():
+            records.append((POSITION, (order_id, position['symbol'], position['side'], position['qty'],
+                                       position['total_amt'], position['hedged_qty'],
+                                       position['hedged_amt'], position['created_ts'])))
+        for cl_order_id, task in self._hedge_tasks.items():
+            records.append((HEDGE, (cl_order_id, task['symbol'], task['side'], task['qty'], task['price'])))
+            for order_id in task['order_ids']:
+                records.append((PLACED, (cl_order_id, order_id)))
+        self._journal.compact(records)
+
+    def _net_exposure(self) -> float:
+        """ net quantity of risk positions not hedged, positive if bought by maker orders
+        """
+        exposure = 0.
+        for position in self._risk_positions.values():
+            qty = position['qty'] - position['hedged_qty']
+            exposure += qty if position['side'] == 'BUY' else -qty
+        return exposure
 
     def _handle_risk_positions(self):
         """ handle risk positions
@@ -301,9 +722,12 @@ class HedgerAgent():
                         'qty': 0,
                         'amt': 0,
                         'order_ids': [],  # maker order ids of the same symbol
+                        'parked': True,   # only parked rests, nothing new to hedge
                     }
 
                 acc_risk_positions[symbol]['order_ids'].append(order_id)
+                if not position['parked']:
+                    acc_risk_positions[symbol]['parked'] = False
                 if side == 'BUY':
                     acc_risk_positions[symbol]['qty'] += hedge_qty
                     acc_risk_positions[symbol]['amt'] += hedge_amt
@@ -314,125 +738,303 @@ class HedgerAgent():
                 self.logger.error("Failed to handle risk position %s: %s", order_id, traceback.format_exc())
 
         res = False
+        netted = False
+        hedges = 0
         if acc_risk_positions:
             self.logger.debug("acc_risk_positions: %s", acc_risk_positions)
         for symbol, position in acc_risk_positions.items():
             try:
                 # use try-except for performance tuning
-                # Temporarily use config object properties as hedge strategy
-                hedge_strategy = {
-                    'symbol': self.config.hedge_symbol,
-                    'min_amt': self.config.min_amt_per_order,
-                    'min_qty': self.config.min_qty_per_order,
-                    'biz_type': self.config.market_type,
-                }
-                # hedge_symbol = hedge_strategy['symbol']
                 hedge_amt = position['amt']
                 hedge_qty = position['qty']
-                if abs(hedge_amt) < hedge_strategy['min_amt'] or \
-                    abs(hedge_qty) < hedge_strategy['min_qty']:
+                if position['parked']:
+                    continue
+                if abs(hedge_amt) < self.config.min_amt_per_order or \
+                    abs(hedge_qty) < self.config.min_qty_per_order:
                     continue
 
                 # update risk positions
+                cl_order_id = _new_cl_order_id()
+                covers = []     # journaled with the hedge, never without it
                 for order_id in position['order_ids']:
                     risk_position = self._risk_positions[order_id]
                     risk_position['hedged_qty'] = risk_position['qty']
                     risk_position['hedged_amt'] = risk_position['total_amt']
+                    risk_position['parked'] = False
+                    covers.append((COVER, (cl_order_id, order_id,
+                                           risk_position['hedged_qty'], risk_position['hedged_amt'])))
+                netted = True
 
                 # do hedge
                 if hedge_qty == 0:
+                    if self._journal:
+                        self._journal.append_group(covers)
                     self.monitor.info('self-hedged %s: %s', symbol, position)
                     continue
                 hedge_side = 'SELL' if hedge_qty > 0 else 'BUY'
 
-                cl_order_id = int(1000 * time.time())
                 hedge_price = abs(hedge_amt) / abs(hedge_qty)
                 self.monitor.info("Pre-Hedge %s: client_orderid=%s, position=%s",
                                   symbol, cl_order_id, position)
-                
-                future = self._hedge_pool.submit(instant_hedge, self._hedge_client, hedge_strategy, cl_order_id,
-                                                 hedge_side, abs(hedge_qty),
-                                                 hedge_price, self.logger)
-                # hedge_time = int(time.time() * 1000)
-                # self.logger.info("[p:hedger-process]%s:%s",
-                #                  symbol, hedge_time - self._hedge_prformance.get(symbol, 0))
-                
-                self._hedge_tasks[cl_order_id] = {
-                    "symbol": symbol,
-                    "future": future,
-                }
-                self.monitor.info('client_orderid=%s, %s %s %s @ %s',
-                                  cl_order_id, hedge_side, hedge_qty, symbol, hedge_price)
+                self._place_hedge(cl_order_id, symbol, hedge_side, abs(hedge_qty), hedge_price,
+                                  covers=covers)
+                hedges += 1
                 res = True
             except Exception as e:
                 self.logger.error(f"Error handling risk positions for {symbol}: {e}")
+        if netted:
+            self._netting.on_netted(time.time(), hedges)
         return res
 
-    def _remove_trade_id(self):
-        """ remove trade id added 2 hour ago, in order to reduce the size of self._trade_ids
+    def _hedge_strategy(self, attempt: int = 0) -> dict:
+        """ hedge strategy of the config, slippage escalates with requotes up to Max Slippage
+        """
+        slippage = self.config.slippage
+        if attempt > 0 and self.config.chase_attempts > 0:
+            slippage += (self.config.max_slippage - slippage) * min(attempt / self.config.chase_attempts, 1)
+        return {
+            'symbol': self.config.hedge_symbol,
+            'exchange': self.config.hedge_exchange,
+            'min_amt': self.config.min_amt_per_order,
+            'min_qty': self.config.min_qty_per_order,
+            'biz_type': self.config.market_type,
+            'slippage': slippage,
+            'tif': self.config.hedge_tif,
+            'scale': TickScale(self.config.price_decimals, self.config.qty_decimals),
+        }
+
+    def _place_hedge(self, cl_order_id: int, symbol: str, hedge_side: str, hedge_qty: float,
+                     hedge_price: float, attempt: int = 0, covers: list = None):
+        """ submit a hedge task to the hedge pool, attempt is the number of requotes before it,
+            covers: COVER records of the risk positions netted into the hedge
+        """
+        if self._journal:
+            # one group: a crash never leaves positions covered by a hedge missing in the journal
+            self._journal.append_group([(HEDGE, (cl_order_id, symbol, hedge_side, hedge_qty, hedge_price))]
+                                       + (covers or []))
+        if self._venue_pool:
+            future = self._hedge_pool.submit(route_hedge, self._venues, self._hedge_strategy(attempt),
+                                             cl_order_id, hedge_side, hedge_qty,
+                                             hedge_price, self.logger, self._venue_pool)
+        else:
+            future = self._hedge_pool.submit(instant_hedge, self._hedge_client, self._hedge_strategy(attempt),
+                                             cl_order_id, hedge_side, hedge_qty,
+                                             hedge_price, self.logger, self._rate_limiter)
+        # hedge_time = int(time.time() * 1000)
+        # self.logger.info("[p:hedger-process]%s:%s",
+        #                  symbol, hedge_time - self._hedge_prformance.get(symbol, 0))
+        self._hedge_tasks[cl_order_id] = _new_hedge_task(symbol, hedge_side, hedge_qty, hedge_price,
+                                                         future, attempt)
+        future.add_done_callback(partial(self._on_hedge_done, cl_order_id))
+        self.monitor.info('client_orderid=%s, %s %s %s @ %s, attempt %d',
+                          cl_order_id, hedge_side, hedge_qty, symbol, hedge_price, attempt)
+
+    def _flush_trade_ids(self):
+        """ persist new trade ids in the hedge pool, one flush at a time
+        """
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._hedge_pool.submit(self._trade_ids.flush)
+
+    def _remove_hedge_orders(self):
+        """ remove hedge order events of 10 minutes ago
         """
         ts = time.time()
-        for trade_id, create_ts in list(self._trade_ids.items()):
-            if create_ts + 7200 < ts:
-                del self._trade_ids[trade_id]
+        # events of orders not put by the hedger, or reported after confirmation
+        for order_id, update in list(self._hedge_orders.items()):
+            if update['ts'] + HEDGE_UPDATE_TTL < ts:
+                del self._hedge_orders[order_id]
+
+    def _drain_hedge_events(self):
+        """ handle finished hedge tasks and hedge order events
+        """
+        while self._hedge_done:
+            cl_order_id = self._hedge_done.popleft()
+            if cl_order_id not in self._hedge_tasks:
+                continue
+            task = self._hedge_tasks[cl_order_id]
+            hedge_orders = task["future"].result()
+            self.monitor.info('Hedge result %s: %s, %s', task["symbol"], cl_order_id, hedge_orders)
+            if not hedge_orders or self.config.hedge_symbol == 'manual':
+                # invalid hedge, or manually hedge
+                del self._hedge_tasks[cl_order_id]
+                if self._journal:
+                    self._journal.append(CONFIRM, cl_order_id, 'MANUAL' if hedge_orders else '', 0)
+                continue
+            task["order_ids"] = [item.order_id for item in hedge_orders]
+            task["prices"] = {item.order_id: item.price for item in hedge_orders}
+            task["done_ts"] = time.time()
+            if self._journal:
+                for order_id in task["order_ids"]:
+                    self._journal.append(PLACED, cl_order_id, order_id)
+        while self._hedge_updates:
+            order_id, status, executed_qty, executed_amt, source = self._hedge_updates.popleft()
+            update = self._hedge_orders.get(order_id)
+            if update and (update['status'] in FINAL_STATUS or not status):
+                # already final, the task is finished in this round, or a failed REST query
+                continue
+            self._hedge_orders[order_id] = {
+                'status': status,
+                'executed_qty': executed_qty,
+                'executed_amt': executed_amt,
+                'source': source,
+                'ts': time.time(),
+            }
+
+    def _cancel_hedge_orders(self, order_keys: list, query: bool):
+        """ cancel open hedge orders in the hedge pool, and query them by REST
+            if the hedge stream may not report the cancels
+        """
+        venue_orders = {}
+        for order_key in order_keys:
+            venue, order_id = self._venue_order(order_key)
+            venue_orders.setdefault(venue, []).append(order_id)
+        for venue, order_ids in venue_orders.items():
+            try:
+                venue.rate_limiter.acquire('batch_cancel', PRIORITY_HEDGE, len(order_ids))
+                res = venue.client.batch_cancel(order_ids, venue.symbol)
+                self.logger.info('Hedge orders canceled: %s', res)
+            except Exception:
+                # filled or expired meanwhile, the final status is reported anyway
+                self.logger.error('Error canceling hedge orders %s of %s: %s', order_ids, venue.name,
+                                  traceback.format_exc())
+        for order_key in order_keys if query else []:
+            self._query_hedge_order(order_key)
+
+    def _market_moved(self, task: dict, open_ids: list, books: dict) -> bool:
+        """ True if the opposite side of the hedge book moved away from an open hedge order by Chase Move,
+            books: {venue key: book}
+        """
+        move = self.config.chase_move
+        for order_id in open_ids:
+            price = task["prices"].get(order_id)
+            book = books.get(order_id.partition('/')[2])
+            if not price or not book:
+                # recovered from the journal, chased by timeout only
+                continue
+            if task["side"] == 'SELL' and price > book['bids'][0][0] * (1 + move):
+                return True
+            if task["side"] == 'BUY' and price < book['asks'][0][0] * (1 - move):
+                return True
+        return False
+
+    def _return_rest(self, cl_order_id: int, task: dict, rest_qty: float, parked: bool = False):
+        """ return the rest of a hedge not filled to risk positions, netted with later fills.
+            A parked rest is not hedged alone, but with the next fills of the symbol
+        """
+        order_id = f'rest-{cl_order_id}'
+        # the side of maker fills covered by the hedge
+        side = 'BUY' if task["side"] == 'SELL' else 'SELL'
+        amount = rest_qty * task["price"]
+        ts = time.time()
+        self._add_fill(order_id, task["symbol"], side, rest_qty, amount, ts)
+        self._risk_positions[order_id]['parked'] = parked
+        if self._journal:
+            self._journal.append(POSITION, order_id, task["symbol"], side, rest_qty, amount, 0, 0, ts)
+
+    def _finish_hedge(self, cl_order_id: int, task: dict, updates: list):
+        """ all child orders of the hedge are final: requote the rest not filled,
+            or return it to risk positions after Chase Attempts requotes
+        """
+        executed_qty = sum(update['executed_qty'] for update in updates)
+        self.monitor.info('Hedged %s: client_orderid=%s, status: %s, executedQty: %s, by %s',
+                          task["symbol"], cl_order_id,
+                          [update['status'] for update in updates], executed_qty,
+                          [update['source'] for update in updates])
+        del self._hedge_tasks[cl_order_id]
+        for order_id in task["order_ids"]:
+            del self._hedge_orders[order_id]
+        scale = TickScale(self.config.price_decimals, self.config.qty_decimals)
+        rest_lots = scale.to_lots(task["qty"]) - scale.to_lots(executed_qty)
+        if rest_lots > 0:
+            rest_qty = scale.to_qty(rest_lots)
+            if rest_qty < self.config.min_qty_per_order or \
+                    rest_qty * task["price"] < self.config.min_amt_per_order:
+                self.monitor.info('Rest of hedge %s: client_orderid=%s, %s %s under the minimum, '
+                                  'back to risk positions', task["symbol"], cl_order_id, task["side"], rest_qty)
+                self._return_rest(cl_order_id, task, rest_qty)
+            elif task["attempt"] < self.config.chase_attempts:
+                chase_id = _new_cl_order_id()
+                self.monitor.info('Chase %s: client_orderid=%s, %s %s not filled, requote as client_orderid=%s',
+                                  task["symbol"], cl_order_id, task["side"], rest_qty, chase_id)
+                # the requote is journaled before the confirm, a crash between them never loses the rest
+                self._place_hedge(chase_id, task["symbol"], task["side"], rest_qty, task["price"],
+                                  task["attempt"] + 1)
+            else:
+                # never requoted again at base slippage in a loop, wait for new fills or the operator
+                self.monitor.error('Hedge %s: client_orderid=%s, %s %s not filled after %d requotes, '
+                                   'parked in risk positions until new fills or a config update',
+                                   task["symbol"], cl_order_id, task["side"], rest_qty, task["attempt"])
+                self._return_rest(cl_order_id, task, rest_qty, parked=True)
+        if self._journal:
+            self._journal.append(CONFIRM, cl_order_id, updates[-1]['status'], executed_qty)
 
     def wait_for_hedge_multithread(self, wait=True) -> int:
-        """ check hedge order status, record hedge performance,
-            and remove hedge status from _order_status
+        """ confirm placed hedge orders by the hedge stream, or by REST if the stream does not
+            report a final status in time. Open hedge orders are canceled after Chase Timeout,
+            or once the book moves away from them, and the rest not filled is requoted.
             return number of un-finished tasks
         """
         while 1:
             try:
-                for cl_order_id in list(self._hedge_tasks.keys()):
-                    if cl_order_id not in self._hedge_tasks:
-                        self.logger.warning("cl_order_id: %s is not in _hedge_tasks: %s",
-                                            cl_order_id, self._hedge_tasks)
-                        continue
-                    task = self._hedge_tasks[cl_order_id]["future"]
-                    symbol = self._hedge_tasks[cl_order_id]["symbol"]
-                    if not task.done():  # done() is not blocked
-                        continue
-
-                    # task finished
-                    hedge_order_id = task.result()
-                    self.monitor.info('Hedge result %s: %s, %s', symbol, cl_order_id, hedge_order_id)
-                    if not hedge_order_id:
-                        # invalid hedge
+                self._drain_hedge_events()
+                ts = time.time()
+                # venue keys of venues with a connected hedge stream
+                connected = {key for key, stream in self._hedge_streams.items() if stream.connected}
+                books = {}
+                if self.config.chase_attempts > 0 and \
+                        ts > self._last_operating_ts['chase'] + CHASE_CHECK_INTERVAL and \
+                        any(task["prices"] and not task["cancels"] for task in self._hedge_tasks.values()):
+                    self._last_operating_ts['chase'] = ts
+                    books = {venue.key: get_hedge_book(venue.exchange, venue.symbol) for venue in self._venues}
+                for cl_order_id, task in list(self._hedge_tasks.items()):
+                    order_ids = task["order_ids"]
+                    if not order_ids:
+                        # hedge orders are being placed
                         continue
-
-                    # Get hedge symbol from config object
-                    hedge_symbol = self.config.hedge_symbol
-                    if hedge_symbol == 'manual':
-                        # manually hedge, skip algorithm hedge
+                    updates = [self._hedge_orders.get(order_id) for order_id in order_ids]
+                    open_ids = [order_id for order_id, update in zip(order_ids, updates)
+                                if not update or update['status'] not in FINAL_STATUS]
+                    if not open_ids:
+                        self._finish_hedge(cl_order_id, task, updates)
                         continue
-
-                    # hedged by strategy
-                    res = {}
-                    
-                    # Use hedge client to query order status
-                    if self._hedge_client:
-                        try:
-                            self.logger.info('Querying order status for order_id: %s, symbol: %s', 
-                                         hedge_order_id, hedge_symbol)
-                            
-                            # Call hedge client's order_status method
-                            res:OrderStatus = self._hedge_client.order_status(
-                                order_id=hedge_order_id,
-                                symbol=hedge_symbol
-                            )[0]
-                            
-                            self.logger.info('Order status response: %s', res)
-                            
-                            # Log order status
-                            self.monitor.info('Hedged %s: client_orderid=%s, status: %s, executedQty: %s',
-                                          symbol, cl_order_id, res.status, res.executedQty)
-                        except Exception as e:
-                            self.logger.error('Error querying order status: %s', traceback.format_exc())
-                    else:
+                    stream_connected = all(order_id.partition('/')[2] in connected for order_id in open_ids)
+                    if not self._hedge_client:
                         self.logger.warning('Hedge client not initialized, skipping order status query')
-
-                    if cl_order_id in self._hedge_tasks:
                         del self._hedge_tasks[cl_order_id]
+                        if self._journal:
+                            self._journal.append(CONFIRM, cl_order_id, '', 0)
+                        continue
+                    if task["cancels"] == 0 and (ts > task["done_ts"] + HEDGE_OPEN_TIMEOUT or (
+                            self.config.chase_attempts > 0 and
+                            (ts > task["done_ts"] + self.config.chase_timeout or
+                             self._market_moved(task, open_ids, books)))):
+                        # cancel in the hedge pool, the rest is requoted or parked once the cancels are final
+                        task["cancels"] = 1
+                        task["done_ts"] = ts
+                        self._hedge_pool.submit(self._cancel_hedge_orders, open_ids, not stream_connected)
+                    elif task["cancels"] == 0 and ts > task["query_ts"] + HEDGE_CONFIRM_TIMEOUT and \
+                            (not stream_connected or ts > task["done_ts"] + HEDGE_CONFIRM_TIMEOUT):
+                        # fallback to REST, in the hedge pool without blocking the hedge loop,
+                        # queried again until final, a failed or open query is not reported by the stream
+                        task["query_ts"] = ts
+                        for order_id in open_ids:
+                            self._hedge_pool.submit(self._query_hedge_order, order_id)
+                    elif task["cancels"] > 0 and ts > task["done_ts"] + HEDGE_CONFIRM_TIMEOUT:
+                        if task["cancels"] >= MAX_CANCELS:
+                            # never requote a hedge of unknown state
+                            self.monitor.error('Hedge orders %s of client_orderid=%s are not final after '
+                                               '%d cancels, check the hedge account', open_ids, cl_order_id,
+                                               task["cancels"])
+                            del self._hedge_tasks[cl_order_id]
+                            for order_id in order_ids:
+                                self._hedge_orders.pop(order_id, None)
+                            if self._journal:
+                                self._journal.append(CONFIRM, cl_order_id, 'UNKNOWN', sum(
+                                    update['executed_qty'] for update in updates if update))
+                            continue
+                        task["cancels"] += 1
+                        task["done_ts"] = ts
+                        self._hedge_pool.submit(self._cancel_hedge_orders, open_ids, True)
 
                 if wait and self._hedge_tasks:
                     time.sleep(0.5)
@@ -443,84 +1045,257 @@ class HedgerAgent():
                     "wait_for_hedge_multithread error: %s", traceback.format_exc())
         return len(self._hedge_tasks)
 
+    def config_key(self) -> str:
+        """ redis key of the config, also the name of trade ids and the journal
+        """
+        return f'{self.config.maker_symbol}_{self.config.hedge_symbol}@{self.config.hedge_exchange}'
+
+    def apply_config(self, version: int, new_conf: dict):
+        """ use a new version of the config, called by the hedge loop
+        """
+        self.logger.info('Config updated, new version: %s', version)
+        self.config = TokenParameter(new_conf)
+        self.config.version = version
+        if not self._netting.same_config(self.config):
+            self._netting = NettingPolicy.from_config(self.config, self.logger)
+        # hedge parked rests again with the new config
+        for position in self._risk_positions.values():
+            position['parked'] = False
+        self.logger.debug('update config: %s', new_conf)
+
+    def run_once(self) -> float:
+        """ one round of the hedge loop,
+            return seconds to the end of the netting window of the symbol, 0 if not netting
+        """
+        # hedge by order, right after fills wake up the loop, or collect a burst of fills
+        # to net them in one hedge by the netting policy
+        filled = self._drain_fills() > 0
+        netting = self._netting.wait(time.time(), filled, self._net_exposure)
+        res = False
+        if not netting:
+            res = self._handle_risk_positions()
+
+        # check and release hedge tasks
+        unhedge_cnt = self.wait_for_hedge_multithread(wait=False)
+
+        ts = time.time()
+        _last_operating_ts = self._last_operating_ts
+        # Check for config updates
+        if self._poll_config and ts > _last_operating_ts['config'] + CONFIG_CHECK_INTERVAL:
+            try:
+                # Load config from Redis
+                current_version = getattr(self.config, 'version', 0)
+                version, new_conf = load_config(self.config_key(), current_version)
+                if version > current_version:
+                    self.apply_config(version, new_conf)
+            except Exception as e:
+                self.logger.error('Error checking config update: %s', traceback.format_exc())
+            finally:
+                _last_operating_ts['config'] = ts
+        if ts > _last_operating_ts['log'] + 60:
+            # log every minute
+            self.logger.info('|STAT| %s un-finished hedge orders %d, risk position size: %d, trade ids: %d, '
+                             'netting %s', self.config.maker_symbol, unhedge_cnt, len(self._risk_positions),
+                             len(self._trade_ids), self._netting.report())
+            # self.logger.info('|STAT| config: %s', self.config)
+            _last_operating_ts['log'] = ts
+
+        if self._journal and self._journal.size > COMPACT_SIZE:
+            self._compact_journal()
+        # trade ids expire as they are added, persist new ones every second
+        if self._trade_ids.persist and ts > _last_operating_ts['flush_tradeid'] + 1:
+            self._flush_trade_ids()
+            _last_operating_ts['flush_tradeid'] = ts
+        if not res and ts > _last_operating_ts['check_tradeid'] + 600:
+            self._remove_hedge_orders()
+            _last_operating_ts['check_tradeid'] = ts
+        return netting
+
     def run_forever(self):
         """ Run forever
         """
         self.logger.debug('start hedge job with config: %s', self.config)
-        # on start: check account book
-        _last_operating_ts = {
-            'config': 0.0,
-            'log': 0.0,
-            'check_tradeid': 0.0,
-        }
         # start listening execution report.
-        self._ws_clients.subscribe_execution_report(self.config.maker_symbol)
+        if self._ws_clients:
+            self._ws_clients.subscribe_execution_report(self.config.maker_symbol)
         while 1:
             try:
-                ts = time.time()
-                # Check for config updates
-                if ts > _last_operating_ts['config'] + 1:
-                    try:
-                        # Load config from Redis
-                        current_version = getattr(self.config, 'version', 0)
-                        r_key = f'{self.config.maker_symbol}_{self.config.hedge_symbol}@{self.config.hedge_exchange}'
-                        version, new_conf = load_config(r_key, current_version)
-                        if version > current_version:
-                            self.logger.info('Config updated, new version: %s', version)
-                            self.config = TokenParameter(new_conf)
-                            self.logger.debug('update config: %s', new_conf)
-                    except Exception as e:
-                        self.logger.error('Error checking config update: %s', traceback.format_exc())
-                    finally:
-                        _last_operating_ts['config'] = ts
-
-                # hedge by order
-                res = self._handle_risk_positions()
-
-                # check and release hedge tasks
-                unhedge_cnt = self.wait_for_hedge_multithread(wait=False)
-                if ts > _last_operating_ts['log'] + 60:
-                    # log every minute
-                    self.logger.info('|STAT| un-finished hedge orders %d, risk position size: %d',
-                                      unhedge_cnt, len(self._risk_positions))
-                    # self.logger.info('|STAT| config: %s', self.config)
-                    _last_operating_ts['log'] = ts
-
-                # periodical remove trade id
-                if not res and ts > _last_operating_ts['check_tradeid'] + 600:
-                    # hedge by account balance
-                    self._remove_trade_id()
-                    _last_operating_ts['check_tradeid'] = ts
-
-                time.sleep(0.1)
+                netting = self.run_once()
+                # wait for the next fill, check hedge tasks if idle
+                if self._fill_event.wait(min(netting, IDLE_INTERVAL) if netting else IDLE_INTERVAL):
+                    self._fill_event.clear()
             except Exception:
                 self.logger.error(traceback.format_exc())
 
-        self._hedge_pool.shutdown()
-        self.wait_for_hedge_multithread(True)
+class MultiHedger():
+    """ Hedgers of multiple maker symbols in one process. They share the private stream of the
+        maker account, the private streams of hedge accounts, the hedge thread pool and the hedge loop.
+        Fills are routed to the hedger of their maker symbol, risk positions and netting of
+        each symbol stay in its own hedger.
+    """
+
+    def __init__(
+        self,
+        params: list,
+        logger: Logger,
+        monitor: Logger,
+        ws_client: PrivateWSClient,
+        hedge_streams: dict = None,
+    ):
+        self.logger = logger
+        # set by any stream on fills and hedge events, wakes up the hedge loop
+        self._wake_event = threading.Event()
+        self._hedge_pool = ThreadPoolExecutor(max(HEDGE_POOL_SIZE, 2 * len(params)))
+        # maker symbol -> hedger
+        self._agents = {}
+        for param in params:
+            if param.maker_symbol in self._agents:
+                self.logger.error('Duplicated maker symbol %s, skipped', param.maker_symbol)
+                continue
+            self._agents[param.maker_symbol] = HedgerAgent(
+                api_key=param.api_key, api_secret=param.api_secret,
+                logger=logger, monitor=monitor, config=param,
+                hedge_pool=self._hedge_pool, wake_event=self._wake_event, poll_config=False)
+        self._config_ts = 0.0
+
+        # one stream of each hedge account, {(hedge exchange, api key): stream}
+        self._hedge_streams = hedge_streams or {}
+        for (exchange, api_key), stream in self._hedge_streams.items():
+            agents = [agent for agent in self._agents.values()
+                      if (exchange, api_key) in agent.hedge_accounts()]
+            for agent in agents:
+                agent.use_hedge_stream(stream, exchange, api_key)
+            # order events do not tell the maker symbol, every hedger of the account keeps them
+            stream.start(
+                exchange,
+                self.on_open,
+                self.on_close,
+                None,
+                self.on_error,
+                partial(self._route_hedge_order_update, exchange, agents))
+
+        self._ws_client = ws_client
+        self._ws_client.start(
+            ','.join(self._agents),
+            self.on_open,
+            self.on_close,
+            self.handle_trade_filled,
+            self.on_error)
+
+    def on_open(self):
+        self.logger.debug('Open new websocket')
+
+    def on_close(self):
+        self.logger.warning("Stream closed")
+
+    def on_error(self, error):
+        self.logger.error('WS on_error, error: %s, %s', error, traceback.format_exc())
+
+    def handle_trade_filled(self, data: FilledOrder):
+        """ route the fill to the hedger of its maker symbol, in the stream thread
+        """
+        agent = self._agents.get(data.symbol)
+        if agent is None:
+            # a symbol of the maker account which is not hedged by this process
+            self.logger.debug('No hedger of symbol %s, fill %s ignored', data.symbol, data.trade_id)
+            return
+        agent.handle_trade_filled(data)
+
+    def _route_hedge_order_update(self, exchange: str, agents: list, *args):
+        for agent in agents:
+            agent.handle_hedge_order_update(*args, exchange=exchange)
+
+    def close(self):
+        """ wait for hedge tasks of all hedgers, then close streams
+        """
+        for agent in self._agents.values():
+            agent.close()
+        for stream in self._hedge_streams.values():
+            stream.close()
+
+    def check_configs(self):
+        """ check config updates of all hedgers in one redis round trip, and apply new versions
+        """
+        agents = list(self._agents.values())
+        try:
+            configs = load_configs([agent.config_key() for agent in agents],
+                                   [getattr(agent.config, 'version', 0) for agent in agents])
+        except Exception:
+            self.logger.error('Error checking config update: %s', traceback.format_exc())
+            return
+        for agent, (version, new_conf) in zip(agents, configs):
+            if version > 0:
+                try:
+                    agent.apply_config(version, new_conf)
+                except Exception:
+                    self.logger.error('Error updating config of %s: %s', agent.config.maker_symbol,
+                                      traceback.format_exc())
+
+    def run_forever(self):
+        """ Run the hedge loop of all hedgers
+        """
+        self.logger.info('start hedgers of %d symbols: %s', len(self._agents), list(self._agents))
+        for symbol in self._agents:
+            self._ws_client.subscribe_execution_report(symbol)
+        while 1:
+            ts = time.time()
+            if ts > self._config_ts + CONFIG_CHECK_INTERVAL:
+                self.check_configs()
+                self._config_ts = ts
+            wait = IDLE_INTERVAL
+            for symbol, agent in self._agents.items():
+                try:
+                    netting = agent.run_once()
+                    if netting:
+                        wait = min(wait, netting)
+                except Exception:
+                    self.logger.error('Hedger %s error: %s', symbol, traceback.format_exc())
+            # wait for the next fill, check hedge tasks if idle
+            if self._wake_event.wait(wait):
+                self._wake_event.clear()
 
 def main(conf: dict):
-    """ The main function
+    """ The main function, token_parameters is a list of hedged symbols,
+        or token_parameter of one symbol
     """
     try:
-        param = TokenParameter(conf['token_parameter'])
-        logger = create_logger(BASE_PATH, f"{param.maker_symbol}-hedger.log", 'JPM_HEDGER')
-        logger.info('start hedger with config: %s', param)
+        if 'token_parameters' in conf:
+            params = [TokenParameter(item) for item in conf['token_parameters']]
+            logger = create_logger(BASE_PATH, "hedger.log", 'JPM_HEDGER')
+        else:
+            params = [TokenParameter(conf['token_parameter'])]
+            logger = create_logger(BASE_PATH, f"{params[0].maker_symbol}-hedger.log", 'JPM_HEDGER')
+        logger.info('start hedger with config: %s', params)
         monitor = create_logger(BASE_PATH, "HedgeMonitor.log", 'monitor_hedger', backup_cnt=50)
+        # one private stream of the maker account for all symbols of the market type
+        market_type = params[0].market_type
+        for param in [param for param in params if param.market_type != market_type]:
+            logger.error("Market type of %s is not %s, start another hedger for it",
+                         param.maker_symbol, market_type)
+            params.remove(param)
         # Monitor BiFu trade executions
-        if param.market_type == 'futures':
+        if market_type == 'futures':
             logger.info('Using futures private WS client')
             ws_client = BiFuFuturePrivateWSClient(conf['private_ws_client'], logger)
         else:
             logger.info('Using spot private WS client')
             ws_client = BiFuPrivateWSClient(conf['private_ws_client'], logger)
-        if not param.api_key or not param.api_secret:
-            logger.error("Lost Hedge api key or secret")
+        for param in [param for param in params if not param.api_key or not param.api_secret]:
+            logger.error("Lost Hedge api key or secret of %s", param.maker_symbol)
+            params.remove(param)
+        if not params:
             return
-        agent = HedgerAgent(api_key=param.api_key, api_secret=param.api_secret,
-                        logger=logger, monitor=monitor,
-                        config=param, ws_client=ws_client)
-        agent.run_forever()
+        # confirm hedge orders by the private stream of each hedge account, if supported
+        hedge_streams = {}
+        for param in params:
+            for exchange, api_key in [(param.hedge_exchange, param.api_key)] + [
+                    (venue.hedge_exchange, venue.api_key) for venue in param.hedge_venues]:
+                if (exchange, api_key) not in hedge_streams:
+                    hedge_streams[(exchange, api_key)] = get_hedge_stream(
+                        exchange, api_key, conf.get('hedge_ws_client', {}), logger)
+        hedger = MultiHedger(params, logger=logger, monitor=monitor, ws_client=ws_client,
+                             hedge_streams={key: stream for key, stream in hedge_streams.items() if stream})
+        hedger.run_forever()
     except Exception as e:
         logger.error("HedgerAgent start error: %s, %s", e, traceback.format_exc())
 
@@ -0,0 +1,201 @@
+""" Write-ahead journal of the hedger: fills received, hedges submitted and confirmed.
+    Records are appended by the hedge loop without waiting, and written with one fsync
+    per group by the journal thread. On start the journal is replayed to recover
+    risk positions and unconfirmed hedges, then compacted to the recovered state.
+"""
+import os
+import time
+import struct
+import zlib
+import threading
+import traceback
+from logging import Logger
+from collections import deque
+
+CURR_PATH = os.path.dirname(os.path.abspath(__file__))
+BASE_PATH = os.path.dirname(os.path.dirname(CURR_PATH))
+JOURNAL_DIR = os.path.join(BASE_PATH, 'journal')
+
+# record types
+FILL = 1        # trade_id, order_id, symbol, side, qty, amount, match_time
+HEDGE = 2       # cl_order_id, symbol, side, qty, price
+COVER = 3       # cl_order_id, order_id, hedged_qty, hedged_amt: maker order covered by a hedge
+PLACED = 4      # cl_order_id, order_id: hedge order placed
+CONFIRM = 5     # cl_order_id, status, executed_qty: hedge finished
+POSITION = 6    # order_id, symbol, side, qty, total_amt, hedged_qty, hedged_amt, created_ts: compacted
+
+# fields of each record type, s: str, d: float, q: int
+RECORD_FIELDS = {
+    FILL: 'ssssddd',
+    HEDGE: 'qssdd',
+    COVER: 'qsdd',
+    PLACED: 'qs',
+    CONFIRM: 'qsd',
+    POSITION: 'sssddddd',
+}
+# crc32 of type, ts and payload, payload size, type, ts
+_HEADER = struct.Struct('<IHBd')
+_STR_SIZE = struct.Struct('<H')
+_FLOAT = struct.Struct('<d')
+_INT = struct.Struct('<q')
+
+# seconds to collect records into one write and fsync
+GROUP_COMMIT_INTERVAL = 0.005
+# compact the journal if it grows over the size in bytes
+COMPACT_SIZE = 4 * 1024 * 1024
+
+def _pack(rtype: int, ts: float, fields: tuple) -> bytes:
+    payload = bytearray()
+    for kind, value in zip(RECORD_FIELDS[rtype], fields):
+        if kind == 's':
+            data = str(value).encode('utf-8')
+            payload += _STR_SIZE.pack(len(data)) + data
+        elif kind == 'd':
+            payload += _FLOAT.pack(float(value))
+        else:
+            payload += _INT.pack(int(value))
+    body = struct.pack('<Bd', rtype, ts) + payload
+    return _HEADER.pack(zlib.crc32(body), len(payload), rtype, ts) + payload
+
+def _unpack(rtype: int, payload: bytes) -> tuple:
+    fields = []
+    pos = 0
+    for kind in RECORD_FIELDS[rtype]:
+        if kind == 's':
+            size, = _STR_SIZE.unpack_from(payload, pos)
+            pos += _STR_SIZE.size
+            fields.append(payload[pos:pos + size].decode('utf-8'))
+            pos += size
+        elif kind == 'd':
+            fields.append(_FLOAT.unpack_from(payload, pos)[0])
+            pos += _FLOAT.size
+        else:
+            fields.append(_INT.unpack_from(payload, pos)[0])
+            pos += _INT.size
+    return tuple(fields)
+
+class HedgeJournal:
+    """ append-only journal file of one hedger
+    """
+    def __init__(self, name: str, logger: Logger, commit_interval: float = GROUP_COMMIT_INTERVAL) -> None:
+        self.path = os.path.join(JOURNAL_DIR, f'hedger_{name}.journal')
+        self.logger = logger
+        self.commit_interval = commit_interval
+        self.size = 0   # bytes in the journal file
+        self._queue = deque()   # packed records, or (snapshot,) to compact, appended by the hedge loop
+        self._event = threading.Event()
+        self._file = None
+        self._thread = None
+        self._stop = False
+
+    def replay(self) -> list:
+        """ read records of the journal, [(type, ts, fields)],
+            a torn record at the end, written when crashed, is cut off
+        """
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        records = []
+        pos = 0
+        while pos + _HEADER.size <= len(data):
+            crc, size, rtype, ts = _HEADER.unpack_from(data, pos)
+            payload = data[pos + _HEADER.size:pos + _HEADER.size + size]
+            if (len(payload) < size or rtype not in RECORD_FIELDS or
+                    zlib.crc32(struct.pack('<Bd', rtype, ts) + payload) != crc):
+                break
+            records.append((rtype, ts, _unpack(rtype, payload)))
+            pos += _HEADER.size + size
+        if pos < len(data):
+            self.logger.warning('Cut off %d bytes at the end of journal %s', len(data) - pos, self.path)
+            with open(self.path, 'r+b') as f:
+                f.truncate(pos)
+        self.size = pos
+        return records
+
+    def start(self):
+        """ open the journal for appending, and start the journal thread
+        """
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        self.size = self._file.tell()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, rtype: int, *fields, ts: float = None):
+        """ append a record, written by the journal thread in the next group
+        """
+        record = _pack(rtype, ts or time.time(), fields)
+        self._queue.append(record)
+        self.size += len(record)
+        self._event.set()
+
+    def append_group(self, records: list, ts: float = None):
+        """ append records [(type, fields)] as one item, written in the same group and fsync.
+            A torn write at the end can only cut off the last records of the item
+        """
+        ts = ts or time.time()
+        data = b''.join(_pack(rtype, ts, fields) for rtype, fields in records)
+        self._queue.append(data)
+        self.size += len(data)
+        self._event.set()
+
+    def compact(self, records: list):
+        """ replace the journal with records [(type, fields)] of the current state,
+            records appended later are written after them
+        """
+        ts = time.time()
+        snapshot = b''.join(_pack(rtype, ts, fields) for rtype, fields in records)
+        self._queue.append((snapshot,))
+        self.size = len(snapshot)
+        self._event.set()
+
+    def _replace(self, snapshot: bytes):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'ab')
+
+    def _commit(self):
+        """ write queued records with one fsync
+        """
+        group = []
+        while self._queue:
+            item = self._queue.popleft()
+            if isinstance(item, tuple):
+                # records before the snapshot are included in it
+                group.clear()
+                self._replace(item[0])
+                continue
+            group.append(item)
+        if group:
+            self._file.write(b''.join(group))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _run(self):
+        while not self._stop:
+            self._event.wait()
+            # group records arriving in the commit interval
+            time.sleep(self.commit_interval)
+            self._event.clear()
+            try:
+                self._commit()
+            except Exception:
+                self.logger.error('Journal write error: %s', traceback.format_exc())
+
+    def close(self):
+        """ write queued records and stop the journal thread
+        """
+        self._stop = True
+        self._event.set()
+        if self._thread:
+            self._thread.join()
+        if self._file:
+            self._commit()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,100 @@
+""" Netting policies of the hedger: when fills of a maker symbol are netted into one hedge.
+    A policy trades exposure time against hedge orders, and reports both of them.
+"""
+from logging import Logger
+
+IMMEDIATE = 'immediate'     # hedge as soon as fills arrive
+TIME = 'time'               # hedge at the end of a window started by the first fill
+SIZE = 'size'               # hedge once the net exposure reaches a size, or at the end of the window
+ADAPTIVE = 'adaptive'       # a window while fills arrive fast enough to be netted, otherwise at once
+POLICIES = (IMMEDIATE, TIME, SIZE, ADAPTIVE)
+
+# weight of the latest gap between fills in the average gap
+GAP_WEIGHT = 0.2
+# an adaptive window waits for about this number of more fills
+ADAPTIVE_FILLS = 3
+
+class NettingPolicy:
+    """ netting window of one hedger, called by the hedge loop only.
+        Counts fills netted, hedges placed for them and the exposure time of fills from arrival
+        to netting, the hedge orders saved are fills netted but not hedged one by one.
+        The exposure time of IMMEDIATE is the baseline of the other policies
+    """
+    def __init__(self, policy: str, window: float = 0, size: float = 0, logger: Logger = None) -> None:
+        if policy not in POLICIES:
+            if logger:
+                logger.error('Unknown netting policy %s, hedge at once', policy)
+            policy = IMMEDIATE
+        self.policy = policy
+        self.window = window    # seconds, the longest wait of TIME, SIZE and ADAPTIVE
+        self.size = size        # net quantity to hedge at once for SIZE
+        self._deadline = 0.0    # end of the current window, 0 if not netting
+        self._last_fill_ts = 0.0
+        self._gap = float('inf')    # average seconds between fills
+        # fills not netted yet, sum of their arrival times
+        self._pending = 0
+        self._pending_ts = 0.0
+        # since the last report
+        self._fills = 0
+        self._hedges = 0
+        self._exposure = 0.0
+
+    @classmethod
+    def from_config(cls, config, logger: Logger = None) -> 'NettingPolicy':
+        """ the policy of a TokenParameter
+        """
+        return cls(config.netting_policy, config.netting_window, config.netting_size, logger)
+
+    def same_config(self, config) -> bool:
+        return (self.policy, self.window, self.size) == (
+            config.netting_policy, config.netting_window, config.netting_size)
+
+    def on_fill(self, ts: float):
+        """ a fill arrived at ts
+        """
+        if self._last_fill_ts:
+            gap = max(ts - self._last_fill_ts, 0.)
+            self._gap = gap if self._gap == float('inf') else \
+                self._gap * (1 - GAP_WEIGHT) + gap * GAP_WEIGHT
+        self._last_fill_ts = ts
+        self._pending += 1
+        self._pending_ts += ts
+
+    def wait(self, ts: float, filled: bool, exposure=None) -> float:
+        """ seconds to wait before netting risk positions, 0 to net them now.
+            filled: fills arrived since the last call, exposure: returns the net quantity not hedged
+        """
+        if self.policy == IMMEDIATE or self.window <= 0:
+            return 0.
+        if filled and not self._deadline:
+            window = self.window
+            if self.policy == ADAPTIVE:
+                # no more fill is expected in the window, waiting only adds exposure
+                window = min(self.window, ADAPTIVE_FILLS * self._gap) if self._gap < self.window else 0.
+            self._deadline = ts + window
+        if self.policy == SIZE and filled and exposure and abs(exposure()) >= self.size:
+            self._deadline = 0.0
+        if ts >= self._deadline:
+            self._deadline = 0.0
+            return 0.
+        return self._deadline - ts
+
+    def on_netted(self, ts: float, hedges: int):
+        """ pending fills are netted into hedges at ts
+        """
+        self._fills += self._pending
+        self._hedges += hedges
+        self._exposure += self._pending * ts - self._pending_ts
+        self._pending = 0
+        self._pending_ts = 0.0
+
+    def report(self) -> str:
+        """ statistics since the last report
+        """
+        res = '%s: fills %d, hedges %d, saved %d, exposure %.1fms/fill' % (
+            self.policy, self._fills, self._hedges, max(self._fills - self._hedges, 0),
+            1000 * self._exposure / self._fills if self._fills else 0.)
+        self._fills = 0
+        self._hedges = 0
+        self._exposure = 0.0
+        return res
@@ -0,0 +1,120 @@
+""" Deduplicate trade ids of the hedger in a ring of per-minute buckets,
+    optionally persisted in redis so that fills reported again after a restart are not hedged twice
+"""
+import time
+import traceback
+from logging import Logger
+from collections import deque
+
+from tunapy.utils.db_util import RDB
+
+BUCKET_SECONDS = 60
+DEFAULT_WINDOW = 7200   # seconds to keep trade ids
+DEFAULT_MAX_SIZE = 1000000
+# seconds of not persisting after redis failed
+REDIS_RETRY_INTERVAL = 10.0
+
+class TradeIdFilter:
+    """ trade ids seen in the window, grouped by minute.
+        Lookup and insert use one set of all trade ids, expiry removes the bucket of the oldest minute
+        from it at once. If the filter is full, the oldest buckets are dropped early, except the
+        bucket of the current minute.
+        add is called by the hedge loop only, flush may be called in another thread.
+    """
+    def __init__(self, name: str, window: float = DEFAULT_WINDOW, max_size: int = DEFAULT_MAX_SIZE,
+                 persist: bool = False, logger: Logger = None) -> None:
+        self.name = name
+        self.buckets = max(int(window // BUCKET_SECONDS), 1)  # number of buckets in the window
+        self.max_size = max_size
+        self.persist = persist
+        self.logger = logger
+        self._ids = set()       # trade ids of all buckets
+        self._ring = deque()    # (minute, list of trade ids), the oldest first
+        self._pending = deque()  # (minute, trade id) not persisted yet
+        self._redis_retry_ts = 0.0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, trade_id: str) -> bool:
+        return trade_id in self._ids
+
+    def _key(self, minute: int) -> str:
+        return f'hedger_trade_ids_{self.name}_{minute}'
+
+    def _expire(self, minute: int):
+        """ drop buckets out of the window, and the oldest buckets if the filter is full
+        """
+        while self._ring and (self._ring[0][0] <= minute - self.buckets or
+                              (len(self._ids) >= self.max_size and self._ring[0][0] < minute)):
+            oldest, trade_ids = self._ring.popleft()
+            self._ids.difference_update(trade_ids)
+            if oldest > minute - self.buckets and self.logger:
+                self.logger.warning('Trade id filter %s is full, drop %d trade ids of minute %d',
+                                    self.name, len(trade_ids), oldest)
+
+    def add(self, trade_id: str, ts: float = None) -> bool:
+        """ add trade id seen at ts, False if it has been seen in the window
+        """
+        if trade_id in self._ids:
+            return False
+        minute = int((ts or time.time()) // BUCKET_SECONDS)
+        self._expire(minute)
+        if not self._ring or self._ring[-1][0] < minute:
+            self._ring.append((minute, []))
+        # a late trade id goes to the newest bucket, and is kept a little longer
+        minute = self._ring[-1][0]
+        self._ring[-1][1].append(trade_id)
+        self._ids.add(trade_id)
+        if self.persist:
+            self._pending.append((minute, trade_id))
+        return True
+
+    def flush(self) -> int:
+        """ persist trade ids added since the last flush, return the number of trade ids
+        """
+        if not self._pending or time.time() < self._redis_retry_ts:
+            return 0
+        items = []
+        while self._pending:
+            items.append(self._pending.popleft())
+        try:
+            pipe = RDB().pipeline(transaction=False)
+            for minute, trade_id in items:
+                pipe.sadd(self._key(minute), trade_id)
+            for minute in {minute for minute, _ in items}:
+                pipe.expire(self._key(minute), (self.buckets + 1) * BUCKET_SECONDS)
+            pipe.execute()
+            return len(items)
+        except Exception:
+            self._redis_retry_ts = time.time() + REDIS_RETRY_INTERVAL
+            # try again later, without growing over the filter size
+            self._pending.extendleft(reversed(items[-self.max_size:]))
+            if self.logger:
+                self.logger.error('Failed to persist trade ids: %s', traceback.format_exc())
+            return 0
+
+    def load(self) -> int:
+        """ load persisted trade ids of the window, return the number of trade ids
+        """
+        minute = int(time.time() // BUCKET_SECONDS)
+        minutes = list(range(minute - self.buckets + 1, minute + 1))
+        try:
+            pipe = RDB().pipeline(transaction=False)
+            for item in minutes:
+                pipe.smembers(self._key(item))
+            buckets = pipe.execute()
+        except Exception:
+            if self.logger:
+                self.logger.error('Failed to load trade ids: %s', traceback.format_exc())
+            return 0
+        self._ring.clear()
+        self._ids.clear()
+        for item, trade_ids in zip(minutes, buckets):
+            # a trade id may be persisted in two buckets, keep the first
+            trade_ids = [trade_id for trade_id in trade_ids if trade_id not in self._ids]
+            if trade_ids:
+                self._ring.append((item, trade_ids))
+                self._ids.update(trade_ids)
+        self._expire(minute)
+        return len(self._ids)
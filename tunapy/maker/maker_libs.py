@@ -1,14 +1,38 @@
 """ Strategies and Tools for market making
 """
+import math
 import time
 import logging
 import random
+from collections import namedtuple
+
+import numpy as np
 
 from tunapy.management.market_making import TokenParameter
+from tunapy.utils.tick_util import TickScale
 from octopuspy.exchange.base_restapi import NewOrder
 
 LOGGER = logging.getLogger('MM')
 
+# maker order with price in ticks and quantity in lots, converted to NewOrder by to_new_order
+MakerOrder = namedtuple('MakerOrder', ['symbol', 'client_id', 'side', 'price', 'quantity',
+                                       'biz_type', 'tif', 'position_side'])
+
+def to_new_order(order: MakerOrder, ticks: TickScale) -> NewOrder:
+    """ convert maker order to the NewOrder of exchange API, price and quantity as decimal strings
+    """
+    return NewOrder(
+        symbol=order.symbol,
+        client_id=order.client_id,
+        side=order.side,
+        type='LIMIT',
+        quantity=ticks.qty_str(order.quantity),
+        price=ticks.price_str(order.price),
+        biz_type=order.biz_type,
+        tif=order.tif,
+        position_side=order.position_side,
+    )
+
 def gen_ask_orders(
     order_book: list,
     param: TokenParameter,
@@ -31,15 +55,13 @@ def _mirror_ask_orders(
 ) -> list:
     # the quantity discount in BPS
     qty_coef = param.near_qty_multiplier
-    price_decimals = param.price_decimals
     price_coef = 1. + 0.0001 * param.near_sell_price_margin
 
     new_orders, count = [], 0
     for ask, qty in order_book:
         if count >= param.near_ask_size:
             break
-        order_price = ask * price_coef
-        order_price = round(order_price, price_decimals) if price_decimals else int(order_price)
+        order_price = param.ticks.to_ticks(ask * price_coef)
         order_qty = _calc_maker_qty(order_price, qty * qty_coef, param, False)
         if order_qty > 0:
             new_orders.append((order_price, order_qty))
@@ -53,15 +75,13 @@ def _mirror_bid_orders(
 ) -> list:
     # the quantity discount in BPS
     qty_coef = param.near_qty_multiplier
-    price_decimals = param.price_decimals
     price_coef = 1. + 0.0001 * param.near_buy_price_margin
 
     new_orders, count = [], 0
     for bid, qty in order_book:
         if count >= param.near_bid_size:
             break
-        order_price = bid * price_coef
-        order_price = round(order_price, price_decimals) if price_decimals else int(order_price)
+        order_price = param.ticks.to_ticks(bid * price_coef)
         order_qty = _calc_maker_qty(order_price, qty * qty_coef, param, False)
         if order_qty > 0:
             new_orders.append((order_price, order_qty))
@@ -69,41 +89,98 @@ def _mirror_bid_orders(
 
     return new_orders
 
-def _calc_maker_qty(order_price: float, order_qty: float, param: TokenParameter, is_far: bool = False):
+def gen_near_orders_batch(
+    order_books: list,
+    params: list,
+) -> list:
+    """ Generate near-end ask and bid orders of many symbols in one batch
+        order_books: order book {'asks': [...], 'bids': [...]} of each param
+        return (asks, bids) of each param, both are int64 arrays of (price ticks, quantity lots) rows
+    """
+    asks = _mirror_orders_batch([book['asks'] for book in order_books], params, 'SELL')
+    bids = _mirror_orders_batch([book['bids'] for book in order_books], params, 'BUY')
+    return list(zip(asks, bids))
+
+def _to_units_batch(values: np.ndarray, decimals: np.ndarray) -> np.ndarray:
+    """ round each row of values to ticks/lots by decimals of the row, nan is kept
+    """
+    return np.rint(values * 10.0 ** decimals[:, None])
+
+def _mirror_orders_batch(
+    books: list,    # ask or bid levels of each symbol
+    params: list,
+    side: str,
+) -> list:
+    depth = max([len(levels) for levels in books] + [1])
+    # (symbol, level, price/qty), padding with nan
+    book = np.full((len(books), depth, 2), np.nan)
+    for row, levels in enumerate(books):
+        if len(levels):
+            book[row, :len(levels)] = np.asarray(levels, dtype=float)[:, :2]
+
+    if side == 'SELL':
+        margins = np.array([param.near_sell_price_margin for param in params], dtype=float)
+        sizes = np.array([param.near_ask_size for param in params])
+    else:
+        margins = np.array([param.near_buy_price_margin for param in params], dtype=float)
+        sizes = np.array([param.near_bid_size for param in params])
+    qty_coefs = np.array([param.near_qty_multiplier for param in params], dtype=float)
+    max_amts = np.array([param.near_max_amt_per_order for param in params], dtype=float)
+    price_decimals = np.array([param.price_decimals for param in params])
+    qty_decimals = np.array([param.qty_decimals for param in params])
+
+    ticks = _to_units_batch(book[:, :, 0] * (1. + 0.0001 * margins)[:, None], price_decimals)
+    prices = ticks / 10.0 ** price_decimals[:, None]
+    qtys = book[:, :, 1] * qty_coefs[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # cap the amount of each order
+        qtys = np.where(qtys * prices > max_amts[:, None], max_amts[:, None] / prices, qtys)
+    lots = _to_units_batch(qtys, qty_decimals)
+
+    # keep the first size levels with positive price and quantity, nan is not positive
+    valid = (lots > 0) & (ticks > 0)
+    valid &= np.cumsum(valid, axis=1) <= sizes[:, None]
+    return [np.stack((ticks[row][valid[row]], lots[row][valid[row]]), axis=1).astype(np.int64)
+            for row in range(len(books))]
+
+def _calc_maker_qty(order_price: int, order_qty: float, param: TokenParameter, is_far: bool = False) -> int:
+    """ quantity in lots of the order at order_price in ticks
+    """
+    price = param.ticks.to_price(order_price)
+    if price <= 0:
+        return 0
     max_amt_per_order = float(param.far_max_amt_per_order) if is_far else float(param.near_max_amt_per_order)
-    if order_qty * order_price > max_amt_per_order:
-        order_qty = max_amt_per_order / order_price
-    qty_decimals = param.qty_decimals
-    if qty_decimals == 0:
-        return int(order_qty)
-    return round(order_qty, qty_decimals)
+    if order_qty * price > max_amt_per_order:
+        order_qty = max_amt_per_order / price
+    return param.ticks.to_lots(order_qty)
 
 def gen_far_liquidity(symbol: str,
                       param: TokenParameter,
                       askbids: dict,
                       side: str,
-                      guard_price: float,
+                      guard_price: int,
                       cl_order_start: int,
+                      ladder: dict = None,
 ) -> list:
-    """ generate far orders
+    """ generate far orders, guard_price in ticks
+        ladder: the far-end ladder state of side, kept between rounds, see _spread_far
     """
     offset = int(time.time() * 100) % 8640000
     tif = param.far_tif
     orders = []
     if side == 'BUY':
         # make more price margin if previous hedge loses
-        new_orders = _gen_bid_orders_far(askbids['bids'], param)
+        new_orders = _gen_bid_orders_far(askbids['bids'], param, ladder)
         for price, qty in new_orders:
             # avoid self-trade
             if price < guard_price:
                 if param.term_type == 'FUTURE':
                     # Future order: Spot BUY corresponds to Future SHORT
                     orders.append(
-                        NewOrder(
+                        MakerOrder(
                             symbol=symbol,
                             client_id=gen_client_order_id(f'B{symbol}', cl_order_start, offset, True),
                             side="SELL",
-                            type='LIMIT',
                             quantity=qty,
                             price=price,
                             biz_type=param.term_type,
@@ -114,11 +191,10 @@ def gen_far_liquidity(symbol: str,
                 else:
                     # Spot order
                     orders.append(
-                        NewOrder(
+                        MakerOrder(
                             symbol=symbol,
                             client_id=gen_client_order_id(f'B{symbol}', cl_order_start, offset, True),
                             side="BUY",
-                            type='LIMIT',
                             quantity=qty,
                             price=price,
                             biz_type=param.term_type,
@@ -128,18 +204,17 @@ def gen_far_liquidity(symbol: str,
                     )
                 offset += 1
     else:
-        new_orders = _gen_ask_orders_far(askbids['asks'], param)
+        new_orders = _gen_ask_orders_far(askbids['asks'], param, ladder)
         for price, qty in new_orders:
             # avoid self-trade
             if price > guard_price:
                 if param.term_type == 'FUTURE':
                     # Future order: Spot SELL corresponds to Future LONG
                     orders.append(
-                        NewOrder(
+                        MakerOrder(
                             symbol=symbol,
                             client_id=gen_client_order_id(f'S{symbol}', cl_order_start, offset, True),
                             side="BUY",
-                            type='LIMIT',
                             quantity=qty,
                             price=price,
                             biz_type=param.term_type,
@@ -150,11 +225,10 @@ def gen_far_liquidity(symbol: str,
                 else:
                     # Spot order
                     orders.append(
-                        NewOrder(
+                        MakerOrder(
                             symbol=symbol,
                             client_id=gen_client_order_id(f'S{symbol}', cl_order_start, offset, True),
                             side="SELL",
-                            type='LIMIT',
                             quantity=qty,
                             price=price,
                             biz_type=param.term_type,
@@ -166,50 +240,101 @@ def gen_far_liquidity(symbol: str,
     return orders
 
 def _spread_far(
-    order_book: list, param: TokenParameter, side: str
+    order_book: list, param: TokenParameter, side: str, ladder: dict = None
 ) -> list:
+    """ far-end levels spread from the top of order book by the price margin.
+        If ladder is a dict, levels are anchored on a stable grid: anchor * price_coef ** k,
+        and the quantity of each grid level is kept between rounds, so only levels moving
+        across the top of order book or off the ladder edge change.
+    """
     new_orders = []
 
-    base_price = order_book[0][0]
+    base_price = float(order_book[0][0])
     if side == 'SELL':
         price_coef = 1 + 0.0001 * float(param.far_sell_price_margin)
         max_size = param.far_ask_size
     else:
         price_coef = 1 - 0.0001 * float(param.far_buy_price_margin)
         max_size = param.far_bid_size
-    price_decimals = param.price_decimals
     qty_coef = param.far_qty_multiplier
     qtys = [float(item[1]) for item in order_book]
     qty_size = len(qtys)
 
-    for _ in range(max_size):
-        base_price *= price_coef
+    def _rand_qty() -> float:
         rand_idx = random.randrange(0, qty_size)
-        qty = qtys[rand_idx] * (0.95 + rand_idx * 0.05 / qty_size)
+        return qtys[rand_idx] * (0.95 + rand_idx * 0.05 / qty_size)
 
-        order_price = round(base_price, price_decimals) if price_decimals else int(base_price)
-        order_qty = _calc_maker_qty(order_price, qty * qty_coef, param, True)
-        if order_qty > 0:
-            new_orders.append((order_price, order_qty))
+    if ladder is None or price_coef <= 0 or price_coef == 1 or base_price <= 0:
+        for _ in range(max_size):
+            base_price *= price_coef
+            order_price = param.ticks.to_ticks(base_price)
+            order_qty = _calc_maker_qty(order_price, _rand_qty() * qty_coef, param, True)
+            if order_qty > 0:
+                new_orders.append((order_price, order_qty))
+        return new_orders
+
+    anchor = ladder.setdefault('anchor', base_price)
+    level_qtys = ladder.setdefault('qtys', {})  # grid level -> quantity in lots
+    # the first grid level beyond base_price * price_coef, for both sides
+    first = math.ceil(math.log(base_price * price_coef / anchor) / math.log(price_coef) - 1e-9)
+    levels = range(first, first + max_size)
+    for level in levels:
+        order_price = param.ticks.to_ticks(anchor * price_coef ** level)
+        if level not in level_qtys:
+            level_qtys[level] = _calc_maker_qty(order_price, _rand_qty() * qty_coef, param, True)
+        if level_qtys[level] > 0:
+            new_orders.append((order_price, level_qtys[level]))
+    for level in [level for level in level_qtys if level not in levels]:
+        # off the ladder
+        del level_qtys[level]
     return new_orders
 
 def _gen_ask_orders_far(
     order_book: list, # near order book, 20 top asks
     param: TokenParameter,
+    ladder: dict = None,
 ) -> list:
-    if param.far_strategy == 'spread':
-        return _spread_far(order_book, param, 'SELL')
+    if param.far_strategy.lower() == 'spread':
+        return _spread_far(order_book, param, 'SELL', ladder)
     return []
 
 def _gen_bid_orders_far(
     order_book: list, # near order book, 20 top bids
     param: TokenParameter,
+    ladder: dict = None,
 ) -> list:
-    if param.far_strategy == 'spread':
-        return _spread_far(order_book, param, 'BUY')
+    if param.far_strategy.lower() == 'spread':
+        return _spread_far(order_book, param, 'BUY', ladder)
     return []
 
 
+def book_fingerprint(order_book: dict, param: TokenParameter) -> tuple:
+    """ compact fingerprint of the follow order book: prices of top near-end levels in ticks of the maker symbol.
+        Quantities are left out, only prices gate requotes: previous orders are kept by price
+        in diff_prev_new_orders, so a round for a quantity change alone would not replace them
+    """
+    ticks = param.ticks
+    return (
+        tuple(ticks.to_ticks(price) for price, _ in order_book['asks'][:param.near_ask_size]),
+        tuple(ticks.to_ticks(price) for price, _ in order_book['bids'][:param.near_bid_size]),
+    )
+
+def book_move_bps(prev_fingerprint: tuple, fingerprint: tuple) -> float:
+    """ max price move in BPS among the same levels of two fingerprints,
+        inf if there is no previous fingerprint or the number of levels changes
+    """
+    if not prev_fingerprint:
+        return math.inf
+    move = 0.
+    for prev_levels, levels in zip(prev_fingerprint, fingerprint):
+        if len(prev_levels) != len(levels):
+            return math.inf
+        for prev_price, price in zip(prev_levels, levels):
+            if prev_price <= 0:
+                return math.inf
+            move = max(move, abs(price - prev_price) * 10000. / prev_price)
+    return move
+
 def gen_client_order_id(
     symbol: str, cl_order_start: int, cl_order_offset: int, far_end: bool = False
 ) -> str:
@@ -236,25 +361,50 @@ def mix_ask_bid_orders(ask_orders: list, bid_orders: list) -> list:
         mixed_orders.extend(ask_orders[bid_orders_len:])
     return mixed_orders
 
-def _merge_orders(
-    prev_orders: list, new_orders: list, flags: list, cancel_ids: list, reserve_orders: list
-) -> list:
-    merged_orders = []
-    for idx, flag in enumerate(flags):
-        prev_order = prev_orders[idx]
-        if not flag:
-            # if False, replace previous order with new order
-            cancel_ids.append(prev_order.id)
-            merged_orders.append(new_orders[idx])
+def _match_orders(diff_rate_per_round: float, prev_orders: list, new_orders: list):
+    """ match previous and new orders sorted by price without crossing,
+        a pair can be matched if the price difference < diff_rate_per_round.
+        Keeps the most pairs, and among them the closest prices, so a previous order at the new price
+        is preferred to a nearer level within the rate.
+        return matched (previous, new) pairs, unmatched previous orders and unmatched new orders
+    """
+    prev_num, new_num = len(prev_orders), len(new_orders)
+    prev_prices = [order.price for order in prev_orders]
+    new_prices = [order.price for order in new_orders]
+    # a pair scores more than the price differences of all pairs
+    pair_score = 1. + sum(diff_rate_per_round * price for price in new_prices)
+    # best[i][j]: max pairs * pair_score - sum of price differences of prev_orders[i:] and new_orders[j:]
+    best = [[0.] * (new_num + 1) for _ in range(prev_num + 1)]
+    for prev_idx in range(prev_num - 1, -1, -1):
+        row, next_row, prev_price = best[prev_idx], best[prev_idx + 1], prev_prices[prev_idx]
+        for new_idx in range(new_num - 1, -1, -1):
+            score = max(next_row[new_idx], row[new_idx + 1])
+            # prices in ticks, compare without division
+            diff = abs(prev_price - new_prices[new_idx])
+            if diff < diff_rate_per_round * new_prices[new_idx]:
+                score = max(score, next_row[new_idx + 1] + pair_score - diff)
+            row[new_idx] = score
+
+    matched, prev_left, new_left = [], [], []
+    prev_idx, new_idx = 0, 0
+    while prev_idx < prev_num and new_idx < new_num:
+        prev_order, order = prev_orders[prev_idx], new_orders[new_idx]
+        diff = abs(prev_order.price - order.price)
+        if diff < diff_rate_per_round * order.price and \
+                best[prev_idx][new_idx] == best[prev_idx + 1][new_idx + 1] + pair_score - diff:
+            matched.append((prev_order, order))
+            prev_idx += 1
+            new_idx += 1
+        elif best[prev_idx][new_idx] == best[prev_idx + 1][new_idx]:
+            # the previous order is left unmatched
+            prev_left.append(prev_order)
+            prev_idx += 1
         else:
-            reserve_orders.append(prev_order)
-    if len(prev_orders) > len(flags):
-        # remove additional previous orders
-        cancel_ids.extend([order.id for order in prev_orders[len(flags):]])
-    if len(new_orders) > len(flags):
-        # reverse additional new orders
-        merged_orders.extend(new_orders[len(flags):])
-    return merged_orders
+            new_left.append(order)
+            new_idx += 1
+    prev_left.extend(prev_orders[prev_idx:])
+    new_left.extend(new_orders[new_idx:])
+    return matched, prev_left, new_left
 
 def diff_prev_new_orders(
     diff_rate_per_round: float,
@@ -262,15 +412,23 @@ def diff_prev_new_orders(
     prev_orders: list,
     new_orders: list,
     cancel_ids: list,
-    reserve_orders: list
+    reserve_orders: list,
+    replace_pairs: list = None,
 ) -> list:
-    """ compare previous and new orders by price, if the difference < diff_rate_per_round,
+    """ match previous and new orders by price, if the difference < diff_rate_per_round,
         reserve the previous order, otherwise cancel the previous order and reserve the new one.
+        Levels are matched by price proximity instead of position, so inserting a level only
+        puts one new order. If replace_pairs is a list, unmatched levels are appended as
+        (previous order, new order) to be amended, instead of being canceled and put again.
     """
-    # replace ask/bid order with large price difference
     prev_orders.sort(key=lambda x: x.price, reverse=side=='BUY')  # sort by price
     new_orders.sort(key=lambda x: x.price, reverse=side=='BUY')  # sort by price
-    # True if no price difference
-    flags = [abs(prev_order.price / order.price - 1) < diff_rate_per_round
-        for prev_order, order in zip(prev_orders, new_orders)]
-    return _merge_orders(prev_orders, new_orders, flags, cancel_ids, reserve_orders)
+    matched, prev_left, new_left = _match_orders(diff_rate_per_round, prev_orders, new_orders)
+    reserve_orders.extend([prev_order for prev_order, _ in matched])
+    if replace_pairs is not None:
+        # amend previous order to the new order
+        pair_num = min(len(prev_left), len(new_left))
+        replace_pairs.extend(zip(prev_left[:pair_num], new_left[:pair_num]))
+        prev_left, new_left = prev_left[pair_num:], new_left[pair_num:]
+    cancel_ids.extend([order.id for order in prev_left])
+    return new_left
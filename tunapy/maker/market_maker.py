@@ -4,8 +4,10 @@ import os
 from re import A
 import sys
 import time
+import signal
 import traceback
 import asyncio
+import heapq
 from logging import Logger
 import json
 from collections import namedtuple
@@ -17,25 +19,53 @@ BASE_PATH = os.path.dirname(os.path.dirname(CURR_PATH))
 if BASE_PATH not in sys.path:
     sys.path.insert(0, BASE_PATH)
 
-from octopuspy.exchange.base_restapi import NewOrder
 from octopuspy.utils.log_util import create_logger
 
 from tunapy.management.market_making import TokenParameter
 from tunapy.quote.redis_client import DATA_REDIS_CLIENT
-from tunapy.cexapi.helper import get_private_client
+from tunapy.cexapi.helper import get_pooled_client, warm_up_client
+from tunapy.hedger.bifu_private_ws import BiFuPrivateWSClient
+from tunapy.hedger.bifu_future_private_ws import BiFuFuturePrivateWSClient
+from tunapy.maker.order_registry import OrderRegistry
+from tunapy.maker.snapshot import save_snapshot, load_snapshot
+from tunapy.utils.config_util import watch_config
+from tunapy.utils.rate_limiter import get_rate_limiter, reconfigure_rate_limiter, PRIORITY_MAKER, PRIORITY_FAR
 from tunapy.maker.maker_libs import (
     gen_ask_orders,
     gen_bid_orders,
     gen_client_order_id,
     gen_far_liquidity,
+    gen_near_orders_batch,
+    book_fingerprint,
+    book_move_bps,
+    to_new_order,
+    MakerOrder,
     mix_ask_bid_orders,
     diff_prev_new_orders,
 )
 
 EXCHANGE_DEPTH_PREFIX = 'depth'
 BATCH_SIZE = 10
-
-# CachedOrder class for storing order information with price and id
+STAT_INTERVAL = 60  # seconds between scheduling statistics logs
+SNAPSHOT_INTERVAL = 30  # seconds between snapshots of contexts
+SNAPSHOT_MAX_AGE = 3600 # snapshots older than this are not restored
+# cached orders in snapshots
+SNAPSHOT_ORDER_KEYS = ('prev_asks', 'prev_bids', 'prev_farasks', 'prev_farbids')
+# parameters bound to the context of a symbol, a change rebuilds the context
+IDENTITY_FIELDS = {'maker_exchange', 'api_key', 'api_secret', 'passphrase', 'stream_url', 'sub_accounts',
+                   'term_type', 'position_side', 'price_decimals', 'qty_decimals'}
+# parameters of far-end ladders, a change starts new ladders
+FAR_LADDER_FIELDS = {'far_strategy', 'far_side', 'far_buy_price_margin', 'far_sell_price_margin',
+                     'far_ask_size', 'far_bid_size', 'far_qty_multiplier', 'far_max_amt_per_order',
+                     'far_min_qty_per_order', 'far_min_amt_per_order'}
+
+# private order stream of maker exchange
+PRIVATE_WS_CHANNEL = {
+    "bifu_spot" : BiFuPrivateWSClient,
+    "bifu_future" : BiFuFuturePrivateWSClient,
+}
+
+# CachedOrder class for storing order information with price in ticks and id
 CachedOrder = namedtuple('CachedOrder', ['price', 'id'])
 
 async def _clear_all_open_orders(symbol: str, ctx: dict, logger: Logger):
@@ -49,40 +79,164 @@ async def _clear_all_open_orders(symbol: str, ctx: dict, logger: Logger):
 
 async def _clear_all_ner_open_orders(symbol: str, ctx: dict, logger: Logger):
     logger.info("Cancel all ner open orders of %s", symbol)
-    orders = await _open_orders(ctx, symbol)
-    cancell_ids = [order.order_id
-                   for order in orders if (hasattr(order, 'client_id') and not order.client_id.startswith('F0'))]
-    res = []
+    registry = ctx.get('registry')
+    if registry and registry.ready:
+        # local orders fed by the private stream, skip far-end orders
+        far_ids = set(co.id for co in ctx.get('prev_farasks', []) + ctx.get('prev_farbids', []))
+        cancell_ids = [order_id for order_id, client_id in registry.live_orders(symbol).items()
+                       if order_id not in far_ids and not client_id.startswith('F0')]
+    else:
+        orders = await _open_orders(ctx, symbol)
+        cancell_ids = [_listed_order_id(order) for order in orders
+                       if _listed_order_id(order) and not _listed_client_id(order).startswith('F0')]
     if cancell_ids:
-        if ctx['client']:
-            res = ctx['client'].batch_cancel(cancell_ids, symbol)
+        # cancel by the owner account of each order
+        res = await _cancel_orders(ctx, symbol, cancell_ids, logger)
+        if registry:
+            registry.remove(symbol, cancell_ids)
         logger.info('Cancel all near orders %s', res)
 
-async def _make_orders(ctx: dict, symbol: str, orders: list, logger: Logger) -> list:
+def _listed_order_id(order) -> str:
+    # open orders are dicts or OrderStatus-like objects, depending on the client
+    return order.get('orderId', '') if isinstance(order, dict) else getattr(order, 'order_id', '')
+
+def _listed_client_id(order) -> str:
+    return order.get('clientOrderId', '') if isinstance(order, dict) else getattr(order, 'client_id', '')
+
+def _canceled_order_ids(sub_res: list) -> list:
+    # cancel responses are order ids, or orders shaped like listed orders
+    return [item if isinstance(item, str) else _listed_order_id(item) for item in sub_res]
+
+async def _run_batches(accounts: list, method: str, symbol: str, items: list, max_inflight: int,
+                       priority: int = PRIORITY_MAKER, start: int = 0) -> list:
+    """ send items by chunks of BATCH_SIZE, chunk k is sent by accounts[(start + k) % len(accounts)],
+        at most max_inflight chunks of each account are in flight,
+        each chunk waits for the request budget of its account if the account has a limiter,
+        return (index of account, response) of chunks in order
+    """
+    semaphores = [asyncio.Semaphore(max(1, max_inflight)) for _ in accounts]
+
+    async def _send(idx: int, chunk: list):
+        account = accounts[idx]
+        async with semaphores[idx]:
+            if account['limiter']:
+                await account['limiter'].acquire_async(method, priority, len(chunk))
+            # the rest client is blocking, do not block other symbols in the event loop
+            return idx, await asyncio.to_thread(getattr(account['client'], method), chunk, symbol)
+
+    chunks = [items[offset:offset + BATCH_SIZE] for offset in range(0, len(items), BATCH_SIZE)]
+    return await asyncio.gather(
+        *[_send((start + k) % len(accounts), chunk) for k, chunk in enumerate(chunks)])
+
+async def _make_orders(ctx: dict, symbol: str, orders: list, logger: Logger,
+                       max_inflight: int = 1, priority: int = PRIORITY_MAKER) -> list:
     res = []
-    # get batch size from config
-    for start in range(0, len(orders), BATCH_SIZE):
-        sub_res = []
-        if ctx['client']:
-            sub_res = ctx['client'].batch_make_orders(orders[start:start + BATCH_SIZE], symbol)
+    if not ctx['client']:
+        return res
+    accounts = ctx['accounts']
+    # spread chunks over accounts, start from the next account in each round
+    start = ctx['next_account']
+    ctx['next_account'] = (start + 1) % len(accounts)
+    for idx, sub_res in await _run_batches(accounts, 'batch_make_orders', symbol, orders,
+                                           max_inflight, priority, start):
         logger.debug('Make Orders Response %s: %s', symbol, sub_res)
         res.extend(sub_res)
+        if len(accounts) > 1:
+            # the account putting an order owns it until it is canceled
+            for item in sub_res:
+                if item.order_id:
+                    ctx['order_owner'][item.order_id] = idx
     return res
 
-async def _cancel_orders(ctx: dict, symbol: str, cancel_ids: list, logger: Logger) -> int:
+async def _cancel_orders(ctx: dict, symbol: str, cancel_ids: list, logger: Logger,
+                         max_inflight: int = 1, priority: int = PRIORITY_MAKER) -> int:
     cancel_num = 0
-    for start in range(0, len(cancel_ids), BATCH_SIZE):
-        sub_res = []
-        if ctx['client']:
-            sub_res = ctx['client'].batch_cancel(cancel_ids[start:start + BATCH_SIZE], symbol)
-        logger.debug("cancel_orders %s: %s", symbol, sub_res)
-        cancel_num += len(sub_res)
+    if not ctx['client']:
+        return cancel_num
+    # group orders by owner account, orders of unknown owner belong to the main account
+    owner_ids = {}
+    for order_id in cancel_ids:
+        owner_ids.setdefault(ctx['order_owner'].get(order_id, 0), []).append(order_id)
+    error = None
+    for batches in await asyncio.gather(
+        *[_run_batches([ctx['accounts'][idx]], 'batch_cancel', symbol, order_ids, max_inflight, priority)
+          for idx, order_ids in owner_ids.items()], return_exceptions=True):
+        if isinstance(batches, Exception):
+            # orders of a failed cancel may be live, keep their owners to cancel them again
+            error = error or batches
+            continue
+        for _idx, sub_res in batches:
+            logger.debug("cancel_orders %s: %s", symbol, sub_res)
+            cancel_num += len(sub_res)
+            for order_id in _canceled_order_ids(sub_res):
+                ctx['order_owner'].pop(order_id, None)
+    if error:
+        raise error
     return cancel_num
 
-async def _open_orders(ctx: dict, symbol: str) -> list:
-    if ctx['client']:
-        return ctx['client'].open_orders(symbol)
-    return []
+def _amend_capable(ctx: dict) -> bool:
+    return bool(ctx['client']) and callable(getattr(ctx['client'], 'amend_order', None))
+
+def _amend_saves_requests(cancel_num: int, put_num: int, amend_num: int) -> bool:
+    """ whether amending amend_num orders, one request each, takes fewer requests than
+        canceling and putting them in the batches of cancel_num and put_num other orders
+    """
+    def batches(num: int) -> int:
+        return -(-num // BATCH_SIZE)
+    return amend_num + batches(cancel_num) + batches(put_num) < \
+        batches(cancel_num + amend_num) + batches(put_num + amend_num)
+
+async def _amend_orders(ctx: dict, symbol: str, replace_pairs: list, logger: Logger,
+                        max_inflight: int = 1, priority: int = PRIORITY_MAKER) -> list:
+    """ amend previous orders to the price and quantity of new orders by their owner accounts,
+        replace_pairs: (CachedOrder, NewOrder) of previous and new orders
+        return the order id of each amended order, '' if failed
+    """
+    semaphores = [asyncio.Semaphore(max(1, max_inflight)) for _ in ctx['accounts']]
+
+    async def _amend(prev_order: CachedOrder, order) -> str:
+        idx = ctx['order_owner'].get(prev_order.id, 0)
+        account = ctx['accounts'][idx]
+        async with semaphores[idx]:
+            try:
+                if account['limiter']:
+                    await account['limiter'].acquire_async('amend_order', priority)
+                res = await asyncio.to_thread(account['client'].amend_order, prev_order.id, symbol,
+                                              order.price, order.quantity)
+                logger.debug('Amend Order Response %s: %s', symbol, res)
+                order_id = res.order_id if res else ''
+                if idx and order_id and order_id != prev_order.id:
+                    ctx['order_owner'][order_id] = ctx['order_owner'].pop(prev_order.id)
+                return order_id
+            except Exception as e:
+                logger.warning('Amend order %s of %s failed: %s', prev_order.id, symbol, e)
+                return ''
+
+    return await asyncio.gather(*[_amend(prev_order, order) for prev_order, order in replace_pairs])
+
+async def _open_orders(ctx: dict, symbol: str, priority: int = PRIORITY_FAR) -> list:
+    """ open orders of symbol of all accounts, owners of listed orders are refreshed
+    """
+    if not ctx['client']:
+        return []
+
+    async def _list(account: dict) -> list:
+        if account['limiter']:
+            await account['limiter'].acquire_async('open_orders', priority)
+        return await asyncio.to_thread(account['client'].open_orders, symbol)
+
+    accounts = ctx['accounts']
+    if len(accounts) == 1:
+        return await _list(accounts[0])
+    orders = []
+    order_owner = {}
+    for idx, listed_orders in enumerate(await asyncio.gather(*[_list(account) for account in accounts])):
+        orders.extend(listed_orders)
+        for order in listed_orders:
+            order_owner[_listed_order_id(order)] = idx
+    # drop owners of filled orders
+    ctx['order_owner'] = order_owner
+    return orders
 
 async def handle_orders(
     param: TokenParameter,
@@ -105,42 +259,98 @@ async def handle_orders(
     no_force_refresh_num = ctx.get('no_force_refresh_num', 0)
 
     # max difference between prices of sequent rounds
-    diff_rate_per_round = float(param.near_diff_rate_per_round)
+    diff_rate_per_round = float(param.far_diff_rate_per_round if is_far else param.near_diff_rate_per_round)
     # diff_rate_per_round in BPS
     diff_rate_per_round *= 0.0001
     force_refresh_num = int(param.force_refresh_num)
+    # near-end refreshes go before far-end ladders in the request budget
+    priority = PRIORITY_FAR if is_far else PRIORITY_MAKER
 
     # order ids to be canceled
     cancel_ids = []
     # reserved previous orders
     reserve_asks, reserve_bids = [], []
-    if diff_rate_per_round <= 0 or no_force_refresh_num >= force_refresh_num:
+    # (previous order, new order) to be amended, None if amend is not supported
+    ask_pairs = [] if param.amend_orders and _amend_capable(ctx) else None
+    bid_pairs = [] if ask_pairs is not None else None
+    # far-end ladders are anchored on a stable grid, only near-end orders are forcely refreshed
+    if diff_rate_per_round <= 0 or (not is_far and no_force_refresh_num >= force_refresh_num):
         # forcely refresh: cancel all previous orders
         cancel_ids = [co.id for co in prev_asks + prev_bids]
         # reserve all new ask/bid orders
         merged_asks = ask_orders
         merged_bids = bid_orders
         # update context
-        ctx['no_force_refresh_num'] = 0
+        if not is_far:
+            ctx['no_force_refresh_num'] = 0
     else:
         # replace ask/bid order with large price difference
         merged_asks = diff_prev_new_orders(diff_rate_per_round, 'SELL', prev_asks, ask_orders,
-                                           cancel_ids, reserve_asks)
+                                           cancel_ids, reserve_asks, ask_pairs)
         merged_bids = diff_prev_new_orders(diff_rate_per_round, 'BUY', prev_bids, bid_orders,
-                                           cancel_ids, reserve_bids)
+                                           cancel_ids, reserve_bids, bid_pairs)
         # update context
-        ctx['no_force_refresh_num'] += 1
+        if not is_far:
+            ctx['no_force_refresh_num'] += 1
+
+    if (ask_pairs or bid_pairs) and not _amend_saves_requests(
+            len(cancel_ids), len(merged_asks) + len(merged_bids), len(ask_pairs) + len(bid_pairs)):
+        # batched cancel and put cost fewer requests, pairs are the inner levels of unmatched orders
+        cancel_ids.extend([prev_order.id for prev_order, _ in ask_pairs + bid_pairs])
+        merged_asks = [order for _, order in ask_pairs] + merged_asks
+        merged_bids = [order for _, order in bid_pairs] + merged_bids
+        ask_pairs = bid_pairs = []
+    if ask_pairs or bid_pairs:
+        # amend changed levels in place, fall back to cancel and put if failed
+        amended_ids = await _amend_orders(
+            ctx, maker_symbol, [(prev_order, to_new_order(order, param.ticks))
+                                for prev_order, order in ask_pairs + bid_pairs],
+            logger, param.max_inflight_batches, priority)
+        registry = ctx.get('registry')
+        for idx, ((prev_order, order), order_id) in enumerate(zip(ask_pairs + bid_pairs, amended_ids)):
+            is_ask = idx < len(ask_pairs)
+            if not order_id:
+                cancel_ids.append(prev_order.id)
+                (merged_asks if is_ask else merged_bids).append(order)
+                continue
+            (reserve_asks if is_ask else reserve_bids).append(CachedOrder(price=order.price, id=order_id))
+            if registry and order_id != prev_order.id:
+                registry.remove(maker_symbol, [prev_order.id])
+                registry.add(maker_symbol, order_id, order.client_id)
+        logger.debug('Amend orders %s: %d amended, %d replaced', maker_symbol,
+                     len([order_id for order_id in amended_ids if order_id]),
+                     len([order_id for order_id in amended_ids if not order_id]))
 
     mix_new_orders = mix_ask_bid_orders(merged_asks, merged_bids)
     logger.debug('New Ordres: %s', mix_new_orders)
     cancel_num = 0 # number of canceled orders
     made_orders = [] # response of make orders
     if mix_new_orders:
-        # First put new orders, then cancel previous orders
-        made_orders = await _make_orders(ctx, maker_symbol, mix_new_orders, logger)
+        max_inflight = param.max_inflight_batches
+        # price and quantity to strings at the API boundary
+        api_orders = [to_new_order(order, param.ticks) for order in mix_new_orders]
+        if param.place_before_cancel or not cancel_ids:
+            # First put new orders, then cancel previous orders
+            made_orders = await _make_orders(ctx, maker_symbol, api_orders, logger, max_inflight, priority)
+            if cancel_ids:
+                cancel_num = await _cancel_orders(ctx, maker_symbol, cancel_ids, logger,
+                                                  max_inflight, priority)
+        else:
+            # cancel superseded orders while putting new orders
+            made_orders, cancel_num = await asyncio.gather(
+                _make_orders(ctx, maker_symbol, api_orders, logger, max_inflight, priority),
+                _cancel_orders(ctx, maker_symbol, cancel_ids, logger, max_inflight, priority))
+        registry = ctx.get('registry')
+        if registry and cancel_ids:
+            registry.remove(maker_symbol, cancel_ids)
+        if len([item for item in made_orders if item.order_id]) < len(mix_new_orders):
+            # some orders are not put, requote in the next round
+            ctx['fingerprint'] = None
         for order, item in zip(mix_new_orders, made_orders):
             order_id = item.order_id
             if order_id:
+                if registry:
+                    registry.add(maker_symbol, order_id, order.client_id)
                 if order.side == 'BUY':
                     # define cancel order data structure
                     reserve_bids.append(
@@ -158,7 +368,6 @@ async def handle_orders(
             ctx['prev_bids'] = reserve_bids
 
         if cancel_ids:
-            cancel_num = await _cancel_orders(ctx, maker_symbol, cancel_ids, logger)
             if not cancel_num:
                 # failed to cancel previous orders
                 ctx['top_ask'] = min(ctx.get('top_ask', top_ask), top_ask)
@@ -169,7 +378,6 @@ async def handle_orders(
                 ctx['top_bid'] = top_bid
         if is_far: # far end orders
             # handle exception in batch make orders, roll-back
-            listed_orders = await _open_orders(ctx, maker_symbol)
             # made_orders are orders of far-end
             expect_ids = set([item.id for item in reserve_asks + reserve_bids])
             # add previous near-end orders
@@ -177,17 +385,37 @@ async def handle_orders(
                 expect_ids.add(co.id)
             for co in ctx.get('prev_bids', []):
                 expect_ids.add(co.id)
-            unexpected_orders = [o['orderId'] for o in listed_orders if o['orderId'] \
-                                and o['orderId'] not in expect_ids]
+            if registry and not registry.audit_due(maker_symbol, param.open_orders_audit_interval):
+                # reconcile with local orders fed by the private stream
+                live_ids = list(registry.live_orders(maker_symbol))
+            else:
+                listed_orders = await _open_orders(ctx, maker_symbol)
+                logger.debug('listed orders: %s', listed_orders)
+                live_ids = [_listed_order_id(o) for o in listed_orders if _listed_order_id(o)]
+                if registry:
+                    registry.reset(maker_symbol, {_listed_order_id(o): _listed_client_id(o)
+                                                  for o in listed_orders if _listed_order_id(o)})
+            unexpected_orders = [order_id for order_id in live_ids if order_id not in expect_ids]
             if unexpected_orders:
-                await _cancel_orders(ctx, maker_symbol, unexpected_orders, logger)
+                await _cancel_orders(ctx, maker_symbol, unexpected_orders, logger, max_inflight, priority)
+                if registry:
+                    registry.remove(maker_symbol, unexpected_orders)
                 logger.warning("Unexpected Orders %s", unexpected_orders)
-                logger.debug('listed orders: %s', listed_orders)
     else:
         # no new orders, only delete reduced orders.
+        if is_far:
+            ctx['prev_farasks'] = reserve_asks
+            ctx['prev_farbids'] = reserve_bids
+        else:
+            ctx['prev_asks'] = reserve_asks
+            ctx['prev_bids'] = reserve_bids
         if cancel_ids:
-            cancel_num = await _cancel_orders(ctx, maker_symbol, cancel_ids, logger)
-        ctx['no_force_refresh_num'] += 1
+            cancel_num = await _cancel_orders(ctx, maker_symbol, cancel_ids, logger,
+                                              param.max_inflight_batches, priority)
+            if ctx.get('registry'):
+                ctx['registry'].remove(maker_symbol, cancel_ids)
+        if not is_far:
+            ctx['no_force_refresh_num'] += 1
 
     logger.debug("HANDLE ORDERS: symbol: %s, diff rate per round: %s, no force refresh rounds: %s, "
                  "force refresh rounds: %s, prev ask size: %s, prev bid size: %s, "
@@ -197,11 +425,29 @@ async def handle_orders(
     logger.debug("put orders: %s, cancel orders num: %s", made_orders, cancel_num)
 
 
+def _get_order_book(param: TokenParameter, ctx: dict, logger: Logger) -> dict:
+    """ get order book of following symbol, cached in redis
+    """
+    # binance have 2 types of future: UMFuture and portfolio_margin
+    exchange_mapping = {
+        "binance_UMFuture": "binance_future",
+        "binance_portfolio_margin": "binance_future"
+    }
+    _exchange_prefix = exchange_mapping.get(ctx['follow_exchange'], ctx['follow_exchange'])
+    symbol_key = f'{_exchange_prefix}_{EXCHANGE_DEPTH_PREFIX}{param.follow_symbol.lower()}'
+    ask_bid = DATA_REDIS_CLIENT.get_order_book(symbol_key)
+    logger.debug("get orderbook of key [%s]: %s", symbol_key, ask_bid)
+    if not ask_bid or not ask_bid.get('asks') or not ask_bid.get('bids'):
+        return None
+    return ask_bid
+
 async def market_making(
     param: TokenParameter,        # market making parameters
     ctx: dict,          # context, include previous orders
     logger: Logger,
-    is_far: bool
+    is_far: bool,
+    ask_bid: dict = None,
+    near_quotes: tuple = None,
 ):
     """ Run market making strategy
         Parameters:
@@ -210,36 +456,36 @@ async def market_making(
             ctx: the context of the current symbol
             logger: the logger
             is_far: whether put far-end orders 
+            ask_bid: order book of following symbol, fetched from redis if None
+            near_quotes: (asks, bids) generated by gen_near_orders_batch, generated here if None
     """
     maker_symbol = param.maker_symbol
     try:
         job_start_ts = time.time()
 
-        # get order book of following symbol, cached in redis
-        # binance have 2 types of future: UMFuture and portfolio_margin
-        exchange_mapping = {
-            "binance_UMFuture": "binance_future",
-            "binance_portfolio_margin": "binance_future"
-        }
-        _exchange_prefix = exchange_mapping.get(ctx['follow_exchange'], ctx['follow_exchange'])
-        symbol_key = f'{_exchange_prefix}_{EXCHANGE_DEPTH_PREFIX}{param.follow_symbol.lower()}'
-        ask_bid = DATA_REDIS_CLIENT.get_order_book(symbol_key)
-        logger.debug("get orderbook of key [%s]: %s", symbol_key, ask_bid)
-        if not ask_bid or not ask_bid.get('asks') or not ask_bid.get('bids'):
+        if ask_bid is None:
+            ask_bid = _get_order_book(param, ctx, logger)
+        if not ask_bid:
             logger.warning('Cannot get quotes of %s', maker_symbol)
             return
 
         # first generate new near-end ask/bid orders
         side = param.near_side # put ASK or BID or Both
-        new_asks = gen_ask_orders(ask_bid['asks'], param) if side in ('BOTH', 'ASK') else []
-        new_bids = gen_bid_orders(ask_bid['bids'], param) if side in ('BOTH', 'BID') else []
+        if near_quotes is None:
+            new_asks = gen_ask_orders(ask_bid['asks'], param) if side in ('BOTH', 'ASK') else []
+            new_bids = gen_bid_orders(ask_bid['bids'], param) if side in ('BOTH', 'BID') else []
+        else:
+            new_asks = near_quotes[0].tolist() if side in ('BOTH', 'ASK') else []
+            new_bids = near_quotes[1].tolist() if side in ('BOTH', 'BID') else []
 
         # for client order id
         clorder_start = int(time.time() / 86400)
         clorder_offset = int(time.time()*1000) % 86400000
 
         # the top ask and bid of prevous round's near orders
-        top_bid = max(new_bids[0][0] if new_bids else float(ask_bid['bids'][0][0]), ctx.get('top_bid', 0))
+        # prices in ticks
+        top_bid = max(new_bids[0][0] if new_bids else param.ticks.to_ticks(ask_bid['bids'][0][0]),
+                      ctx.get('top_bid', 0))
         valid_asks = []
         for price, qty in new_asks:
             if price > top_bid:  # avoid self-trade
@@ -247,12 +493,11 @@ async def market_making(
                     # Future order: Spot SELL corresponds to Future LONG
                     valid_asks.append(
                         # batch order data structure
-                        NewOrder(
+                        MakerOrder(
                             symbol=maker_symbol,
                             client_id=gen_client_order_id(
                                 maker_symbol, clorder_start, clorder_offset),
                             side="BUY",
-                            type='LIMIT',
                             quantity=qty,
                             price=price,
                             biz_type=param.term_type,
@@ -264,12 +509,11 @@ async def market_making(
                     # Spot order
                     valid_asks.append(
                         # batch order data structure
-                        NewOrder(
+                        MakerOrder(
                             symbol=maker_symbol,
                             client_id=gen_client_order_id(
                                 maker_symbol, clorder_start, clorder_offset),
                             side="SELL",
-                            type='LIMIT',
                             quantity=qty,
                             price=price,
                             biz_type=param.term_type,
@@ -279,19 +523,19 @@ async def market_making(
                     )
                 clorder_offset += 1
         valid_bids = []
-        top_ask = min(new_asks[0][0] if new_asks else float(ask_bid['asks'][0][0]), ctx.get('top_ask', top_bid))
+        top_ask = min(new_asks[0][0] if new_asks else param.ticks.to_ticks(ask_bid['asks'][0][0]),
+                      ctx.get('top_ask', top_bid))
         for price, qty in new_bids:
             if price < top_ask:
                 if param.term_type == 'FUTURE':
                     # Future order: Spot BUY corresponds to Future SHORT
                     valid_bids.append(
                         # batch order data structure
-                        NewOrder(
+                        MakerOrder(
                             symbol=maker_symbol,
                             client_id=gen_client_order_id(
                                 maker_symbol, clorder_start, clorder_offset),
                             side="SELL",
-                            type='LIMIT',
                             quantity=qty,
                             price=price,
                             biz_type=param.term_type,
@@ -303,12 +547,11 @@ async def market_making(
                     # Spot order
                     valid_bids.append(
                         # batch order data structure
-                        NewOrder(
+                        MakerOrder(
                             symbol=maker_symbol,
                             client_id=gen_client_order_id(
                                 maker_symbol, clorder_start, clorder_offset),
                             side="BUY",
-                            type='LIMIT',
                             quantity=qty,
                             price=price,
                             biz_type=param.term_type,
@@ -330,83 +573,416 @@ async def market_making(
         job_start_ts = time.time()
         if param.far_side in ('BOTH', 'ASK'):
             far_ask_orders = gen_far_liquidity(maker_symbol, param, ask_bid, side='SELL',
-                                               guard_price=top_bid, cl_order_start=clorder_start)
+                                               guard_price=top_bid, cl_order_start=clorder_start,
+                                               ladder=ctx['far_ladder']['SELL'])
         if param.far_side in ('BOTH', 'BID'):
             far_bid_orders = gen_far_liquidity(maker_symbol, param, ask_bid, side='BUY',
-                                               guard_price=top_ask, cl_order_start=clorder_start)
+                                               guard_price=top_ask, cl_order_start=clorder_start,
+                                               ladder=ctx['far_ladder']['BUY'])
         await handle_orders(
             param, maker_symbol, far_ask_orders, far_bid_orders, ctx, logger, True)
         logger.info("[delay:maker-far]%s:%s", maker_symbol, int(
             (time.time() - job_start_ts) * 1000))
     except Exception:
         logger.error(traceback.format_exc())
+        # near-end orders are cleared, requote in the next round
+        ctx['fingerprint'] = None
         await _clear_all_ner_open_orders(maker_symbol, ctx, logger)
 
 
-async def main(params: list[TokenParameter]):
+def _start_order_stream(param: TokenParameter, registries: dict, logger: Logger) -> OrderRegistry:
+    """ start the private order stream of the maker account, shared by symbols of the same account,
+        return None if the stream is not configured or not supported
+    """
+    ws_type = PRIVATE_WS_CHANNEL.get(param.maker_exchange)
+    if not param.stream_url or not ws_type:
+        return None
+    account = (param.maker_exchange, param.api_key)
+    if account not in registries:
+        # orders of sub-accounts are fed to the registry of the main account
+        credentials = [(param.api_key, param.api_secret, param.passphrase)] + list(param.sub_accounts)
+        registry = OrderRegistry(streams=len(credentials))
+        for api_key, api_secret, passphrase in credentials:
+            ws_client = ws_type({
+                'API KEY': api_key,
+                'Secret': api_secret,
+                'Passphrase': passphrase,
+                'Stream URL': param.stream_url,
+            }, logger)
+            ws_client.start(param.maker_symbol,
+                            on_open=registry.on_open,
+                            on_close=registry.on_close,
+                            handle_trade_filled=None,
+                            on_error=lambda error: logger.error('Order stream error: %s', error),
+                            handle_order_update=registry.on_order_update)
+        registries[account] = registry
+        logger.info('start order stream of %s for %s', param.maker_exchange, param.maker_symbol)
+    return registries[account]
+
+def _new_context(param: TokenParameter, logger: Logger, registry: OrderRegistry = None) -> dict:
+    accounts = []
+    for api_key, api_secret, passphrase in [(param.api_key, param.api_secret, param.passphrase)] + \
+            list(param.sub_accounts):
+        # symbols of the same account share one client and its keep-alive connections
+        client = get_pooled_client(exchange=param.maker_exchange,
+                                   api_key=api_key,
+                                   api_secret=api_secret,
+                                   passphrase=passphrase,
+                                   logger=logger,
+                                   )
+        # use mock interface for fast testing
+        # client.mock = True
+        accounts.append({
+            'client': client,
+            # request budget shared by all processes using the API key
+            'limiter': get_rate_limiter(param.maker_exchange, api_key, param.rate_limit),
+        })
+    return {
+        'client': accounts[0]['client'],    # client of the main account
+        'limiter': accounts[0]['limiter'],  # request budget of the main account
+        'accounts': accounts,   # main account and sub-accounts sharing the orders of the symbol
+        'next_account': 0,      # the account sending the first chunk of the next round
+        'order_owner': {},      # order id -> index of the owner account, sub-accounts only
+        'registry': registry,   # local live orders fed by the private stream, None if no stream
+        'follow_exchange': param.follow_exchange,   # used to create get_ticker key
+        'prev_asks': [],    # previous made ask orders, near-end
+        'prev_bids': [],    # previous made bid orders, near-end
+        'prev_farasks': [],    # previous made ask orders, far-end
+        'prev_farbids': [],    # previous made bid orders, far-end
+        'far_ladder': {'SELL': {}, 'BUY': {}},  # grid anchor and sticky level quantities of far-end ladders
+        'no_force_refresh_num': 0,
+        'fingerprint': None,    # fingerprint of the follow book of the last near-end round
+        'far_pending': bool(param.far_interval),    # put far-end orders in the next round
+        'task': None,   # the running round of the symbol
+        'stat': {
+            'rounds': 0,    # finished rounds
+            'overruns': 0,  # rounds skipped because the previous round is still running
+            'slow_rounds': 0,   # rounds that cost longer than near_interval
+            'max_cost': 0.0,    # max cost of a round in seconds
+            'max_lag': 0.0,     # max delay between the scheduled and the actual start in seconds
+            'acts': 0,      # near-end rounds putting orders
+            'skips': 0,     # near-end rounds skipped because the follow book hardly moves
+        },
+    }
+
+async def _timed_market_making(param: TokenParameter, ctx: dict, logger: Logger, is_far: bool,
+                               ask_bid: dict = None, near_quotes: tuple = None):
+    """ run one round of market making and record the cost of the round
+    """
+    start_ts = time.time()
+    try:
+        await market_making(param, ctx, logger, is_far, ask_bid, near_quotes)
+    except Exception:
+        logger.error(traceback.format_exc())
+    cost = time.time() - start_ts
+    stat = ctx['stat']
+    stat['rounds'] += 1
+    stat['max_cost'] = max(stat['max_cost'], cost)
+    if cost > param.near_interval:
+        stat['slow_rounds'] += 1
+        logger.warning('[overrun]%s: round cost %sms > near interval %sms',
+                       param.maker_symbol, int(cost * 1000), int(param.near_interval * 1000))
+
+def _skip_requote(param: TokenParameter, ctx: dict, ask_bid: dict) -> bool:
+    """ whether the follow book moves less than requote_threshold since the last near-end round,
+        skipped rounds still count for force refresh
+    """
+    if param.requote_threshold <= 0:
+        return False
+    fingerprint = book_fingerprint(ask_bid, param)
+    if ctx['no_force_refresh_num'] < param.force_refresh_num and \
+        book_move_bps(ctx['fingerprint'], fingerprint) < param.requote_threshold:
+        ctx['no_force_refresh_num'] += 1
+        return True
+    ctx['fingerprint'] = fingerprint
+    return False
+
+def _start_rounds(due_rounds: dict, logger: Logger):
+    """ generate near-end orders of symbols due in the same tick by one batch,
+        then start a market making round for each symbol
+        due_rounds: {symbol: (param, ctx, is_far)}
+    """
+    books = {}
+    for symbol, (param, ctx, _) in due_rounds.items():
+        try:
+            # {} if no quotes, the round logs a warning without fetching again
+            books[symbol] = _get_order_book(param, ctx, logger) or {}
+        except Exception:
+            # None: the round fetches again and handles the exception
+            books[symbol] = None
+    for symbol, (param, ctx, is_far) in list(due_rounds.items()):
+        if not is_far and books[symbol] and _skip_requote(param, ctx, books[symbol]):
+            ctx['stat']['skips'] += 1
+            del due_rounds[symbol]
+        else:
+            ctx['stat']['acts'] += 1
+    quoted = [symbol for symbol in due_rounds if books[symbol]]
+    near_quotes = {}
+    if quoted:
+        try:
+            near_quotes = dict(zip(quoted, gen_near_orders_batch(
+                [books[symbol] for symbol in quoted], [due_rounds[symbol][0] for symbol in quoted])))
+        except Exception:
+            # each round generates its own orders
+            logger.error(traceback.format_exc())
+    for symbol, (param, ctx, is_far) in due_rounds.items():
+        ctx['task'] = asyncio.create_task(_timed_market_making(
+            param, ctx, logger, is_far, books[symbol], near_quotes.get(symbol)))
+
+def _log_stat(_prev_context: dict, logger: Logger):
+    for symbol, ctx in _prev_context.items():
+        stat = ctx['stat']
+        logger.info('|STAT| %s: rounds %d, overruns %d, slow rounds %d, max cost %dms, max lag %dms, '
+                    'acts %d, skips %d',
+                    symbol, stat['rounds'], stat['overruns'], stat['slow_rounds'],
+                    int(stat['max_cost'] * 1000), int(stat['max_lag'] * 1000),
+                    stat['acts'], stat['skips'])
+        stat['max_cost'] = stat['max_lag'] = 0.0
+
+def _snapshot_name(param: TokenParameter) -> str:
+    return f'{param.maker_exchange}_{param.maker_symbol}'
+
+def _dump_context(param: TokenParameter, ctx: dict) -> dict:
+    """ the part of context kept across restarts, prices in ticks of the decimals.
+        Top ask/bid guards are not kept, they are derived from the restored near-end orders
+    """
+    data = {key: [[co.price, co.id] for co in ctx[key]] for key in SNAPSHOT_ORDER_KEYS}
+    data['decimals'] = [param.price_decimals, param.qty_decimals]
+    data['no_force_refresh_num'] = ctx['no_force_refresh_num']
+    # json keys are strings, keep grid levels as pairs
+    data['far_ladder'] = {side: {'anchor': ladder.get('anchor'),
+                                 'qtys': [[level, qty] for level, qty in ladder.get('qtys', {}).items()]}
+                          for side, ladder in ctx['far_ladder'].items()}
+    return data
+
+def _save_snapshots(snapshots: dict, logger: Logger):
+    """ save dumped contexts, {snapshot name: data}
+    """
+    for name, data in snapshots.items():
+        try:
+            if not save_snapshot(name, data):
+                logger.warning('Redis unavailable, snapshot %s is saved to local file', name)
+        except Exception:
+            logger.error(traceback.format_exc())
+
+async def _restore_context(param: TokenParameter, ctx: dict, logger: Logger):
+    """ restore the context of the last run, only orders listed by open orders are kept
+    """
+    symbol = param.maker_symbol
+    try:
+        data = load_snapshot(_snapshot_name(param), SNAPSHOT_MAX_AGE)
+        if not data:
+            return
+        listed_orders = await _open_orders(ctx, symbol, PRIORITY_MAKER)
+        live_orders = {}
+        for order in listed_orders:
+            live_orders[_listed_order_id(order)] = _listed_client_id(order)
+        live_orders.pop('', None)
+        restored = 0
+        # ticks of other decimals are wrong, live orders are then canceled by the open orders audit
+        same_ticks = data.get('decimals', [param.price_decimals, param.qty_decimals]) == \
+            [param.price_decimals, param.qty_decimals]
+        if not same_ticks:
+            logger.warning('Restore %s: decimals changed from %s, cached orders are dropped',
+                           symbol, data['decimals'])
+        for key in SNAPSHOT_ORDER_KEYS if same_ticks else ():
+            ctx[key] = [CachedOrder(price=price, id=order_id)
+                        for price, order_id in data.get(key, []) if order_id in live_orders]
+            restored += len(ctx[key])
+        ctx['no_force_refresh_num'] = data.get('no_force_refresh_num', 0)
+        for side, ladder in data.get('far_ladder', {}).items() if same_ticks else ():
+            if ladder.get('anchor'):
+                ctx['far_ladder'][side] = {'anchor': ladder['anchor'],
+                                           'qtys': {int(level): qty for level, qty in ladder['qtys']}}
+        # self-trade guards of the live near-end orders, as after a round canceling all others
+        if ctx['prev_asks']:
+            ctx['top_ask'] = min(co.price for co in ctx['prev_asks'])
+        if ctx['prev_bids']:
+            ctx['top_bid'] = max(co.price for co in ctx['prev_bids'])
+        if ctx['registry']:
+            ctx['registry'].reset(symbol, live_orders)
+        logger.info('Restore %s: %d of %d cached orders are live, %d open orders',
+                    symbol, restored, sum(len(data.get(key, [])) for key in SNAPSHOT_ORDER_KEYS),
+                    len(live_orders))
+    except Exception:
+        logger.error('Restore %s failed: %s', symbol, traceback.format_exc())
+
+def _changed_fields(old_param: TokenParameter, new_param: TokenParameter) -> set:
+    # ticks is derived from decimals
+    return {key for key, value in vars(new_param).items()
+            if key != 'ticks' and getattr(old_param, key, None) != value}
+
+async def _reload_params(new_params: list, params: list, timers: list, contexts: dict,
+                         registries: dict, logger: Logger) -> list:
+    """ apply reloaded parameters to contexts, return the new timer heap.
+        Symbols with changed identity fields or removed symbols cancel their cached orders and
+        drop their contexts; other symbols keep their contexts and resting orders, which are
+        matched with the orders of new parameters in the next round.
+    """
+    new_by_symbol = {param.maker_symbol: param for param in new_params}
+    due = {(params[idx].maker_symbol, far_timer): due_ts for due_ts, idx, far_timer in timers}
+    for symbol, old_param in {param.maker_symbol: param for param in params}.items():
+        new_param = new_by_symbol.get(symbol)
+        changed = _changed_fields(old_param, new_param) if new_param else set()
+        if new_param and not changed:
+            continue
+        if new_param and 'rate_limit' in changed:
+            # limiters are shared by API key, a new context would get the old budget
+            for api_key in [new_param.api_key] + [account.api_key for account in new_param.sub_accounts]:
+                reconfigure_rate_limiter(new_param.maker_exchange, api_key, new_param.rate_limit)
+        if new_param and not changed & IDENTITY_FIELDS:
+            ctx = contexts[symbol]
+            if changed & FAR_LADDER_FIELDS:
+                ctx['far_ladder'] = {'SELL': {}, 'BUY': {}}
+                ctx['far_pending'] = True
+            # requote with new parameters even if the follow book hardly moves
+            ctx['fingerprint'] = None
+            logger.info('Reload %s: %s', symbol, sorted(changed))
+            continue
+        # the orders of the old context are not tracked any more
+        ctx = contexts.pop(symbol)
+        if ctx['task'] and not ctx['task'].done():
+            await asyncio.wait([ctx['task']])
+        await _cancel_orders(ctx, symbol, [co.id for key in SNAPSHOT_ORDER_KEYS for co in ctx[key]], logger)
+        due.pop((symbol, False), None)
+        due.pop((symbol, True), None)
+        logger.info('Reload %s: %s', symbol,
+                    f'rebuild context, {sorted(changed & IDENTITY_FIELDS)}' if new_param else 'removed')
+
+    ts = time.time()
+    new_timers = []
+    for idx, param in enumerate(new_params):
+        symbol = param.maker_symbol
+        if symbol not in contexts:
+            contexts[symbol] = _new_context(param, logger, _start_order_stream(param, registries, logger))
+        new_timers.append((min(due.get((symbol, False), ts), ts + param.near_interval), idx, False))
+        if param.far_interval:
+            far_due = ts + param.far_interval
+            new_timers.append((min(due.get((symbol, True), far_due), far_due), idx, True))
+    heapq.heapify(new_timers)
+    return new_timers
+
+async def main(params: list[TokenParameter], config_key: str = ''):
     """ The main function
+        Every symbol runs on its own schedule: the timer heap holds the next near-end and
+        far-end due time of each symbol, a slow symbol only delays its own rounds.
+        If config_key is set, parameters pushed by set_config(config_key, ...) are applied
+        at the next timer.
     """
     logger = create_logger(BASE_PATH, f"market_making.log", 'MM')
     logger.info('start market maker with config: %s', params)
 
-    _last_operating_ts = {}  # the timestamp of last making orders for each pair
     _prev_context = {}  # previous context of MM data
-    while 1:
-        try:
-            tasks = []
-            for param in params:
-                symbol = param.maker_symbol
+    _registries = {}    # local live orders of each maker account
+    # timer heap of (due timestamp, index of param, is far-end timer)
+    timers = []
+    ts = time.time()
+    for idx, param in enumerate(params):
+        if param.maker_symbol not in _prev_context:
+            _prev_context[param.maker_symbol] = _new_context(
+                param, logger, _start_order_stream(param, _registries, logger))
+        heapq.heappush(timers, (ts, idx, False))
+        if param.far_interval:
+            heapq.heappush(timers, (ts + param.far_interval, idx, True))
+    # adopt resting orders of the last run instead of replacing the whole book
+    snapshot_params = {param.maker_symbol: param for param in params}
+    await asyncio.gather(*[_restore_context(param, _prev_context[symbol], logger)
+                           for symbol, param in snapshot_params.items()])
+    # open connections of each client before the first orders
+    client_symbols = {}
+    for symbol, ctx in _prev_context.items():
+        for account in ctx['accounts']:
+            client_symbols.setdefault(id(account['client']), (account['client'], []))[1].append(symbol)
+    await asyncio.gather(*[asyncio.to_thread(warm_up_client, client, symbols, logger)
+                           for client, symbols in client_symbols.values()])
+    try:
+        # stop by SIGTERM as by Ctrl-C, so that contexts are saved
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+    pending_config = {} # the latest pushed config, applied in the main loop
+    if config_key:
+        loop = asyncio.get_running_loop()
+        watch_config(config_key,
+                     lambda version, conf: loop.call_soon_threadsafe(
+                         pending_config.update, version=version, conf=conf),
+                     logger=logger)
+    ts = time.time()
+    last_stat_ts = last_snapshot_ts = ts
+    due_rounds = {} # rounds due in the current tick, {symbol: (param, ctx, is_far)}
+    try:
+        while timers:
+            try:
                 ts = time.time()
-
-                # check update frequency
-                if symbol not in _last_operating_ts:
-                    _last_operating_ts[symbol] = {'near_opts': 0.0, 'far_opts': 0.0}
-                op_ts = _last_operating_ts[symbol]
-                if op_ts['near_opts'] + param.near_interval > ts:
+                if ts > last_stat_ts + STAT_INTERVAL:
+                    _log_stat(_prev_context, logger)
+                    last_stat_ts = ts
+                if pending_config and not due_rounds:
+                    version, conf = pending_config.pop('version'), pending_config.pop('conf')
+                    try:
+                        new_params = [TokenParameter(item) for item in conf]
+                    except Exception:
+                        new_params = None
+                        logger.error('Invalid config version %s: %s', version, traceback.format_exc())
+                    if new_params:
+                        logger.info('Reload config version %s', version)
+                        timers = await _reload_params(new_params, params, timers, _prev_context,
+                                                      _registries, logger)
+                        params = new_params
+                        snapshot_params = {param.maker_symbol: param for param in params}
+                        continue
+                if ts > last_snapshot_ts + SNAPSHOT_INTERVAL:
+                    # dump in the event loop, write in a thread
+                    snapshots = {_snapshot_name(param): _dump_context(param, _prev_context[symbol])
+                                 for symbol, param in snapshot_params.items()}
+                    await asyncio.to_thread(_save_snapshots, snapshots, logger)
+                    last_snapshot_ts = ts
+
+                due_ts, idx, far_timer = timers[0]
+                if due_ts > ts:
+                    if due_rounds:
+                        rounds, due_rounds = due_rounds, {}
+                        _start_rounds(rounds, logger)
+                        # let started rounds run before waiting for the next timer
+                        await asyncio.sleep(0)
+                        continue
+                    await asyncio.sleep(min(due_ts - ts, STAT_INTERVAL))
+                    continue
+                heapq.heappop(timers)
+                param = params[idx]
+                ctx = _prev_context[param.maker_symbol]
+                interval = param.far_interval if far_timer else param.near_interval
+                # keep the cadence, but never burst to catch up missed rounds
+                heapq.heappush(timers, (max(due_ts + interval, ts), idx, far_timer))
+                if far_timer:
+                    # far-end orders are put by the next near-end round
+                    ctx['far_pending'] = True
                     continue
-                _last_operating_ts[symbol]['near_opts'] = ts
-
-                is_far = False
-                if param.far_interval and op_ts['far_opts'] + param.far_interval <= ts:
-                    _last_operating_ts[symbol]['far_opts'] = ts
-                    is_far = True
-
-                if symbol not in _prev_context:
-                    client = get_private_client(exchange=param.maker_exchange,
-                                                api_key=param.api_key,
-                                                api_secret=param.api_secret,
-                                                passphrase=param.passphrase,
-                                                logger=logger,
-                                                )
-                    # use mock interface for fast testing
-                    # client.mock = True
-                    _prev_context[symbol] = {
-                        'client': client,
-                        'follow_exchange': param.follow_exchange,   # used to create get_ticker key
-                        'prev_asks': [],    # previous made ask orders, near-end
-                        'prev_bids': [],    # previous made bid orders, near-end
-                        'prev_farasks': [],    # previous made ask orders, far-end
-                        'prev_farbids': [],    # previous made bid orders, far-end
-                        'no_force_refresh_num': 0,
-                    }
-                tasks.append(asyncio.create_task(market_making(
-                    param, _prev_context[symbol], logger, is_far)))
-
-            if tasks:
-                await asyncio.gather(*tasks)
-            else:
-                await asyncio.sleep(0.05)
-        except Exception:
-            logger.error(traceback.format_exc())
-
-    # before exit
-    for symbol, ctx in _prev_context.items():
-        await _clear_all_ner_open_orders(symbol, ctx, logger)
 
+                if param.maker_symbol in due_rounds or (ctx['task'] and not ctx['task'].done()):
+                    ctx['stat']['overruns'] += 1
+                    logger.warning('[overrun]%s: previous round is still running, skip round due %sms ago',
+                                   param.maker_symbol, int((ts - due_ts) * 1000))
+                    continue
+                ctx['stat']['max_lag'] = max(ctx['stat']['max_lag'], ts - due_ts)
+                due_rounds[param.maker_symbol] = (param, ctx, ctx['far_pending'])
+                ctx['far_pending'] = False
+            except Exception:
+                logger.error(traceback.format_exc())
+
+        # before exit
+        for symbol, ctx in _prev_context.items():
+            await _clear_all_ner_open_orders(symbol, ctx, logger)
+    except asyncio.CancelledError:
+        logger.info('market maker is stopped')
+    finally:
+        # keep orders and ladders for the next run
+        _save_snapshots({_snapshot_name(param): _dump_context(param, _prev_context[symbol])
+                         for symbol, param in snapshot_params.items()}, logger)
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("Usage: python market_maker.py <config_file>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python market_maker.py <config_file> [config_key]")
         sys.exit(1)
     _config_file = sys.argv[1]
     try:
@@ -416,4 +992,5 @@ if __name__ == '__main__':
         print(f"Error: failed to load config file {_config_file}")
         sys.exit(1)
     params = [TokenParameter(item) for item in args]
-    asyncio.run(main(params))
+    # optional redis key of pushed parameters, see config_util.set_config
+    asyncio.run(main(params, sys.argv[2] if len(sys.argv) > 2 else ''))
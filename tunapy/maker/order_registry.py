@@ -0,0 +1,90 @@
+""" Local registry of live maker orders, fed by the private order stream of the maker account
+"""
+import time
+import threading
+from collections import OrderedDict
+
+# order status of the private stream
+LIVE_STATUS = ('PENDING', 'OPEN', 'UNTRIGGERED', 'NEW', 'PARTIALLY_FILLED')
+CLOSED_STATUS = ('FILLED', 'CANCELED', 'CANCELLED', 'REJECTED', 'EXPIRED')
+# number of recently closed order ids kept to ignore late live events
+MAX_CLOSED_IDS = 10000
+
+class OrderRegistry:
+    """ The live orders of one maker account, grouped by symbol.
+        The private stream thread and the market maker loop both update the registry,
+        REST open_orders audits replace the orders of a symbol periodically.
+    """
+    def __init__(self, streams: int = 1) -> None:
+        self._lock = threading.Lock()
+        self._streams = streams     # number of private streams feeding the registry, one per account
+        self._open_streams = 0
+        self._orders = {}   # symbol -> {order_id: client_id}
+        self._closed = OrderedDict()    # recently closed order ids
+        self._audit_ts = {} # symbol -> timestamp of the last REST audit
+        self.ready = False  # True if all private streams are connected
+
+    def on_open(self):
+        """ a private stream is connected
+        """
+        with self._lock:
+            self._open_streams = min(self._open_streams + 1, self._streams)
+            self.ready = self._open_streams == self._streams
+
+    def on_close(self):
+        """ a private stream is closed, order events may be lost until the next audit
+        """
+        self.ready = False
+        with self._lock:
+            self._open_streams = max(self._open_streams - 1, 0)
+            self._audit_ts.clear()
+
+    def add(self, symbol: str, order_id: str, client_id: str = ''):
+        """ add an order put by the market maker
+        """
+        with self._lock:
+            if order_id not in self._closed:
+                self._orders.setdefault(symbol, {})[order_id] = client_id
+
+    def remove(self, symbol: str, order_ids: list):
+        """ remove canceled orders
+        """
+        with self._lock:
+            orders = self._orders.get(symbol, {})
+            for order_id in order_ids:
+                orders.pop(order_id, None)
+                self._close(order_id)
+
+    def on_order_update(self, symbol: str, order_id: str, status: str, client_id: str = ''):
+        """ handle the order event of the private stream
+        """
+        if not order_id:
+            return
+        status = status.upper()
+        if status in LIVE_STATUS:
+            self.add(symbol, order_id, client_id)
+        elif status in CLOSED_STATUS:
+            self.remove(symbol, [order_id])
+
+    def live_orders(self, symbol: str) -> dict:
+        """ return a copy of live orders of symbol, {order_id: client_id}
+        """
+        with self._lock:
+            return dict(self._orders.get(symbol, {}))
+
+    def audit_due(self, symbol: str, audit_interval: float) -> bool:
+        """ whether the orders of symbol must be checked by REST open_orders
+        """
+        return not self.ready or self._audit_ts.get(symbol, 0) + audit_interval <= time.time()
+
+    def reset(self, symbol: str, orders: dict):
+        """ replace the orders of symbol by the result of REST open_orders, {order_id: client_id}
+        """
+        with self._lock:
+            self._orders[symbol] = dict(orders)
+            self._audit_ts[symbol] = time.time()
+
+    def _close(self, order_id: str):
+        self._closed[order_id] = None
+        if len(self._closed) > MAX_CLOSED_IDS:
+            self._closed.popitem(last=False)
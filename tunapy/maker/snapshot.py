@@ -0,0 +1,49 @@
+""" Snapshots of market maker contexts for warm restart,
+    stored in redis, or in local files if redis is unavailable
+"""
+import os
+import json
+import time
+
+from tunapy.utils.db_util import RDB
+
+CURR_PATH = os.path.dirname(os.path.abspath(__file__))
+BASE_PATH = os.path.dirname(os.path.dirname(CURR_PATH))
+SNAPSHOT_DIR = os.path.join(BASE_PATH, 'snapshot')
+SNAPSHOT_PREFIX = 'mm_snapshot'
+
+def _snapshot_file(name: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f'{SNAPSHOT_PREFIX}_{name}.json')
+
+def save_snapshot(name: str, data: dict) -> bool:
+    """ save snapshot data of name with the current timestamp, True if saved to redis
+    """
+    payload = json.dumps(dict(data, ts=time.time()))
+    try:
+        RDB().set(f'{SNAPSHOT_PREFIX}_{name}', payload)
+        return True
+    except Exception:
+        # write a temporary file then rename, a crash never leaves a partial snapshot
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp_file = _snapshot_file(name) + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_file, _snapshot_file(name))
+        return False
+
+def load_snapshot(name: str, max_age: float) -> dict:
+    """ load the latest snapshot of name saved in max_age seconds, {} if not found
+    """
+    payloads = []
+    try:
+        payloads.append(RDB().get(f'{SNAPSHOT_PREFIX}_{name}'))
+    except Exception:
+        pass
+    if os.path.exists(_snapshot_file(name)):
+        with open(_snapshot_file(name), 'r') as f:
+            payloads.append(f.read())
+    snapshots = [json.loads(payload) for payload in payloads if payload]
+    snapshots = [item for item in snapshots if item.get('ts', 0) + max_age >= time.time()]
+    if not snapshots:
+        return {}
+    return max(snapshots, key=lambda item: item['ts'])
@@ -19,7 +19,34 @@ class TokenParameter:
 
         self.min_qty_per_order = float(conf['Min Qty'])             # minimum quantity of each order
         self.min_amt_per_order = float(conf['Min Amt'])             # minimum amount of each order
-        self.slippage = max(float(conf['Slippage']), 1.0)           # slippage for hedging
+        self.slippage = min(float(conf['Slippage']), 1.0)           # max price deviation of hedge orders from the top of book, 0.01: 1%
+        self.hedge_tif = conf.get('Hedge TIF', 'GTC')   # time in force of hedge orders: GTC, rests if not filled, or IOC
+        self.chase_timeout = float(conf.get('Chase Timeout', 1.0))    # seconds before open hedge orders are canceled and the rest requoted
+        self.chase_attempts = int(conf.get('Chase Attempts', 0))    # requotes of a hedge, then the rest is parked, 0: no chasing
+        self.chase_move = float(conf.get('Chase Move', 0.002))      # requote at once if the book moves away from a hedge order by 0.002: 0.2%
+        self.max_slippage = max(min(float(conf.get('Max Slippage', self.slippage * 5)), 1.0), self.slippage)   # slippage of the last requote
+        self.rate_limit = conf.get('Rate Limit', {})    # request budget of the API key: Limit, Window, Weights
+        self.netting_window = float(conf.get('Netting Window', 0))  # seconds to collect a burst of fills before netting, 0: hedge at once
+        self.netting_policy = conf.get('Netting Policy', 'time' if self.netting_window > 0 else 'immediate')   # immediate, time, size or adaptive
+        self.netting_size = float(conf.get('Netting Size', 0))  # net quantity hedged at once by the size policy
+        self.dedupe_window = float(conf.get('Dedupe Window', 7200))     # seconds to remember trade ids
+        self.dedupe_max_size = int(conf.get('Dedupe Max Size', 1000000))    # maximum number of remembered trade ids
+        self.persist_trade_ids = bool(conf.get('Persist Trade IDs', False))  # keep trade ids in redis over restarts
+        self.journal = bool(conf.get('Journal', False))     # recover risk positions and hedges from the journal on restart
+        self.hedge_venues = [HedgeVenueParameter(item, conf) for item in conf.get('Hedge Venues', [])]   # more venues to split hedges over
+
+class HedgeVenueParameter:
+    """ a hedge venue besides Hedger Exchange, the hedge account defaults to the one of the token
+    """
+    def __init__(self, conf: dict, token_conf: dict) -> None:
+        self.api_key = conf.get('API KEY', token_conf['API KEY'])          # the API key of the hedge account
+        self.api_secret = conf.get('Secret', token_conf['Secret'])         # the API secret of the hedge account
+        self.passphrase = conf.get('Passphrase', token_conf['Passphrase'])     # the passphrase of the hedge account
+        self.hedge_symbol = conf['Hedge Symbol']     # the hedge symbol on the venue
+        self.hedge_exchange = conf['Hedger Exchange']  # the hedge exchange
+        self.price_decimals = int(conf['Hedger Price Decimals'])      # price decimals of hedge symbol
+        self.qty_decimals = int(conf['Hedger Qty Decimals'])          # quantity decimals of hedge symbol
+        self.rate_limit = conf.get('Rate Limit', {})    # request budget of the API key on the venue
 
 class PrivateWSClient:
     def __init__(self, config: dict, logger:Logger) -> None:
@@ -33,13 +60,15 @@ class PrivateWSClient:
         self.on_open = None
         self.on_close = None
         self.handle_trade_filled = None
+        self.handle_order_update = None
         self.on_error = None
 
-    def start(self, symbol, on_open, on_close, handle_trade_filled, on_error):
+    def start(self, symbol, on_open, on_close, handle_trade_filled, on_error, handle_order_update=None):
         self.on_open = on_open
         self.on_close = on_close
         self.on_error = on_error
         self.handle_trade_filled = handle_trade_filled
+        self.handle_order_update = handle_order_update
         self.subscribe_execution_report(symbol)
 
     def subscribe_execution_report(self, symbol: str):
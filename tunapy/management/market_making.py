@@ -1,12 +1,22 @@
 """ Parameters for market making
 """
 
+from collections import namedtuple
+
+from tunapy.utils.tick_util import TickScale
+
+# credentials of a sub-account sharing the orders of a symbol with the maker account
+SubAccount = namedtuple('SubAccount', ['api_key', 'api_secret', 'passphrase'])
+
 class TokenParameter:
     def __init__(self, conf: dict) -> None:
         self.maker_exchange = conf['Maker Exchange']     # the exchange for Maker Account
         self.api_key = conf['API KEY']     # the API key for Maker Account
         self.api_secret = conf['Secret']   # the API secret for Maker Account
         self.passphrase = conf['Passphrase'] # the passphrase for Maker Account
+        self.stream_url = conf.get('Stream URL', '')  # the private order stream of Maker Account, optional
+        self.sub_accounts = [SubAccount(item['API KEY'], item['Secret'], item.get('Passphrase', ''))
+                             for item in conf.get('Sub Accounts', [])]   # sub-accounts putting orders of the symbol, optional
 
         self.follow_exchange = conf['Follow Exchange']     # the exchange for Follow Account
         self.follow_symbol = conf['Follow Symbol']   # the mirrored symbol
@@ -16,6 +26,7 @@ class TokenParameter:
         self.price_decimals = int(conf['Maker Price Decimals'])      # price decimals of maker symbol
         self.qty_decimals = int(conf['Maker Qty Decimals'])          # quantity decimals of maker symbol
         self.position_side = conf.get('Position Side', '')       # position side of maker symbol, such as "LONG"
+        self.ticks = TickScale(self.price_decimals, self.qty_decimals)   # fixed-point prices and quantities
 
         ### far-end market making parameters
         self.far_interval = float(conf['Far Interval'])          # interval of putting new far-end orders
@@ -50,3 +61,11 @@ class TokenParameter:
         self.near_diff_rate_per_round = int(conf['Near Diff Per Round'])  # maximum price difference of the same level
         
         self.force_refresh_num = int(conf['Force Refresh Num'])             # number of rounds without forcely refresh
+        self.requote_threshold = float(conf.get('Requote Threshold', 0))    # skip near-end round if follow book moves less (BPS), 0: never skip
+
+        ### order dispatch parameters
+        self.max_inflight_batches = max(1, int(conf.get('Max Inflight Batches', 1)))  # number of order batches sent concurrently
+        self.place_before_cancel = bool(conf.get('Place Before Cancel', True))        # put new orders before canceling previous orders
+        self.amend_orders = bool(conf.get('Amend Orders', True))    # amend changed orders if the maker client supports it
+        self.open_orders_audit_interval = float(conf.get('Open Orders Audit Interval', 60))  # interval of checking local orders by REST open_orders
+        self.rate_limit = conf.get('Rate Limit', {})    # request budget of the API key: Limit, Window, Weights
@@ -1,6 +1,8 @@
 """ Parameters for self trading
 """
 
+from tunapy.utils.tick_util import TickScale
+
 class TokenParameter:
     def __init__(self, conf: dict) -> None:
         self.maker_exchange = conf['Maker Exchange']     # the mirroring exchange, SPOT and FUTURE are different
@@ -13,6 +15,7 @@ class TokenParameter:
         self.follow_symbol = conf['Follow Symbol']   # the mirrored symbol
         self.price_decimals = int(conf['Maker Price Decimals'])      # price decimals of maker symbol
         self.qty_decimals = int(conf['Maker Qty Decimals'])          # quantity decimals of maker symbol
+        self.ticks = TickScale(self.price_decimals, self.qty_decimals)   # fixed-point prices and quantities
         self.term_type = conf["Term type"]    # SPOT | FUTURE
 
         self.interval = max(0.1, float(conf['Interval']))   # interval of trading
@@ -22,3 +25,4 @@ class TokenParameter:
         self.min_qty_per_order = float(conf['Min Qty'])             # minimum quantity of each order
         self.min_amt_per_order = float(conf['Min Amt'])             # minimum amount of each order
         self.price_divergence = float(conf['Price Divergence'])       # maximum divergence of consequent self-trades
+        self.rate_limit = conf.get('Rate Limit', {})    # request budget of the API key: Limit, Window, Weights
@@ -3,25 +3,33 @@
 import os
 import sys
 import json
+import importlib
 
 CURR_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.dirname(CURR_DIR)
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
+ROOT_DIR = os.path.dirname(BASE_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 from management.market_making import TokenParameter as MakerParameter
 from management.self_trade import TokenParameter as SelftradeParameter
 # from management.quote import TokenParameter as QuoteParameter
-from quote.bn_public_ws import bn_subscribe
-from quote.bn_future_public_ws import bn_future_subscribe
-from quote.okx_public_ws import okx_subscribe
-from quote.okx_future_public_ws import okx_future_subscribe
 
 EXCHANGE_BN = "binance_spot"
 EXCHANGE_BN_FUTURE = "binance_future"
 EXCHANGE_OKX = "okx_spot"
 EXCHANGE_OKX_FUTURE = "okx_future"
 
+# subscribe function of each feed, only the feed to run is imported
+QUOTE_FEEDS = {
+    EXCHANGE_BN: ("quote.bn_public_ws", "bn_subscribe"),
+    EXCHANGE_BN_FUTURE: ("quote.bn_future_public_ws", "bn_future_subscribe"),
+    EXCHANGE_OKX: ("quote.okx_public_ws", "okx_subscribe"),
+    EXCHANGE_OKX_FUTURE: ("quote.okx_future_public_ws", "okx_future_subscribe"),
+}
+
 def main(exchange, maker_params: list[MakerParameter], selftrade_params: list[SelftradeParameter]):
     """ main workflow of market data
     """
@@ -29,16 +37,11 @@ def main(exchange, maker_params: list[MakerParameter], selftrade_params: list[Se
     maker_symbols = list(set([param.follow_symbol for param in maker_params]))
     selftrade_symbols = list(set([param.follow_symbol for param in selftrade_params]))
     
-    if exchange == EXCHANGE_BN:
-        bn_subscribe(maker_symbols, selftrade_symbols)
-    elif exchange == EXCHANGE_BN_FUTURE:
-        bn_future_subscribe(maker_symbols, selftrade_symbols)
-    elif exchange == EXCHANGE_OKX:
-        okx_subscribe(maker_symbols, selftrade_symbols)
-    elif exchange == EXCHANGE_OKX_FUTURE:
-        okx_future_subscribe(maker_symbols, selftrade_symbols)
-    else:
+    if exchange not in QUOTE_FEEDS:
         return
+    module_name, func_name = QUOTE_FEEDS[exchange]
+    subscribe = getattr(importlib.import_module(module_name), func_name)
+    subscribe(maker_symbols, selftrade_symbols)
 
 if __name__ == '__main__':
     import argparse
@@ -86,3 +86,19 @@ class DATA_REDIS_CLIENT:
                 if prev_order_book:
                     return prev_order_book  # nearest order_book
         return None # fail to get previous order_book
+
+    @classmethod
+    def get_recent_order_book(cls, symbol_key: str, max_age: float = 1.0):
+        """ get order book updated in max_age seconds, None if stale
+        """
+        ts = int(time.time()*10)
+        current_tag = ts % ONE_MIN_HUNDRED_MS
+        for prev_tag in range(current_tag, current_tag - max(int(max_age * 10), 1) - 1, -1):
+            tag = (prev_tag + ONE_MIN_HUNDRED_MS) % ONE_MIN_HUNDRED_MS  # prev_tag may less than zero
+            _key=f'{symbol_key}{tag}'
+            t1 = cls.get_int(_key)
+            if t1 and ts - max_age * 10 <= t1 <= ts:
+                order_book = cls.get_dict(f'{_key}_value')
+                if order_book:
+                    return order_book  # nearest order_book
+        return None
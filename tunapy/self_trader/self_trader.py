@@ -7,6 +7,7 @@ import time
 import random
 import asyncio
 import json
+import traceback
 from logging import Logger
 
 CURR_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,7 +19,9 @@ from octopuspy.utils.log_util import create_logger
 from octopuspy.exchange.base_restapi import AskBid, NewOrder
 from tunapy.management.self_trade import TokenParameter as SelftradeParameter
 from tunapy.quote.redis_client import DATA_REDIS_CLIENT
-from tunapy.cexapi.helper import get_private_client
+from tunapy.cexapi.helper import get_pooled_client, warm_up_client
+from tunapy.utils.rate_limiter import get_rate_limiter, reconfigure_rate_limiter, PRIORITY_SELF_TRADE
+from tunapy.utils.config_util import watch_config
 
 # OKX spot partial depth
 # EXCHANGE_DEPTH_PREFIX = 'depth'
@@ -26,6 +29,8 @@ from tunapy.cexapi.helper import get_private_client
 EXCHANGE_TICKER_PREFIX = 'ticker'
 BJ_TZ = timezone(timedelta(hours=8))
 SIDES = ['BUY', 'SELL']
+# parameters bound to the context of a symbol, a change rebuilds the context
+IDENTITY_FIELDS = {'api_key', 'api_secret', 'passphrase', 'term_type', 'price_decimals', 'qty_decimals'}
 
 async def _trade(ctx: dict, symbol: str, term_type:str,
                  price: str, qty: str, logger:Logger):
@@ -89,11 +94,14 @@ async def _trade(ctx: dict, symbol: str, term_type:str,
     logger.debug("selftrade trade 1: %s", orders[0])
     logger.debug("selftrade trade 2: %s", orders[1])
     # import pdb; pdb.set_trace()
+    # self-trades go after hedge and maker orders of the same API key
+    await ctx['limiter'].acquire_async('batch_make_orders', PRIORITY_SELF_TRADE, len(orders))
     return ctx['client'].batch_make_orders(orders, symbol)
 
 async def _cancel_orders(ctx, symbol, order_id, logger: Logger):
     for _retry in range(3):
         try:
+            await ctx['limiter'].acquire_async('cancel_order', PRIORITY_SELF_TRADE)
             res = ctx['client'].cancel_order(order_id, symbol)
             if res.order_id == order_id:
                 logger.debug("cancel_orders: %s", order_id)
@@ -125,38 +133,39 @@ async def self_trade(
 
     # get current order book of self-traded symbol
     symbol = param.maker_symbol
+    await ctx['limiter'].acquire_async('top_askbid', PRIORITY_SELF_TRADE)
     ob:AskBid = ctx['client'].top_askbid(symbol)
     logger.debug('%s order book %s', symbol, ob)
     if not ob:
         logger.warning('no order book %s', symbol)
         return False
 
-    top_ask, top_ask_qty = float(ob[0].ap), float(ob[0].aq)
-    top_bid, top_bid_aty = float(ob[0].bp), float(ob[0].bq)
+    # prices in ticks, quantities in lots, converted to strings when trading
+    ticks = param.ticks
+    top_ask, top_ask_qty = ticks.to_ticks(ob[0].ap), float(ob[0].aq)
+    top_bid, top_bid_aty = ticks.to_ticks(ob[0].bp), float(ob[0].bq)
     
     qty = float(trade['qty']) * param.qty_multiplier
     # random coeficient
     _random_coef = 0.9995 + 0.00001 * random.randrange(0, 100)
-    price_decimals = param.price_decimals
-    qty_decimals = param.qty_decimals
     if trade['price']:
         # copy binance trade price
-        price = float(trade['price'])
+        price = ticks.to_ticks(trade['price'])
         # for real ticker, make little change for sequent st price
         if ctx['price'] == price:
-            # this turn self-trade price = pre turn price, change a little
+            # this turn self-trade price = pre turn price, change a tick
             if price == top_ask:
-                price -= 1.0 / 10 ** price_decimals
+                price -= 1
             else:
-                price += 1.0 / 10 ** price_decimals
+                price += 1
         elif ctx['price'] > 0:
-            if abs(price / ctx['price'] - 1) > param.price_divergence:
+            if abs(price - ctx['price']) > param.price_divergence * ctx['price']:
                 logger.error("Abnormal Ticker Volatility %s: pre price=%s, price=%s",
-                    symbol, ctx['price'], price)
+                    symbol, ticks.price_str(ctx['price']), ticks.price_str(price))
                 if price > ctx['price']:
-                    price = ctx['price'] * (1 + param.price_divergence)
+                    price = int(ctx['price'] * (1 + param.price_divergence))
                 else:
-                    price = ctx['price'] * (1 - param.price_divergence)
+                    price = int(ctx['price'] * (1 - param.price_divergence))
         qty *= _random_coef
     else:
         # mock trade using previous st price
@@ -167,8 +176,8 @@ async def self_trade(
     if price <= 0:
         return False
 
-    qty = min(round(max(1.0 / 10 ** qty_decimals, qty), qty_decimals),
-              round(float(param.max_amt_per_order) / price, qty_decimals))
+    qty = min(max(1, ticks.to_lots(qty)),
+              ticks.to_lots(float(param.max_amt_per_order) / ticks.to_price(price)))
     if qty > 0:
         logger.info('put self-trade %s %s %s %s %s at maker_exchange %s', symbol, price, qty, top_bid, top_ask, ctx['client'])
         # the close of minute N must equals to the open of minute N+1
@@ -181,12 +190,12 @@ async def self_trade(
         price = max(min(price, top_ask), top_bid)
         ctx['price'] = price
         if qty == ctx['qty']:
-            qty *= 1.0001
+            qty += 1
         ctx['qty'] = qty
         # res : List[OrderID]
         res = await _trade(ctx, symbol, param.term_type,
-                           str(round(price, price_decimals) if price_decimals else int(price)),
-                           str(round(qty, qty_decimals) if qty_decimals else int(qty)),
+                           ticks.price_str(price),
+                           ticks.qty_str(qty),
                            logger)
         logger.info(res)
         if res:
@@ -195,8 +204,49 @@ async def self_trade(
         return True
     return False
 
-async def main(params: list[SelftradeParameter]):
+def _symbol_key(param: SelftradeParameter) -> str:
+    return f"{param.maker_exchange}_{param.maker_symbol}"
+
+def _new_context(param: SelftradeParameter, logger: Logger) -> dict:
+    # symbols of the same account share one client
+    client = get_pooled_client(
+        exchange=param.maker_exchange,
+        api_key=param.api_key,
+        api_secret=param.api_secret,
+        passphrase=param.passphrase,
+        logger=logger,
+    )
+    ### Set client.mock = True, use mock interfaces for unittest
+    client.mock = False
+    limiter = get_rate_limiter(param.maker_exchange, param.api_key, param.rate_limit)
+    return {'client': client, 'limiter': limiter, 'price':0, 'minute':0, 'qty':0, 'follow_exchange': param.follow_exchange}
+
+def _reload_params(new_params: list, params: list, contexts: dict, logger: Logger):
+    """ apply reloaded parameters to contexts,
+        only symbols with changed identity fields start with new contexts
+    """
+    old_params = {_symbol_key(param): param for param in params}
+    new_keys = set(_symbol_key(param) for param in new_params)
+    for symbol_key in [key for key in contexts if key not in new_keys]:
+        del contexts[symbol_key]
+        logger.info('Reload %s: removed', symbol_key)
+    for param in new_params:
+        symbol_key = _symbol_key(param)
+        old_param = old_params.get(symbol_key)
+        changed = set(key for key, value in vars(param).items()
+                      if key != 'ticks' and getattr(old_param, key, None) != value) if old_param else set()
+        if 'rate_limit' in changed:
+            # the limiter of the API key is shared, and kept by the context
+            reconfigure_rate_limiter(param.maker_exchange, param.api_key, param.rate_limit)
+        if symbol_key not in contexts or changed & IDENTITY_FIELDS:
+            contexts[symbol_key] = _new_context(param, logger)
+        if changed:
+            logger.info('Reload %s: %s', symbol_key, sorted(changed))
+
+async def main(params: list[SelftradeParameter], config_key: str = ''):
     """ main workflow of self-trader
+        If config_key is set, parameters pushed by set_config(config_key, ...) are applied
+        between self-trade rounds.
     """
     logger = create_logger(BASE_DIR, "selftrade.log", 'TUNA_SELFTRADE', backup_cnt=10)
     logger.info('start self-trade with config: %s', params)
@@ -204,26 +254,42 @@ async def main(params: list[SelftradeParameter]):
     _last_operating_ts = {}
     # previous self trade context
     _prev_context = {}
+    client_symbols = {}
+    for param in params:
+        symbol_key = _symbol_key(param)
+        if symbol_key in _prev_context:
+            continue
+        _prev_context[symbol_key] = _new_context(param, logger)
+        client = _prev_context[symbol_key]['client']
+        client_symbols.setdefault(id(client), (client, []))[1].append(param.maker_symbol)
+    # open connections of each client before the first self-trades
+    await asyncio.gather(*[asyncio.to_thread(warm_up_client, client, symbols, logger)
+                           for client, symbols in client_symbols.values()])
+    pending_config = {} # the latest pushed config, applied in the main loop
+    if config_key:
+        loop = asyncio.get_running_loop()
+        watch_config(config_key,
+                     lambda version, conf: loop.call_soon_threadsafe(
+                         pending_config.update, version=version, conf=conf),
+                     logger=logger)
 
     while 1:
+        if pending_config:
+            version, conf = pending_config.pop('version'), pending_config.pop('conf')
+            try:
+                new_params = [SelftradeParameter(item) for item in conf]
+                logger.info('Reload config version %s', version)
+                _reload_params(new_params, params, _prev_context, logger)
+                params = new_params
+            except Exception:
+                logger.error('Invalid config version %s: %s', version, traceback.format_exc())
         ts = time.time()
         tasks = []
         for param in params:
-            symbol_key = f"{param.maker_exchange}_{param.maker_symbol}"
+            symbol_key = _symbol_key(param)
             # check self-trade frequency
             if _last_operating_ts.get(symbol_key, 0) + param.interval > ts:
                 continue
-            if symbol_key not in _prev_context:
-                client = get_private_client(
-                    exchange=param.maker_exchange,
-                    api_key=param.api_key,
-                    api_secret=param.api_secret,
-                    passphrase=param.passphrase,
-                    logger=logger,
-                )
-                ### Set client.mock = True, use mock interfaces for unittest
-                client.mock = False
-                _prev_context[symbol_key] = {'client': client, 'price':0, 'minute':0, 'qty':0, 'follow_exchange': param.follow_exchange}
             tasks.append(asyncio.create_task(self_trade(param, _prev_context[symbol_key], logger)))
             logger.debug("append task: self_trade with param=[%s], _prev_context=[%s], symbol=[%s]",
                          param, _prev_context[symbol_key], symbol_key)
@@ -237,12 +303,13 @@ if __name__ == '__main__':
     """
     Reference: EXCHANGE_CHANNEL in cexapi/helper.py
     """    
-    if len(sys.argv) != 2:
-        print("usage: python self_trader.py <config_file>")
+    if len(sys.argv) not in (2, 3):
+        print("usage: python self_trader.py <config_file> [config_key]")
         exit(1)
     
     config_file = sys.argv[1]
     with open(config_file, 'r') as f:
         _params = json.load(f)
     selftrade_params = [SelftradeParameter(param) for param in _params]
-    asyncio.run(main(selftrade_params))
\ No newline at end of file
+    # optional redis key of pushed parameters, see config_util.set_config
+    asyncio.run(main(selftrade_params, sys.argv[2] if len(sys.argv) > 2 else ''))
\ No newline at end of file
@@ -1,4 +1,8 @@
 import json
+import time
+import threading
+import traceback
+from logging import Logger
 from functools import lru_cache
 
 import redis
@@ -12,6 +16,11 @@ REDIS_CONFIG = {
     "decode_responses": True,
 }
 
+# channel of config updates: {redis_key}{CONFIG_CHANNEL_SUFFIX}, the message is the new version
+CONFIG_CHANNEL_SUFFIX = '_updated'
+# seconds before subscribing again after the subscription failed
+RESUBSCRIBE_INTERVAL = 1.0
+
 @lru_cache(maxsize=1)
 def _get_conn():
     conn = redis.Redis(**REDIS_CONFIG)
@@ -46,6 +55,26 @@ def load_config(redis_key: str, prev_version: int) -> list:
                     return int(version), json.loads(value)
     return 0, config
 
+def load_configs(redis_keys: list, prev_versions: list) -> list:
+    """ Load configurations of several keys from Redis in two round trips at most.
+        return [(version, config)] of each key, (0, []) if it is not newer than prev_versions
+    """
+    res = [(0, [])] * len(redis_keys)
+    if redis_keys:
+        conn = RDB()
+        if conn:
+            versions = conn.mget([f'{redis_key}_version' for redis_key in redis_keys])
+            updated = [idx for idx, version in enumerate(versions)
+                       if version and int(version) > prev_versions[idx]]
+            if updated:
+                values = conn.mget([f'{redis_keys[idx]}_data' for idx in updated])
+                for idx, value in zip(updated, values):
+                    if value:
+                        if type(value) is bytes:
+                            value = value.decode('utf-8')
+                        res[idx] = (int(versions[idx]), json.loads(value))
+    return res
+
 def load_config_str(redis_key: str, prev_version: int):
     """ Load configuration from Redis by key.
     """
@@ -63,12 +92,43 @@ def load_config_str(redis_key: str, prev_version: int):
     return 0, "[]"
 
 def set_config(redis_key: str, configs: dict) -> bool:
-    """ Set configuration from Redis by key.
+    """ Set configuration from Redis by key, and push the new version to subscribers.
     """
     if redis_key:
         conn = RDB()
         if conn:
-            version = conn.get(f'{redis_key}_version')
             conn.set(f'{redis_key}_data', json.dumps(configs))
-            conn.set(f'{redis_key}_version', int(version) + 1)
+            version = conn.incr(f'{redis_key}_version')
+            conn.publish(f'{redis_key}{CONFIG_CHANNEL_SUFFIX}', version)
     return True
+
+def watch_config(redis_key: str, handle_config, prev_version: int = 0,
+                 logger: Logger = None) -> threading.Thread:
+    """ Call handle_config(version, config) in a daemon thread whenever set_config pushes
+        a newer version of redis_key. The config is also loaded after each (re)subscription,
+        so versions set before subscribing or while disconnected are not missed.
+    """
+    def _apply(version: int) -> int:
+        new_version, config = load_config(redis_key, version)
+        if new_version > version:
+            handle_config(new_version, config)
+            return new_version
+        return version
+
+    def _run():
+        version = prev_version
+        while 1:
+            try:
+                pubsub = RDB().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(f'{redis_key}{CONFIG_CHANNEL_SUFFIX}')
+                version = _apply(version)
+                for _message in pubsub.listen():
+                    version = _apply(version)
+            except Exception:
+                if logger:
+                    logger.error('Config subscription of %s failed: %s', redis_key, traceback.format_exc())
+                time.sleep(RESUBSCRIBE_INTERVAL)
+
+    thread = threading.Thread(target=_run, name=f'config-{redis_key}', daemon=True)
+    thread.start()
+    return thread
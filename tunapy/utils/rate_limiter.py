@@ -0,0 +1,186 @@
+""" Request weight budget of an API key, shared by market maker, self-trader and hedger.
+    The budget is a token bucket in redis, so processes using the same API key share it.
+    More urgent requests may use the whole bucket, less urgent requests leave a reserve:
+    hedge > near-end maker > far-end maker and self-trade.
+"""
+import time
+import asyncio
+import hashlib
+import threading
+
+from tunapy.utils.db_util import RDB
+
+# priority of requests, smaller is more urgent
+PRIORITY_HEDGE = 0
+PRIORITY_MAKER = 1
+PRIORITY_FAR = 2
+PRIORITY_SELF_TRADE = 2
+
+# the part of bucket reserved for more urgent requests
+PRIORITY_RESERVE = {
+    PRIORITY_HEDGE: 0.0,
+    PRIORITY_MAKER: 0.2,
+    PRIORITY_FAR: 0.4,
+}
+
+# default budget: weight per window in seconds
+DEFAULT_LIMIT = 1200
+DEFAULT_WINDOW = 60.0
+# seconds of using the local bucket after redis failed
+REDIS_RETRY_INTERVAL = 10.0
+# seconds an event loop waits for the bucket in redis, then redis is taken as failed
+REDIS_TIMEOUT = 0.2
+# default weight of each endpoint, batch endpoints are weighted by order
+DEFAULT_WEIGHTS = {
+    'batch_make_orders': 1,
+    'batch_cancel': 1,
+    'amend_order': 1,
+    'cancel_order': 1,
+    'order_status': 2,
+    'top_askbid': 2,
+    'open_orders': 10,
+}
+
+# KEYS[1]: bucket key, ARGV: capacity, refill rate per second, weight, floor, now
+# return 0 if admitted, otherwise seconds to wait
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local weight = tonumber(ARGV[3])
+local floor = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens - weight >= floor then
+    tokens = tokens - weight
+else
+    wait = (weight + floor - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+class RateLimiter:
+    """ token bucket of one API key on one exchange, admits all requests if not configured
+    """
+    def __init__(self, exchange: str, api_key: str, conf: dict = None) -> None:
+        self.configure(conf)
+        key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+        self.key = f'rate_limit_{exchange}_{key_hash}'
+        self._script = None
+        self._redis_retry_ts = 0.0
+        # local bucket if redis is unavailable
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._ts = time.time()
+
+    def configure(self, conf: dict = None):
+        """ set the budget by the Rate Limit object of token parameters, None or {}: no budget
+        """
+        self.enabled = bool(conf)
+        conf = conf or {}
+        self.capacity = float(conf.get('Limit', DEFAULT_LIMIT))    # weight per window
+        self.window = float(conf.get('Window', DEFAULT_WINDOW))    # window in seconds
+        self.rate = self.capacity / self.window
+        self.weights = dict(DEFAULT_WEIGHTS, **conf.get('Weights', {}))
+        if hasattr(self, '_tokens'):
+            with self._lock:
+                self._tokens = min(self._tokens, self.capacity)
+
+    def _local_try(self, weight: float, floor: float, now: float) -> float:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + max(0., now - self._ts) * self.rate)
+            self._ts = now
+            if self._tokens - weight >= floor:
+                self._tokens -= weight
+                return 0.
+            return (weight + floor - self._tokens) / self.rate
+
+    def try_acquire(self, endpoint: str, priority: int, count: int = 1) -> float:
+        """ take weight of count requests of endpoint from the bucket,
+            return 0 if admitted, otherwise seconds to wait before trying again
+        """
+        if not self.enabled:
+            return 0.
+        # never wait for a weight larger than the bucket
+        weight = min(self.weights.get(endpoint, 1) * count, self.capacity)
+        floor = min(self.capacity * PRIORITY_RESERVE.get(priority, PRIORITY_RESERVE[PRIORITY_FAR]),
+                    self.capacity - weight)
+        now = time.time()
+        if now >= self._redis_retry_ts:
+            try:
+                if self._script is None:
+                    self._script = RDB().register_script(_TOKEN_BUCKET_SCRIPT)
+                return float(self._script(keys=[self.key],
+                                          args=[self.capacity, self.rate, weight, floor, now]))
+            except Exception:
+                self._script = None
+                self._redis_retry_ts = now + REDIS_RETRY_INTERVAL
+        return self._local_try(weight, floor, now)
+
+    def acquire(self, endpoint: str, priority: int, count: int = 1, timeout: float = None) -> bool:
+        """ wait until count requests of endpoint are admitted, False if timeout
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while 1:
+            wait = self.try_acquire(endpoint, priority, count)
+            if wait <= 0:
+                return True
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def _try_acquire_async(self, endpoint: str, priority: int, count: int) -> float:
+        """ try_acquire without blocking the event loop, the bucket in redis is called in a thread
+        """
+        if not self.enabled or time.time() < self._redis_retry_ts:
+            # local bucket, no I/O
+            return self.try_acquire(endpoint, priority, count)
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(self.try_acquire, endpoint, priority, count), REDIS_TIMEOUT)
+        except asyncio.TimeoutError:
+            # a stalled redis delays one request per retry interval, not every symbol.
+            # The redis call still takes the weight when it returns, admit without the local bucket
+            self._redis_retry_ts = time.time() + REDIS_RETRY_INTERVAL
+            return 0.
+
+    async def acquire_async(self, endpoint: str, priority: int, count: int = 1,
+                            timeout: float = None) -> bool:
+        """ acquire in event loop
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while 1:
+            wait = await self._try_acquire_async(endpoint, priority, count)
+            if wait <= 0:
+                return True
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+def get_rate_limiter(exchange: str, api_key: str, conf: dict = None) -> RateLimiter:
+    """ the rate limiter of (exchange, api_key), created with conf on first use,
+        the first conf of the key sets the budget, the key is not throttled without conf
+    """
+    with _LIMITERS_LOCK:
+        if (exchange, api_key) not in _LIMITERS:
+            _LIMITERS[(exchange, api_key)] = RateLimiter(exchange, api_key, conf)
+        limiter = _LIMITERS[(exchange, api_key)]
+        if conf and not limiter.enabled:
+            limiter.configure(conf)
+        return limiter
+
+def reconfigure_rate_limiter(exchange: str, api_key: str, conf: dict = None) -> RateLimiter:
+    """ apply conf to the rate limiter of (exchange, api_key), such as a reloaded Rate Limit,
+        users of the limiter get the new budget at once
+    """
+    limiter = get_rate_limiter(exchange, api_key, conf)
+    limiter.configure(conf)
+    return limiter
@@ -0,0 +1,49 @@
+""" Fixed-point prices and quantities
+    price = ticks / 10 ** price_decimals, quantity = lots / 10 ** qty_decimals
+"""
+
+def _to_str(value: int, decimals: int) -> str:
+    if decimals <= 0:
+        return str(value * 10 ** -decimals)
+    sign = '-' if value < 0 else ''
+    integer, fraction = divmod(abs(value), 10 ** decimals)
+    return f'{sign}{integer}.{fraction:0{decimals}d}'
+
+class TickScale:
+    """ convert prices and quantities of a symbol between floats, integer ticks/lots and strings,
+        strings are only used at the API boundary
+    """
+    def __init__(self, price_decimals: int, qty_decimals: int) -> None:
+        self.price_decimals = price_decimals
+        self.qty_decimals = qty_decimals
+        self.price_scale = 10.0 ** price_decimals
+        self.qty_scale = 10.0 ** qty_decimals
+
+    def to_ticks(self, price: float) -> int:
+        """ price to the nearest tick
+        """
+        return int(round(float(price) * self.price_scale))
+
+    def to_lots(self, qty: float) -> int:
+        """ quantity to the nearest lot
+        """
+        return int(round(float(qty) * self.qty_scale))
+
+    def to_price(self, ticks: int) -> float:
+        return ticks / self.price_scale
+
+    def to_qty(self, lots: int) -> float:
+        return lots / self.qty_scale
+
+    def price_str(self, ticks: int) -> str:
+        """ exact decimal string of ticks, such as 12345 -> '123.45' if price_decimals is 2
+        """
+        return _to_str(int(ticks), self.price_decimals)
+
+    def qty_str(self, lots: int) -> str:
+        """ exact decimal string of lots
+        """
+        return _to_str(int(lots), self.qty_decimals)
+
+    def __repr__(self) -> str:
+        return f'TickScale({self.price_decimals}, {self.qty_decimals})'